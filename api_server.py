@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Serviço HTTP local com os agregados do painel em JSON e a entrada das respostas do formulário.
+
+Para consumidores que não precisam da página interativa (painel de TV de cada loja,
+script do e-mail semanal). Usa o mesmo dataset e o mesmo cálculo do app (pacote
+avaliacao) e guarda as respostas prontas num cache por (versão do dataset, consulta).
+
+Endpoints (GET):
+    /api/saude                  sem autenticação: versão do dataset, linhas, histórico, caches, ingestão
+    /api/kpis                   avaliações e médias no total e por loja
+    /api/resumo?nivel=loja      nível: pessoa, setor, loja, regiao ou geral
+    /api/distribuicao?nivel=loja  quantas de cada nota, mediana, p10/p90 e % sem nota, por nota
+    /api/ranking-avaliadores    opcional: top=N
+    /api/volume-hora            avaliações por região/loja/hora
+    /api/pessoas?q=jo&limite=10 busca de colaboradores e avaliadores pelo nome (sem acento, com
+                                erro de digitação), para campos de autocompletar: ID, nome,
+                                lojas e avaliações recebidas/feitas nas lojas do usuário
+
+Endpoint (POST):
+    /api/avaliacoes             respostas novas do formulário, no layout A–M da planilha:
+                                {"aba": "Carioca", "linhas": [[A, B, ..., M]], "fonte": "RJ/SP"}
+                                (fonte só quando fontes.toml tem várias). Entram no painel em
+                                segundos, sem esperar o cache da planilha (avaliacao/ingest.py).
+                                202 com {"aceitas", "rejeitadas": [{"linha", "erro"}]}; 422 se
+                                nenhuma linha foi aceita.
+
+Filtros (todos opcionais): lojas=Carioca,Mesquita  regiao=RJ  setores=Caixa,Açougue
+de=01/09/2025  ate=07/09/2025  hora_ini=8  hora_fim=18
+
+Autenticação: "Authorization: Bearer <token>", o mesmo token assinado do login do app.
+Cada usuário só vê as lojas que vê no app (usuarios.toml); pedir outra loja dá 403.
+Para um painel de TV, gere um token de longa duração para o usuário da loja:
+    python api_server.py --token Carioca --dias 90
+
+O servidor e quem gera o token precisam da mesma chave: AVALIACAO_TOKEN_SECRET ou
+[auth] token_secret no .streamlit/secrets.toml.
+
+Cache HTTP: cada resposta leva uma ETag derivada da versão do dataset e da consulta.
+Quem repete a pergunta com If-None-Match recebe 304 sem corpo e sem recálculo até a
+planilha mudar.
+
+Exemplos:
+    python api_server.py                           # 127.0.0.1:8502
+    python api_server.py --host 0.0.0.0 --porta 8600
+    curl -H "Authorization: Bearer $TOKEN" "http://127.0.0.1:8502/api/kpis?de=01/09/2025&ate=07/09/2025"
+"""
+
+import argparse
+import json
+import logging
+import sys
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger("avaliacao.api")
+
+# rota -> tipo de consulta (avaliacao.aggregates.CONSULTAS)
+ROTAS = {
+    "/api/kpis": "kpis",
+    "/api/resumo": "resumo",
+    "/api/distribuicao": "distribuicao",
+    "/api/ranking-avaliadores": "ranking_avaliadores",
+    "/api/volume-hora": "volume_por_hora",
+}
+PARAMETROS = {"lojas", "regiao", "setores", "de", "ate", "hora_ini", "hora_fim", "nivel", "top"}
+MAX_CORPO = 1024 * 1024  # bytes de um POST
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status: HTTPStatus, mensagem: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(mensagem)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _usuario(authorization: Optional[str]) -> Dict:
+    from auth import verify_session_token
+
+    esquema, _, token = (authorization or "").partition(" ")
+    if esquema.lower() != "bearer" or not token.strip():
+        raise ErroHTTP(HTTPStatus.UNAUTHORIZED, "Envie Authorization: Bearer <token>",
+                       {"WWW-Authenticate": 'Bearer realm="avaliacao"'})
+    user = verify_session_token(token.strip())
+    if user is None:
+        raise ErroHTTP(HTTPStatus.UNAUTHORIZED, "Token inválido ou expirado",
+                       {"WWW-Authenticate": 'Bearer realm="avaliacao", error="invalid_token"'})
+    return user
+
+
+def _lojas_no_escopo(user: Dict, pedidas: Optional[List[str]]) -> Optional[List[str]]:
+    """Lojas da consulta dentro das permissões do usuário (None = todas)"""
+    from avaliacao.user_registry import get_registry
+
+    permitidas = get_registry().stores_for(user)
+    if permitidas is None:
+        return pedidas
+    if pedidas is None:
+        return sorted(permitidas)
+    negadas = [l for l in pedidas if l not in permitidas]
+    if negadas:
+        raise ErroHTTP(HTTPStatus.FORBIDDEN, f"Sem acesso à(s) loja(s): {', '.join(negadas)}")
+    return pedidas
+
+
+def _etags(if_none_match: Optional[str]) -> List[str]:
+    return [t.strip().removeprefix("W/") for t in (if_none_match or "").split(",") if t.strip()]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "avaliacao-api/1.0"
+    spreadsheet: Optional[str] = None  # definido em main()
+
+    def do_GET(self):
+        self._atender(self._get)
+
+    def do_POST(self):
+        self._atender(self._post)
+
+    def _get(self, url):
+        if url.path == "/api/saude":
+            self._saude()
+        elif url.path == "/api/pessoas":
+            self._pessoas(parse_qs(url.query))
+        elif url.path in ROTAS:
+            self._agregado(ROTAS[url.path], parse_qs(url.query))
+        else:
+            raise ErroHTTP(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {url.path}")
+
+    def _post(self, url):
+        if url.path != "/api/avaliacoes":
+            raise ErroHTTP(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {url.path}")
+        self._receber()
+
+    def _atender(self, metodo):
+        from avaliacao.perf import new_run
+
+        new_run("api")
+        try:
+            # a URL chega decodificada como latin-1; clientes que mandam UTF-8 cru (Mauá) também funcionam
+            metodo(urlsplit(self.path.encode("latin-1").decode("utf-8", "replace")))
+        except ErroHTTP as e:
+            self._json(e.status, {"erro": str(e)}, e.headers)
+        except Exception as e:
+            logger.exception("Erro em %s", self.path)
+            self._json(HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": f"{type(e).__name__}: {e}"})
+
+    def _dataset(self):
+        from avaliacao import get_dataset, get_dataset_federado
+
+        try:
+            return get_dataset(self.spreadsheet) if self.spreadsheet else get_dataset_federado()
+        except Exception as e:
+            raise ErroHTTP(HTTPStatus.SERVICE_UNAVAILABLE, f"Planilha indisponível: {e}",
+                           {"Retry-After": "60"})
+
+    def _saude(self):
+        from datetime import datetime
+
+        from avaliacao.perf import cache_stats, counters
+
+        ds = self._dataset()
+        self._json(HTTPStatus.OK, {
+            "status": "ok",
+            "versao": ds.version,
+            "linhas": len(ds),
+            "carregado_em": datetime.fromtimestamp(ds.carregado_em).isoformat(timespec="seconds"),
+            "historico": ({"corte": ds.arquivo.corte.isoformat(), "linhas": ds.arquivo.linhas}
+                          if ds.arquivo is not None else None),
+            "caches": cache_stats(),
+            "ingestao": {k.split(".", 1)[1]: v for k, v in counters().items() if k.startswith("ingestao.")},
+        })
+
+    def _agregado(self, tipo: str, query: Dict[str, List[str]]):
+        from avaliacao.aggregates import agregado_json, etag, normalizar_consulta
+
+        user = _usuario(self.headers.get("Authorization"))
+        desconhecidos = sorted(set(query) - PARAMETROS)
+        if desconhecidos:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, f"Parâmetro(s) desconhecido(s): {', '.join(desconhecidos)}")
+        params = {k: v[-1] for k, v in query.items()}
+        try:
+            consulta = normalizar_consulta(tipo, **params)
+        except ValueError as e:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, str(e))
+        consulta["lojas"] = _lojas_no_escopo(user, consulta["lojas"])
+
+        ds = self._dataset()
+        tag = etag(ds.version, consulta)
+        cabecalhos = {"ETag": tag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+        pedidas = _etags(self.headers.get("If-None-Match"))
+        if tag in pedidas or "*" in pedidas:
+            self._responder(HTTPStatus.NOT_MODIFIED, b"", cabecalhos)
+            return
+        self._responder(HTTPStatus.OK, agregado_json(ds, consulta),
+                        {**cabecalhos, "Content-Type": "application/json; charset=utf-8"})
+
+    def _pessoas(self, query: Dict[str, List[str]]):
+        from avaliacao.identity import BUSCA_LIMITE, indice_pessoas
+        from avaliacao.user_registry import get_registry
+
+        user = _usuario(self.headers.get("Authorization"))
+        desconhecidos = sorted(set(query) - {"q", "limite"})
+        if desconhecidos:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, f"Parâmetro(s) desconhecido(s): {', '.join(desconhecidos)}")
+        texto = query.get("q", [""])[-1]
+        try:
+            limite = int(query.get("limite", [BUSCA_LIMITE])[-1])
+        except ValueError:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "limite deve ser inteiro")
+        if not 1 <= limite <= 100:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "limite deve estar entre 1 e 100")
+        ds = self._dataset()
+        pessoas = indice_pessoas(ds).buscar(texto, get_registry().stores_for(user), limite)
+        self._json(HTTPStatus.OK, {"versao": ds.version, "q": texto, "pessoas": pessoas},
+                   {"Cache-Control": "private, no-cache", "Vary": "Authorization"})
+
+    def _receber(self):
+        from avaliacao.federation import FONTE_PADRAO, Fonte, escolher_fonte
+        from avaliacao.ingest import normalizar_envio, registrar
+
+        user = _usuario(self.headers.get("Authorization"))
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            tamanho = -1
+        if tamanho < 0:  # rfile.read(-1) esperaria o cliente fechar a conexão
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if tamanho > MAX_CORPO:
+            raise ErroHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Corpo maior que {MAX_CORPO} bytes")
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b"null")
+        except ValueError:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Corpo não é JSON")
+        if not isinstance(corpo, dict):
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, 'Envie {"aba": ..., "linhas": [[A, ..., M], ...]}')
+        try:
+            fonte = (Fonte(FONTE_PADRAO, self.spreadsheet) if self.spreadsheet
+                     else escolher_fonte(corpo.get("fonte")))
+            rec, rejeitadas = normalizar_envio(corpo.get("aba"), corpo.get("linhas"), fonte)
+        except ValueError as e:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, str(e))
+        if not rec.empty:
+            _lojas_no_escopo(user, sorted(rec["Loja"].unique()))
+        aceitas = registrar(fonte.planilha, rec)
+        self._json(HTTPStatus.ACCEPTED if aceitas else HTTPStatus.UNPROCESSABLE_ENTITY,
+                   {"aceitas": aceitas, "rejeitadas": rejeitadas})
+
+    def _json(self, status: HTTPStatus, obj, headers: Optional[Dict[str, str]] = None):
+        corpo = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self._responder(status, corpo, {**(headers or {}), "Content-Type": "application/json; charset=utf-8"})
+
+    def _responder(self, status: HTTPStatus, corpo: bytes, headers: Dict[str, str]):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        if corpo:
+            self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Agregados do painel em JSON (somente leitura)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8502)
+    parser.add_argument("--planilha", help="URL ou ID de uma planilha (padrão: as fontes do app, fontes.toml)")
+    parser.add_argument("--token", metavar="USUARIO", help="Só gera um token para o usuário e sai")
+    parser.add_argument("--dias", type=float, default=30, help="Validade do token gerado com --token")
+    args = parser.parse_args(argv)
+
+    # requisições e avisos do servidor; os spans do perf só com AVALIACAO_PERF_LOG
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+    logger.setLevel(logging.INFO)
+    from auth import has_token_secret, issue_session_token
+    from avaliacao.user_registry import get_registry
+
+    if args.token:
+        if not has_token_secret():
+            print("Defina AVALIACAO_TOKEN_SECRET ou [auth] token_secret: sem a chave fixa o token "
+                  "não vale no servidor", file=sys.stderr)
+            return 1
+        if get_registry().get(args.token) is None:
+            print(f"Usuário desconhecido: {args.token}", file=sys.stderr)
+            return 1
+        print(issue_session_token(args.token, ttl=int(args.dias * 86400)))
+        return 0
+
+    if not has_token_secret():
+        logger.warning("Sem AVALIACAO_TOKEN_SECRET nem [auth] token_secret: nenhum token externo é aceito")
+
+    # Dataset e pilha de dados carregados em segundo plano desde já
+    from avaliacao.warmup import iniciar
+    iniciar(args.planilha)
+
+    Handler.spreadsheet = args.planilha
+    server = ThreadingHTTPServer((args.host, args.porta), Handler)
+    server.daemon_threads = True
+    logger.info("Servindo em http://%s:%d/api/saude", args.host, args.porta)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compacta as avaliações antigas da planilha no histórico local (Parquet, um diretório por mês).
+
+Depois da compactação o app e os scripts leem do Google Sheets só a parte recente de cada
+aba; os meses arquivados só são abertos quando o período filtrado chega neles. A planilha
+não é alterada. Rodar de novo com um corte mais novo arquiva só o que ainda não foi.
+
+Se linhas já arquivadas forem editadas, apagadas ou reordenadas na planilha, o app avisa
+e lê a aba inteira até o histórico ser refeito com --refazer.
+
+Exemplos:
+    python arquivar.py --meses 3              # mantém no Sheets o mês atual e os 3 anteriores
+    python arquivar.py --corte 01/01/2025     # arquiva tudo antes de 2025
+    python arquivar.py --status
+    python arquivar.py --meses 3 --refazer
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime
+from typing import List, Optional
+
+from avaliacao.archive import Arquivo, compactar, pasta_historico
+from avaliacao.federation import get_fontes
+
+
+def corte_por_meses(meses: int, hoje: Optional[date] = None) -> date:
+    """Primeiro dia do mês `meses` meses antes do mês atual"""
+    hoje = hoje or date.today()
+    n = hoje.year * 12 + hoje.month - 1 - meses
+    return date(n // 12, n % 12 + 1, 1)
+
+
+def _status(arquivo: Optional[Arquivo], pasta: str) -> None:
+    if arquivo is None:
+        print(f"Sem histórico em {pasta}")
+        return
+    m = arquivo.manifesto
+    print(f"Histórico {arquivo.versao} em {pasta} (atualizado em {m['atualizado_em']})")
+    desde = f"  desde: {arquivo.primeira_data:%d/%m/%Y}" if arquivo.primeira_data else ""
+    print(f"  corte: {arquivo.corte:%d/%m/%Y}  linhas: {arquivo.linhas}{desde}")
+    for mes, partes in sorted(m["meses"].items()):
+        print(f"  {mes:<10}{sum(p['linhas'] for p in partes):>10} linhas  {len(partes)} parte(s)")
+    for aba, info in sorted(m["abas"].items()):
+        print(f"  aba {aba}: {info['linhas']} linhas da planilha arquivadas")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Arquiva as avaliações antigas em Parquet por mês")
+    quando = parser.add_mutually_exclusive_group()
+    quando.add_argument("--meses", type=int, help="Meses completos mantidos no Sheets além do atual")
+    quando.add_argument("--corte", help="Arquiva as linhas anteriores a esta data (dd/mm/aaaa)")
+    parser.add_argument("--planilha", help="URL ou ID de uma planilha (padrão: todas as de fontes.toml)")
+    parser.add_argument("--refazer", action="store_true", help="Descarta o histórico e arquiva de novo")
+    parser.add_argument("--status", action="store_true", help="Só mostra o histórico atual")
+    args = parser.parse_args(argv)
+
+    planilhas = [args.planilha] if args.planilha else [f.planilha for f in get_fontes()]
+    if not args.status and args.meses is None and not args.corte:
+        parser.error("informe --meses ou --corte (ou --status)")
+
+    erros = 0
+    for planilha in planilhas:
+        pasta = pasta_historico(planilha)
+        if args.status:
+            _status(Arquivo.abrir(planilha), pasta)
+            continue
+        corte = (datetime.strptime(args.corte, "%d/%m/%Y").date() if args.corte
+                 else corte_por_meses(args.meses))
+        antes = Arquivo.abrir(planilha)
+        t0 = time.perf_counter()
+        try:
+            compactar(planilha, corte, refazer=args.refazer)
+        except RuntimeError as e:
+            # uma planilha com problema não impede as outras
+            print(f"ERRO ({pasta}): {e}", file=sys.stderr)
+            erros += 1
+            continue
+        depois = Arquivo.abrir(planilha)
+        novas = depois.linhas - (antes.linhas if antes and not args.refazer else 0)
+        print(f"{novas} linha(s) arquivada(s) em {time.perf_counter() - t0:.1f}s")
+        _status(depois, pasta)
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,99 +1,49 @@
 # auth.py — Sistema de Autenticação
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Deque, Dict, List, Optional
+
 import bcrypt
 import streamlit as st
-from typing import Dict, List, Optional, Tuple
-
-# Usuários administrativos (acesso a todas as lojas)
-ADMIN_USERS = {
-    "GhtDev": {
-        "password_hash": "$2b$12$OnIkl662ci5vz6qLSgoX1.hxXMAUs6H9c/EYhbLubDCmaqBEzT0pq",  # 18111997
-        "role": "admin",
-        "name": "GhtDev",
-        "access_level": "all_stores"
-    },
-    "Monitoramento": {
-        "password_hash": "$2b$12$4Db7oIeIU9Scj4f8XtMkjelAs0Q4S5iezRKA5CteWWEAruuPAIEVy",  # Monitoramento
-        "role": "admin", 
-        "name": "Monitoramento",
-        "access_level": "all_stores"
-    }
-}
-
-# Usuários de loja (acesso restrito às próprias lojas)
-STORE_USERS = {
-    "Carioca": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Carioca",
-        "access_level": "Carioca"
-    },
-    "Santa Cruz": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Santa Cruz", 
-        "access_level": "Santa Cruz"
-    },
-    "Mesquita": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Mesquita",
-        "access_level": "Mesquita"
-    },
-    "Nilópolis": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Nilópolis",
-        "access_level": "Nilópolis"
-    },
-    "Madureira": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Madureira",
-        "access_level": "Madureira"
-    },
-    "Bonsucesso": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Bonsucesso",
-        "access_level": "Bonsucesso"
-    },
-    "Taboão": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Taboão",
-        "access_level": "Taboão"
-    },
-    "São Bernardo": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "São Bernardo",
-        "access_level": "São Bernardo"
-    },
-    "Santo André": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Santo André",
-        "access_level": "Santo André"
-    },
-    "Mauá": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "Mauá",
-        "access_level": "Mauá"
-    },
-    "MDC São Mateus": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "MDC São Mateus",
-        "access_level": "MDC São Mateus"
-    },
-    "CDM São Mateus": {
-        "password_hash": "$2b$12$Na7gsSgxP2sv6Zz0SJYdfeniqNiedmpb./6hGbBu7fOlcsjWBX3hq",  # loja123
-        "role": "store",
-        "name": "CDM São Mateus",
-        "access_level": "CDM São Mateus"
-    }
-}
+
+from avaliacao.user_registry import get_registry, revogar_tokens, tokens_validos_apos
+
+# Usuários e lojas ficam em usuarios.toml (ver user_registry.py), recarregado ao mudar
+
+# ---------------------------------
+# VERIFICAÇÃO DE SENHA (pool limitado)
+# ---------------------------------
+# bcrypt (12 rounds) leva centenas de ms; roda num pool pequeno para que uma leva de
+# logins na troca de turno não ocupe todos os núcleos. bcrypt libera o GIL.
+BCRYPT_WORKERS = 4
+BCRYPT_MAX_PENDENTES = 32      # logins na fila além disso recebem "servidor ocupado"
+BCRYPT_TIMEOUT = 10            # segundos
+
+# Limite de tentativas por usuário
+MAX_TENTATIVAS = 5
+JANELA_TENTATIVAS = 300        # segundos
+FALHAS_MAX_USUARIOS = 10_000   # nomes com falhas recentes guardados (os mais antigos saem)
+
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_bcrypt_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDENTES)
+_falhas: Dict[str, Deque[float]] = {}
+_falhas_lock = threading.Lock()
+
+
+class LoginThrottled(Exception):
+    """Muitas tentativas para o usuário ou fila de verificação cheia"""
+
+    def __init__(self, msg: str, retry_after: int = 0):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
 
 def hash_password(password: str) -> str:
     """Gera hash da senha usando bcrypt"""
@@ -104,32 +54,175 @@ def verify_password(password: str, hashed: str) -> bool:
     """Verifica se a senha corresponde ao hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def _verify_password_pooled(password: str, hashed: str) -> bool:
+    """verify_password no pool de bcrypt, com fila limitada"""
+    if not _bcrypt_slots.acquire(timeout=BCRYPT_TIMEOUT):
+        raise LoginThrottled("Servidor ocupado verificando outros logins. Tente novamente em instantes.", 5)
+    try:
+        future = _bcrypt_pool.submit(verify_password, password, hashed)
+    except BaseException:
+        _bcrypt_slots.release()
+        raise
+    # a vaga só volta quando o bcrypt termina, mesmo que quem esperava tenha desistido
+    future.add_done_callback(lambda _: _bcrypt_slots.release())
+    try:
+        return future.result(timeout=BCRYPT_TIMEOUT)
+    except FutureTimeout:
+        raise LoginThrottled("Servidor ocupado verificando outros logins. Tente novamente em instantes.", 5)
+
+def _check_throttle(username: str):
+    """Levanta LoginThrottled se o usuário excedeu MAX_TENTATIVAS na janela"""
+    agora = time.monotonic()
+    with _falhas_lock:
+        falhas = _falhas.get(username)
+        if not falhas:
+            return
+        while falhas and agora - falhas[0] > JANELA_TENTATIVAS:
+            falhas.popleft()
+        if not falhas:
+            del _falhas[username]
+            return
+        if len(falhas) >= MAX_TENTATIVAS:
+            espera = int(JANELA_TENTATIVAS - (agora - falhas[0])) + 1
+            raise LoginThrottled(f"Muitas tentativas. Aguarde {espera}s para tentar novamente.", espera)
+
+def _register_failure(username: str):
+    """Anota a falha; nomes sem falha na janela saem, e o total de nomes é limitado
+
+    Sem isso cada nome inventado ficaria no dicionário para sempre.
+    """
+    agora = time.monotonic()
+    with _falhas_lock:
+        falhas = _falhas.pop(username, None) or deque(maxlen=MAX_TENTATIVAS)
+        falhas.append(agora)
+        vencidos = [nome for nome, f in _falhas.items() if agora - f[-1] > JANELA_TENTATIVAS]
+        for nome in vencidos:
+            del _falhas[nome]
+        while len(_falhas) >= FALHAS_MAX_USUARIOS:
+            del _falhas[next(iter(_falhas))]  # o de falha mais antiga (ordem de inserção)
+        _falhas[username] = falhas
+
+def _lookup_user(username: str) -> Optional[Dict]:
+    return get_registry().get(username)
+
 def authenticate_user(username: str, password: str) -> Optional[Dict]:
-    """Autentica usuário e retorna dados do usuário se válido"""
-    # Verificar usuários administrativos
-    if username in ADMIN_USERS:
-        user_data = ADMIN_USERS[username]
-        if verify_password(password, user_data["password_hash"]):
-            return user_data
-    
-    # Verificar usuários de loja
-    if username in STORE_USERS:
-        user_data = STORE_USERS[username]
-        if verify_password(password, user_data["password_hash"]):
-            return user_data
-    
+    """Autentica usuário e retorna dados do usuário se válido
+
+    Levanta LoginThrottled quando o usuário está bloqueado por excesso de tentativas.
+    """
+    _check_throttle(username)
+    user_data = _lookup_user(username)
+    if user_data and _verify_password_pooled(password, user_data["password_hash"]):
+        with _falhas_lock:
+            _falhas.pop(username, None)
+        return user_data
+    _register_failure(username)
     return None
 
+
+# ---------------------------------
+# TOKEN DE SESSÃO (HMAC)
+# ---------------------------------
+# Depois do login o navegador guarda um token assinado num cookie; reloads e novas abas
+# validam o token (HMAC, microssegundos) em vez de repetir o bcrypt. O token leva a hora
+# de emissão: o logout revoga no servidor os tokens emitidos antes dele (user_registry.py),
+# já que o cookie gravado por JavaScript não é HttpOnly e pode ter sido copiado.
+TOKEN_COOKIE = "avaliacao_sessao"
+TOKEN_TTL = 12 * 3600          # segundos (um turno)
+
+_token_secret_cache: Optional[bytes] = None
+
+def _token_secret() -> bytes:
+    """Chave do HMAC: [auth] token_secret no secrets.toml, env AVALIACAO_TOKEN_SECRET ou aleatória
+
+    Com a chave aleatória (padrão) os tokens valem só até o servidor reiniciar.
+    """
+    global _token_secret_cache
+    if _token_secret_cache is None:
+        secret = _configured_token_secret()
+        _token_secret_cache = secret.encode("utf-8") if secret else secrets.token_bytes(32)
+    return _token_secret_cache
+
+def _configured_token_secret() -> Optional[str]:
+    secret = os.environ.get("AVALIACAO_TOKEN_SECRET")
+    if not secret:
+        try:
+            secret = st.secrets["auth"]["token_secret"]
+        except Exception:
+            secret = None
+    return secret or None
+
+def has_token_secret() -> bool:
+    """True se a chave do HMAC vem da configuração (tokens valem entre processos, ex.: api_server.py)"""
+    return _configured_token_secret() is not None
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(_token_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+
+def issue_session_token(username: str, ttl: int = TOKEN_TTL) -> str:
+    """Gera token assinado "usuario.emissao_ms.expiracao.assinatura" para o usuário"""
+    agora = time.time()
+    payload = f"{_b64(username.encode('utf-8'))}.{int(agora * 1000)}.{int(agora) + ttl}"
+    return f"{payload}.{_sign(payload)}"
+
+def verify_session_token(token: str) -> Optional[Dict]:
+    """Retorna os dados do usuário se o token for válido, não expirado e não revogado"""
+    try:
+        user_b64, emissao_ms, exp, sig = token.split(".")
+        if not hmac.compare_digest(sig, _sign(f"{user_b64}.{emissao_ms}.{exp}")):
+            return None
+        if int(exp) < time.time():
+            return None
+        username = _unb64(user_b64).decode("utf-8")
+        if int(emissao_ms) / 1000 < tokens_validos_apos(username):
+            return None
+        return _lookup_user(username)
+    except Exception:
+        return None
+
+def _set_cookie_js(value: str, max_age: int):
+    """Grava/remove o cookie de sessão no navegador (componente invisível, só no login/logout)"""
+    import streamlit.components.v1 as components
+    components.html(
+        f"<script>window.parent.document.cookie = "
+        f"'{TOKEN_COOKIE}={value}; max-age={max_age}; path=/; SameSite=Strict';</script>",
+        height=0,
+    )
+
+def _restore_session_from_cookie() -> bool:
+    """Tenta autenticar a sessão pelo cookie (uma vez por sessão)"""
+    if st.session_state.get("_token_checked") or st.session_state.get("_logged_out"):
+        return False
+    st.session_state._token_checked = True
+    try:
+        token = st.context.cookies.get(TOKEN_COOKIE)
+    except Exception:
+        token = None
+    user_data = verify_session_token(token) if token else None
+    if user_data:
+        st.session_state.authenticated = True
+        st.session_state.user_data = user_data
+        return True
+    return False
+
 def get_user_stores(user_data: Dict) -> List[str]:
     """Retorna lista de lojas que o usuário pode acessar"""
-    if user_data["role"] == "admin":
+    stores = get_registry().stores_for(user_data)
+    if stores is None:
         return []  # Lista vazia significa acesso a todas as lojas
-    else:
-        return [user_data["access_level"]]
+    return sorted(stores)
 
 def is_authenticated() -> bool:
-    """Verifica se o usuário está autenticado"""
-    return "authenticated" in st.session_state and st.session_state.authenticated
+    """Verifica se o usuário está autenticado (sessão ou cookie com token válido)"""
+    if "authenticated" in st.session_state and st.session_state.authenticated:
+        return True
+    return _restore_session_from_cookie()
 
 def get_current_user() -> Optional[Dict]:
     """Retorna dados do usuário atual"""
@@ -137,20 +230,35 @@ def get_current_user() -> Optional[Dict]:
         return st.session_state.get("user_data")
     return None
 
-def login_user(user_data: Dict):
-    """Define usuário como autenticado"""
+def login_user(user_data: Dict, username: Optional[str] = None):
+    """Define usuário como autenticado e agenda a gravação do cookie de sessão"""
     st.session_state.authenticated = True
     st.session_state.user_data = user_data
+    st.session_state.pop("_logged_out", None)
+    # O cookie é gravado no próximo rerun (show_logout_button), depois do st.rerun do login
+    st.session_state._pending_token = issue_session_token(username or user_data["name"])
 
 def logout_user():
-    """Remove autenticação do usuário"""
+    """Remove autenticação do usuário e revoga os tokens dele no servidor"""
+    username = (st.session_state.get("user_data") or {}).get("username")
+    if username:
+        try:
+            revogar_tokens(username)
+        except OSError as e:
+            st.warning(f"Não foi possível encerrar a sessão nos outros dispositivos: {e}")
     if "authenticated" in st.session_state:
         del st.session_state.authenticated
     if "user_data" in st.session_state:
         del st.session_state.user_data
+    # Os cookies lidos pelo servidor são os da conexão; sem esta marca a sessão
+    # se reautenticaria com o cookie antigo no próximo rerun
+    st.session_state._logged_out = True
+    st.session_state._clear_cookie = True
 
 def show_login_form():
     """Exibe formulário de login"""
+    if st.session_state.pop("_clear_cookie", False):
+        _set_cookie_js("", 0)
     st.title("🔐 Login - Avaliação de Colaboradores")
     
     with st.form("login_form"):
@@ -161,9 +269,9 @@ def show_login_form():
         
         col1, col2 = st.columns([1, 1])
         with col1:
-            login_button = st.form_submit_button("Entrar", use_container_width=True)
+            login_button = st.form_submit_button("Entrar", width="stretch")
         with col2:
-            if st.form_submit_button("Limpar", use_container_width=True):
+            if st.form_submit_button("Limpar", width="stretch"):
                 st.rerun()
         
         if login_button:
@@ -171,9 +279,13 @@ def show_login_form():
                 st.error("⚠️ Por favor, preencha todos os campos")
                 return False
             
-            user_data = authenticate_user(username, password)
+            try:
+                user_data = authenticate_user(username, password)
+            except LoginThrottled as e:
+                st.error(f"⏳ {e}")
+                return False
             if user_data:
-                login_user(user_data)
+                login_user(user_data, username)
                 st.success(f"✅ Login realizado com sucesso! Bem-vindo, {user_data['name']}")
                 st.rerun()
             else:
@@ -184,20 +296,25 @@ def show_login_form():
 def show_logout_button():
     """Exibe botão de logout na sidebar"""
     if is_authenticated():
+        token = st.session_state.pop("_pending_token", None)
+        if token:
+            _set_cookie_js(token, TOKEN_TTL)
         user_data = get_current_user()
         st.sidebar.markdown("---")
         st.sidebar.markdown(f"**Usuário:** {user_data['name']}")
         st.sidebar.markdown(f"**Tipo:** {'Administrador' if user_data['role'] == 'admin' else 'Loja'}")
         
-        if st.sidebar.button("🚪 Sair", use_container_width=True):
+        if st.sidebar.button("🚪 Sair", width="stretch"):
             logout_user()
             st.rerun()
 
-def filter_data_by_user_access(data, user_data):
-    """Filtra dados baseado no acesso do usuário"""
-    if user_data["role"] == "admin":
-        return data  # Administradores veem tudo
-    else:
-        # Usuários de loja veem apenas sua loja
-        store_name = user_data["access_level"]
-        return data[data["Loja"] == store_name]
+def filter_data_by_user_access(data, user_data, partitions=None):
+    """Filtra dados baseado no acesso do usuário
+
+    Com `partitions` (índices por loja, ver avaliacao.dataset) junta só as fatias das
+    lojas permitidas, sem comparar a coluna Loja linha a linha.
+    """
+    from avaliacao.dataset import rows_for_stores
+
+    # None = administrador (tudo); conjunto vazio = usuário que saiu do cadastro (nada)
+    return rows_for_stores(data, get_registry().stores_for(user_data), partitions)
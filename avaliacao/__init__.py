@@ -0,0 +1,108 @@
+# avaliacao — Camada de dados e análises do dashboard de avaliação (sem Streamlit)
+#
+#     from avaliacao import load_dataset, aplicar_filtros, build_summary
+#
+#     ds = load_dataset()                               # Dataset: versão, dados, avisos
+#     df = aplicar_filtros(ds.for_stores(["Carioca"]), hora_ini=8, hora_fim=18)
+#     resumo = build_summary(df, ["Colaborador", "Loja"])
+#
+# Módulos:
+#   sources    — credenciais, cliente do Sheets (real ou falso) e leitura das abas
+#   normalize  — abas cruas (layout A–M) -> formato do dashboard
+#   quality    — regras de qualidade por linha, quarentena e contagens por aba de cada carga
+#   identity   — nome canônico de colaboradores/avaliadores (apelidos.toml), ID estável e busca
+#   dataset    — snapshot normalizado por versão, com índices por loja
+#   shared     — o mesmo snapshot para vários processos do host (Arrow via mmap)
+#   archive    — histórico antigo em Parquet por mês, lido só quando o período pede
+#   federation — várias planilhas (fontes.toml) carregadas em paralelo num dataset só
+#   ingest     — respostas enviadas pelo formulário, aplicadas ao snapshot em lotes
+#   analytics  — filtros, resumos, ranking de avaliadores, volume por hora
+#   engines    — recorte filtrado com as agregações em pandas ou DuckDB (AVALIACAO_ENGINE)
+#   distribution — contagem por nota, mediana, p10/p90 e % sem nota (cubo de histogramas)
+#   trends     — séries diárias/semanais e médias móveis por colaborador, setor e loja
+#   exports    — relatório Excel e exportação Parquet/Arrow/CSV
+#   aggregates — KPIs, resumos, ranking e volume por hora em JSON, com ETag (api_server.py)
+#   warmup     — pré-carga do dataset e da pilha de dados em segundo plano
+#
+# `import avaliacao` não carrega pandas nem os submódulos: os nomes abaixo são
+# importados no primeiro acesso.
+
+import importlib
+
+_API = {
+    "SPREADSHEET_URL": "sources",
+    "fetch_sheets": "sources",
+    "get_sheets_client": "sources",
+    "set_sheets_client": "sources",
+    "load_sa_creds": "sources",
+    "build_dataset": "normalize",
+    "normalize_sheet": "normalize",
+    "get_regiao": "normalize",
+    "REGRAS": "quality",
+    "RelatorioQualidade": "quality",
+    "historico_versoes": "quality",
+    "canonizar": "identity",
+    "dobrar": "identity",
+    "pessoa_id": "identity",
+    "indice_pessoas": "identity",
+    "Dataset": "dataset",
+    "load_dataset": "dataset",
+    "get_dataset": "dataset",
+    "dataset_pronto": "dataset",
+    "invalidate_dataset": "dataset",
+    "partition_by_store": "dataset",
+    "rows_for_stores": "dataset",
+    "Arquivo": "archive",
+    "com_historico": "archive",
+    "compactar": "archive",
+    "Fonte": "federation",
+    "get_fontes": "federation",
+    "get_dataset_federado": "federation",
+    "invalidar_fontes": "federation",
+    "normalizar_envio": "ingest",
+    "ClienteIngestao": "ingest",
+    "ClienteLocal": "ingest",
+    "NIVEIS_RESUMO": "analytics",
+    "COMPARACOES": "analytics",
+    "periodo_anterior": "analytics",
+    "aplicar_filtros": "analytics",
+    "chave_filtro": "analytics",
+    "build_summary": "analytics",
+    "ranking_avaliadores": "analytics",
+    "pivot_avaliadores": "analytics",
+    "volume_por_hora": "analytics",
+    "recorte": "engines",
+    "Recorte": "engines",
+    "comparacao": "engines",
+    "Comparacao": "engines",
+    "distribuicao": "distribution",
+    "cubo_distribuicao": "distribution",
+    "NIVEIS_TENDENCIA": "trends",
+    "cubo_diario": "trends",
+    "maiores_variacoes": "trends",
+    "serie_tendencia": "trends",
+    "gerar_relatorio_excel_por_loja": "exports",
+    "relatorio_excel_bytes": "exports",
+    "arquivo_exportacao": "exports",
+    "bytes_exportacao": "exports",
+    "exportar": "exports",
+    "FORMATOS": "exports",
+    "agregado_json": "aggregates",
+    "normalizar_consulta": "aggregates",
+    "etag": "aggregates",
+}
+
+__all__ = sorted(_API)
+
+
+def __getattr__(name):
+    modulo = _API.get(name)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    valor = getattr(importlib.import_module(f".{modulo}", __name__), name)
+    globals()[name] = valor  # próximos acessos não passam mais por aqui
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,150 @@
+# avaliacao/aggregates.py — Agregados do painel (KPIs, resumos, distribuição, ranking, volume por hora) em JSON
+#
+# Para consumidores fora do Streamlit (api_server.py: painel de TV das lojas, e-mail
+# semanal), que pedem sempre os mesmos recortes. Uma consulta normalizada mais a versão
+# do dataset identificam a resposta: a ETag sai dessa chave sem calcular nada, e o JSON
+# pronto fica num LRU compartilhado pelo processo.
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .analytics import NIVEIS_RESUMO, NOTAS_RESUMO
+from .dataset import Dataset
+from .engines import recorte
+from .perf import incr, span
+
+CONSULTAS = ("kpis", "resumo", "distribuicao", "ranking_avaliadores", "volume_por_hora")
+
+# Nível do resumo -> colunas de agrupamento (os mesmos cinco resumos do app)
+NIVEIS = dict(zip(("pessoa", "setor", "loja", "regiao", "geral"), NIVEIS_RESUMO))
+
+
+def _data(valor) -> Optional[str]:
+    """dd/mm/aaaa, aaaa-mm-dd ou date -> aaaa-mm-dd"""
+    if valor in (None, ""):
+        return None
+    if isinstance(valor, date):
+        return valor.isoformat()
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(valor).strip(), fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {valor!r} (use dd/mm/aaaa ou aaaa-mm-dd)")
+
+
+def _lista(valor) -> Optional[List[str]]:
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    itens = sorted({v.strip() for v in valor if v and v.strip()})
+    return itens or None
+
+
+def normalizar_consulta(tipo: str, lojas: Optional[Iterable[str]] = None, regiao: str = "Todos",
+                        setores=None, de=None, ate=None, hora_ini=0, hora_fim=23,
+                        nivel: str = "loja", top=None) -> Dict:
+    """Consulta em forma canônica (listas ordenadas, datas ISO); ValueError se inválida
+
+    `lojas` None = todas as lojas do escopo; a checagem de permissão fica com quem chama.
+    """
+    if tipo not in CONSULTAS:
+        raise ValueError(f"Consulta desconhecida: {tipo!r} (use {', '.join(CONSULTAS)})")
+    try:
+        hora_ini, hora_fim = int(hora_ini), int(hora_fim)
+        top = int(top) if top not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError("hora_ini, hora_fim e top devem ser inteiros")
+    if not 0 <= hora_ini <= hora_fim <= 23:
+        raise ValueError("Faixa de hora inválida (0 <= hora_ini <= hora_fim <= 23)")
+    consulta = {
+        "tipo": tipo,
+        "lojas": _lista(lojas),
+        "regiao": regiao or "Todos",
+        "setores": _lista(setores),
+        "de": _data(de),
+        "ate": _data(ate) or _data(de),
+        "hora_ini": hora_ini,
+        "hora_fim": hora_fim,
+    }
+    if tipo in ("resumo", "distribuicao"):
+        if nivel not in NIVEIS:
+            raise ValueError(f"Nível desconhecido: {nivel!r} (use {', '.join(NIVEIS)})")
+        consulta["nivel"] = nivel
+    if tipo == "ranking_avaliadores" and top:
+        consulta["top"] = top
+    return consulta
+
+
+def chave_consulta(consulta: Dict) -> str:
+    return hashlib.sha1(json.dumps(consulta, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def etag(dataset_version: str, consulta: Dict) -> str:
+    """ETag forte da resposta: muda só quando o dataset ou a consulta mudam"""
+    return f'"{dataset_version}-{chave_consulta(consulta)}"'
+
+
+def _registros(df: pd.DataFrame) -> List[Dict]:
+    # to_json converte NaN em null e tipos do numpy em tipos JSON
+    return json.loads(df.to_json(orient="records", force_ascii=False, date_format="iso"))
+
+
+def calcular(dataset: Dataset, consulta: Dict) -> Dict:
+    """Resposta da consulta (sem cache)"""
+    de = date.fromisoformat(consulta["de"]) if consulta["de"] else None
+    ate = date.fromisoformat(consulta["ate"]) if consulta["ate"] else None
+    rec = recorte(dataset, consulta["lojas"], (de, ate, consulta["regiao"], None, consulta["setores"],
+                                               consulta["hora_ini"], consulta["hora_fim"]))
+    tipo = consulta["tipo"]
+    linhas = None
+    if tipo == "kpis":
+        dados = {
+            "total": _registros(rec.resumo([]))[0],
+            "lojas": _registros(rec.resumo(["Região", "Loja"])),
+        }
+    elif tipo == "resumo":
+        dados = _registros(rec.resumo(NIVEIS[consulta["nivel"]]))
+    elif tipo == "distribuicao":
+        dist = rec.distribuicao(NIVEIS[consulta["nivel"]])
+        dados = _registros(dist)
+        linhas = int(dist["Avaliações"].sum()) // len(NOTAS_RESUMO)  # do cubo, sem filtrar as linhas
+    elif tipo == "ranking_avaliadores":
+        rank = rec.ranking_avaliadores()
+        dados = _registros(rank.head(consulta["top"]) if consulta.get("top") else rank)
+    else:
+        por_hora, _ = rec.volume_por_hora()
+        dados = _registros(por_hora.astype({"Hora_num": int}))  # float na origem por causa dos vazios
+    return {"versao": dataset.version, "consulta": consulta, "linhas": len(rec) if linhas is None else linhas,
+            "dados": dados}
+
+
+AGREGADOS_CACHE_SIZE = 256  # respostas guardadas em memória (as menos usadas saem)
+
+_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def agregado_json(dataset: Dataset, consulta: Dict) -> bytes:
+    """JSON (UTF-8) da consulta, em cache por (versão do dataset, consulta)"""
+    chave = (dataset.version, chave_consulta(consulta))
+    incr("cache.agregados.chamadas")
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+    incr("cache.agregados.misses")
+    with span("agregado[" + consulta["tipo"] + "]", rows=len(dataset)):
+        corpo = json.dumps(calcular(dataset, consulta), ensure_ascii=False).encode("utf-8")
+    with _cache_lock:
+        _cache[chave] = corpo
+        while len(_cache) > AGREGADOS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return corpo
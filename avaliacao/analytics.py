@@ -0,0 +1,195 @@
+# avaliacao/analytics.py — Filtros e agregações do dashboard sobre o dataset normalizado
+#
+# Funções puras sobre DataFrame (sem Streamlit); cada uma vira um span em perf.py.
+
+import calendar
+import hashlib
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .perf import span
+
+# Níveis de resumo mostrados no app (do mais detalhado ao geral)
+NIVEIS_RESUMO = [
+    ["Colaborador", "Região", "Loja", "Setor"],
+    ["Setor", "Região", "Loja"],
+    ["Região", "Loja"],
+    ["Região"],
+    [],
+]
+
+def build_summary(df: pd.DataFrame, by_cols: List[str]) -> pd.DataFrame:
+    with span("build_summary[" + ("/".join(by_cols) or "geral") + "]", rows=len(df)):
+        return _build_summary(df, by_cols)
+
+NOTAS_RESUMO = ["Velocidade", "Atendimento", "Qualidade", "Ajuda"]
+RANKING_COLS = ["Avaliador", "Região", "Loja"]
+HORA_COLS = ["Região", "Loja", "Hora_num"]
+
+def _build_summary(df: pd.DataFrame, by_cols: List[str]) -> pd.DataFrame:
+    work = df.copy()
+    work["Avaliações"] = 1
+    if by_cols:
+        means = work.groupby(by_cols, dropna=False)[NOTAS_RESUMO].mean(numeric_only=True)
+        counts = work.groupby(by_cols, dropna=False)["Avaliações"].sum()
+        out = means.join(counts).reset_index()
+    else:
+        out = pd.DataFrame({
+            "Velocidade": [work["Velocidade"].mean()],
+            "Atendimento": [work["Atendimento"].mean()],
+            "Qualidade": [work["Qualidade"].mean()],
+            "Ajuda": [work["Ajuda"].mean()],
+            "Avaliações": [work["Avaliações"].sum()],
+        })
+    return finalizar_resumo(out, by_cols)
+
+def finalizar_resumo(out: pd.DataFrame, by_cols: List[str]) -> pd.DataFrame:
+    """Média geral, arredondamento e ordem do resumo a partir das médias por grupo
+
+    `out`: chaves de grupo na ordem do groupby, médias das notas e "Avaliações".
+    Compartilhado pelos motores pandas e DuckDB (engines.py), para que os dois
+    devolvam exatamente o mesmo resultado.
+    """
+    out["Média Geral"] = out[["Velocidade","Atendimento","Qualidade","Ajuda"]].mean(axis=1)
+    out[["Velocidade","Atendimento","Qualidade","Ajuda","Média Geral"]] = \
+        out[["Velocidade","Atendimento","Qualidade","Ajuda","Média Geral"]].round(2)
+    if by_cols:
+        out = out.sort_values("Média Geral", ascending=False)
+    return out
+
+# ---------------------------------
+# COMPARAÇÃO DE PERÍODOS
+# ---------------------------------
+# Modo -> descrição no app. O período atual é o filtro de datas; o anterior sai dele.
+COMPARACOES = {
+    "anterior": "Período anterior (mesma duração)",
+    "mes": "Mesmo período do mês anterior",
+    "ano": "Mesmo período do ano anterior",
+}
+METRICAS_COMPARACAO = [*NOTAS_RESUMO, "Média Geral", "Avaliações"]
+
+def _mover_meses(d: date, meses: int, fim_do_mes: bool) -> date:
+    n = d.year * 12 + d.month - 1 - meses
+    ano, mes = n // 12, n % 12 + 1
+    ultimo = calendar.monthrange(ano, mes)[1]
+    return date(ano, mes, ultimo if fim_do_mes else min(d.day, ultimo))
+
+def periodo_anterior(d_ini: date, d_fim: Optional[date], modo: str = "anterior") -> Tuple[date, date]:
+    """Período de comparação de [d_ini, d_fim]: o imediatamente anterior de mesma duração,
+    o mesmo do mês anterior ou o do ano anterior (mês inteiro continua mês inteiro)"""
+    d_fim = d_fim or d_ini
+    if modo == "anterior":
+        dias = (d_fim - d_ini).days + 1
+        return d_ini - timedelta(days=dias), d_ini - timedelta(days=1)
+    if modo not in COMPARACOES:
+        raise ValueError(f"Comparação desconhecida: {modo!r} (use {', '.join(COMPARACOES)})")
+    meses = 1 if modo == "mes" else 12
+    fim_do_mes = d_fim.day == calendar.monthrange(d_fim.year, d_fim.month)[1]
+    return _mover_meses(d_ini, meses, False), _mover_meses(d_fim, meses, fim_do_mes)
+
+def rotular_periodos(datas: pd.Series, atual: Tuple[date, date], anterior: Tuple[date, date]) -> np.ndarray:
+    """0 para as datas do período atual, 1 para as do anterior, -1 fora dos dois (datas inclusive)"""
+    rotulo = np.full(len(datas), -1, dtype=np.int8)
+    for valor, (ini, fim) in ((1, anterior), (0, atual)):
+        dentro = (datas >= pd.Timestamp(ini)) & (datas < pd.Timestamp(fim) + pd.Timedelta(days=1))
+        rotulo[dentro.to_numpy()] = valor
+    return rotulo
+
+def finalizar_comparacao(out: pd.DataFrame, by_cols: List[str]) -> pd.DataFrame:
+    """Atual, anterior e variação lado a lado a partir das médias por (grupo, _periodo)
+
+    `out`: chaves, "_periodo" (0 atual, 1 anterior), médias das notas e "Avaliações" —
+    um groupby só sobre as linhas dos dois períodos. Compartilhado pelos dois motores.
+    """
+    partes = []
+    for periodo in (0, 1):
+        parte = finalizar_resumo(out.loc[out["_periodo"] == periodo].drop(columns="_periodo"), [])
+        partes.append(parte.set_index(by_cols) if by_cols else parte.reset_index(drop=True))
+    atual, anterior = partes
+    lado = atual.join(anterior, how="outer", rsuffix=" (anterior)") if by_cols else \
+        atual.reindex([0]).join(anterior.reindex([0]), rsuffix=" (anterior)")
+    for col in ("Avaliações", "Avaliações (anterior)"):
+        lado[col] = lado[col].fillna(0).astype("int64")
+    colunas = []
+    for m in METRICAS_COMPARACAO:
+        lado[f"Δ {m}"] = lado[m] - lado[f"{m} (anterior)"]
+        if m != "Avaliações":
+            lado[f"Δ {m}"] = lado[f"Δ {m}"].round(2)
+        colunas += [m, f"{m} (anterior)", f"Δ {m}"]
+    lado = lado[colunas].reset_index() if by_cols else lado[colunas].reset_index(drop=True)
+    if by_cols:
+        lado = lado.sort_values(["Média Geral", *by_cols], ascending=[False, *[True] * len(by_cols)],
+                                na_position="last").reset_index(drop=True)
+    return lado
+
+def ranking_avaliadores(df: pd.DataFrame) -> pd.DataFrame:
+    """Quantidade de avaliações feitas por avaliador/região/loja, do maior para o menor"""
+    with span("ranking_avaliadores", rows=len(df)):
+        return ordenar_ranking(df.groupby(RANKING_COLS).size().reset_index(name="Avaliações feitas"))
+
+def ordenar_ranking(contagem: pd.DataFrame) -> pd.DataFrame:
+    return contagem.sort_values(["Avaliações feitas","Avaliador"], ascending=[False, True])
+
+def pivot_avaliadores(rank_av: pd.DataFrame) -> pd.DataFrame:
+    """Avaliadores x lojas com a quantidade de avaliações (0 onde não avaliou)"""
+    with span("ranking_pivot"):
+        return (rank_av.pivot(index="Avaliador", columns="Loja", values="Avaliações feitas")
+                       .fillna(0).astype(int))
+
+def volume_por_hora(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(avaliações por região/loja/hora, pivot hora x loja)"""
+    with span("volume_por_hora", rows=len(df)):
+        por_hora = df.groupby(HORA_COLS).size().reset_index(name="Avaliações")
+        return por_hora, pivot_hora(por_hora)
+
+def pivot_hora(por_hora: pd.DataFrame) -> pd.DataFrame:
+    """Hora x loja com a quantidade de avaliações (0 onde não houve)"""
+    return por_hora.pivot(index="Hora_num", columns="Loja", values="Avaliações").fillna(0).astype(int).sort_index()
+
+def aplicar_filtros(data: pd.DataFrame, d_ini=None, d_fim=None, regiao: str = "Todos",
+                    lojas: Optional[List[str]] = None, setores: Optional[List[str]] = None,
+                    hora_ini: int = 0, hora_fim: int = 23) -> pd.DataFrame:
+    """Filtros da barra lateral: período (um dia ou intervalo), região, lojas, setores e faixa de hora"""
+    with span("filtros") as s:
+        mask = pd.Series(True, index=data.index)
+        # Filtro de data - aceita uma data ou período
+        if d_ini and d_fim:
+            if d_ini == d_fim:
+                # Se apenas uma data foi selecionada, filtrar apenas essa data
+                mask &= data["Data"].dt.date == d_ini
+            else:
+                # Se período foi selecionado, filtrar o período
+                mask &= data["Data"].between(pd.to_datetime(d_ini),
+                                             pd.to_datetime(d_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1),
+                                             inclusive="both")
+        elif d_ini:
+            # Se apenas data inicial foi selecionada
+            mask &= data["Data"].dt.date == d_ini
+        if regiao != "Todos":
+            mask &= data["Região"] == regiao
+        if lojas:
+            mask &= data["Loja"].isin(lojas)
+        if setores:
+            mask &= data["Setor"].isin(setores)
+        if "Hora_num" in data.columns:
+            mask &= data["Hora_num"].between(hora_ini, hora_fim)
+
+        out = data.loc[mask].copy()
+        s.rows = len(out)
+    return out
+
+def chave_filtro(d_ini, d_fim, regiao: str, lojas: List[str], setores: List[str],
+                 hora_ini: int, hora_fim: int, stores: Optional[Iterable[str]] = None) -> str:
+    """Chave curta do filtro: junto com a versão do dataset identifica o recorte sem hashear o dataframe
+
+    `stores` é o escopo do usuário (UserRegistry.stores_for, None = todas as lojas). Com o
+    filtro de lojas vazio o recorte é o escopo inteiro, então usuários com escopos
+    diferentes e os mesmos filtros precisam de chaves diferentes.
+    """
+    return hashlib.sha1(repr((
+        str(d_ini), str(d_fim), regiao, sorted(lojas), sorted(setores), hora_ini, hora_fim,
+        None if stores is None else sorted(stores),
+    )).encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,342 @@
+# avaliacao/archive.py — Histórico arquivado: avaliações antigas em Parquet, um diretório por mês
+#
+# A planilha só cresce e quase ninguém olha meses antigos. arquivar.py compacta as linhas
+# anteriores a um corte em arquivos locais:
+#
+#     historico/<id da planilha>/manifesto.json
+#     historico/<id da planilha>/mes=2025-01/parte-<versão>.parquet
+#     historico/<id da planilha>/mes=sem-data/...          (data inválida)
+#
+# De cada aba vai para o histórico um prefixo: da primeira linha até antes da primeira com
+# data no corte ou depois (o formulário grava em ordem cronológica). Havendo manifesto,
+# load_dataset lê do Sheets só a cauda de cada aba, a partir da última linha arquivada
+# (conferida pela assinatura), e o Dataset leva junto o Arquivo. Os filtros de data
+# escolhem as partições em com_historico(): "últimos 7 dias" não abre o histórico, um ano
+# inteiro lê só os meses do ano. Só as partes listadas no manifesto são lidas, então uma
+# compactação interrompida não deixa dado pela metade.
+#
+# AVALIACAO_HISTORICO_DIR muda a pasta (padrão: historico/).
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .dataset import Dataset
+from .identity import canonizar
+from .normalize import colunas_de_data, get_regiao, normalize_sheet, parse_datetime_ptbr
+from .perf import incr, span
+from .sources import FETCH_PAUSE, _normalize_sheet_id, get_sheets_client, open_sheet_by_id
+
+logger = logging.getLogger("avaliacao")
+
+HISTORICO_DIR = os.environ.get("AVALIACAO_HISTORICO_DIR", "historico")
+MANIFESTO = "manifesto.json"
+SEM_DATA = "sem-data"
+
+# Colunas guardadas; Data_dia, Hora, Hora_num e Região são recalculadas na leitura
+COLUNAS_ARQUIVO = ["Data", "Setor", "Colaborador", "Velocidade", "Atendimento", "Qualidade", "Ajuda",
+                   "Avaliador", "Loja", "Notas_vazias"]
+
+
+def _assinatura(row: List[str]) -> str:
+    """Hash de uma linha crua (sem as células vazias do fim, que a API às vezes omite)"""
+    n = len(row)
+    while n and row[n - 1] == "":
+        n -= 1
+    return hashlib.sha1("\x1f".join(row[:n]).encode("utf-8")).hexdigest()[:16]
+
+
+def _frame(cabecalho: List[str], linhas: List[List[str]]) -> pd.DataFrame:
+    """DataFrame de linhas cruas, completando as que vieram mais curtas"""
+    largura = max([len(cabecalho)] + [len(r) for r in linhas])
+    linhas = [r + [""] * (largura - len(r)) if len(r) < largura else r for r in linhas]
+    return pd.DataFrame(linhas, columns=cabecalho + [""] * (largura - len(cabecalho)))
+
+
+def _mes(valor) -> str:
+    return f"{valor.year:04d}-{valor.month:02d}"
+
+
+def pasta_historico(spreadsheet: str) -> str:
+    return os.path.join(HISTORICO_DIR, _normalize_sheet_id(spreadsheet))
+
+
+class Arquivo:
+    """Histórico de uma planilha como descrito no manifesto (somente leitura)"""
+
+    def __init__(self, pasta: str, manifesto: Dict):
+        self.pasta = pasta
+        self.manifesto = manifesto
+
+    @classmethod
+    def abrir(cls, spreadsheet: str) -> Optional["Arquivo"]:
+        """Histórico da planilha, ou None se ela nunca foi compactada"""
+        pasta = pasta_historico(spreadsheet)
+        try:
+            with open(os.path.join(pasta, MANIFESTO), encoding="utf-8") as f:
+                return cls(pasta, json.load(f))
+        except FileNotFoundError:
+            return None
+
+    @property
+    def versao(self) -> str:
+        return self.manifesto["versao"]
+
+    @property
+    def corte(self) -> date:
+        return date.fromisoformat(self.manifesto["corte"])
+
+    @property
+    def primeira_data(self) -> Optional[date]:
+        d = self.manifesto.get("primeira_data")
+        return date.fromisoformat(d) if d else None
+
+    @property
+    def linhas(self) -> int:
+        return sum(p["linhas"] for partes in self.manifesto["meses"].values() for p in partes)
+
+    def meses_para(self, d_ini=None, d_fim=None) -> List[str]:
+        """Partições que o filtro de data do app precisa (sem data = todas, inclusive sem-data)"""
+        meses = sorted(self.manifesto["meses"])
+        if not d_ini:
+            return meses
+        ini, fim = _mes(d_ini), _mes(d_fim or d_ini)
+        return [m for m in meses if m != SEM_DATA and ini <= m <= fim]
+
+    def ler(self, meses: List[str]) -> pd.DataFrame:
+        """Linhas dos meses pedidos, com as colunas derivadas do formato do dashboard"""
+        with span("historico_leitura", meses=len(meses)) as s:
+            partes = [pd.read_parquet(os.path.join(self.pasta, p["arquivo"]))
+                      for m in meses for p in self.manifesto["meses"].get(m, [])]
+            df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_ARQUIVO)
+            colunas_de_data(df)
+            # partições gravadas antes de Notas_vazias existir: sem marcação de nota vazia
+            vazias = df["Notas_vazias"] if "Notas_vazias" in df.columns else pd.Series(0, index=df.index)
+            df["Notas_vazias"] = vazias.fillna(0).astype(np.int8)
+            df["Região"] = df["Loja"].map({l: get_regiao(l) for l in df["Loja"].unique()})
+            s.rows = len(df)
+        incr("historico.particoes_lidas", len(meses))
+        return df
+
+    def __repr__(self):
+        return f"<Arquivo {self.versao} corte {self.corte} {self.linhas} linhas, {len(self.manifesto['meses'])} meses>"
+
+
+# ---------------------------------
+# LEITURA: PARTE RECENTE DO SHEETS + MESES DO HISTÓRICO
+# ---------------------------------
+def ler_recentes(spreadsheet: str, arquivo: Arquivo, creds: Optional[dict] = None,
+                 client=None) -> Tuple[str, List[Tuple[str, pd.DataFrame]], List[str]]:
+    """Abas do Sheets a partir da última linha arquivada de cada uma, numa requisição só
+
+    Retorna (versão, [(aba, df)], abas cuja parte arquivada mudou na planilha). Essas
+    são lidas inteiras; quem chama descarta as linhas anteriores ao corte.
+    """
+    gc = client or get_sheets_client(creds)
+    sh = open_sheet_by_id(spreadsheet, client=gc)
+    ws_list = sh.worksheets()
+    abas = arquivo.manifesto["abas"]
+    faixas = []
+    for ws in ws_list:
+        n = abas.get(ws.title, {}).get("linhas", 0)
+        titulo = ws.title.replace("'", "''")
+        # linha 1 da planilha é o cabeçalho: a última arquivada é a n+1 (volta para conferir)
+        faixas += [f"'{titulo}'!A1:ZZ1", f"'{titulo}'!A{n + 1 if n else 2}:ZZ"]
+    with span("sheets_fetch", aba="recentes") as s:
+        resposta = sh.values_batch_get(faixas)["valueRanges"]
+        s.rows = sum(len(r.get("values", [])) for r in resposta[1::2])
+
+    digest = hashlib.sha1(arquivo.versao.encode("utf-8"))
+    dfs: List[Tuple[str, pd.DataFrame]] = []
+    mudaram: List[str] = []
+    for i, ws in enumerate(ws_list):
+        cabecalho = (resposta[2 * i].get("values") or [[]])[0]
+        linhas = resposta[2 * i + 1].get("values", [])
+        info = abas.get(ws.title)
+        if info:
+            if linhas and _assinatura(linhas[0]) == info["ultima"]:
+                linhas = linhas[1:]
+            else:
+                logger.warning("Aba '%s': parte já arquivada mudou na planilha; lendo a aba inteira", ws.title)
+                mudaram.append(ws.title)
+                values = ws.get_all_values()
+                cabecalho, linhas = (values[0], values[1:]) if values else ([], [])
+        if not cabecalho or not linhas:
+            continue
+        digest.update(ws.title.encode("utf-8"))
+        for row in linhas:
+            digest.update("\x1f".join(row).encode("utf-8"))
+        dfs.append((ws.title, _frame(cabecalho, linhas)))
+    return digest.hexdigest()[:12], dfs, mudaram
+
+
+def carregar_recentes(spreadsheet: str, arquivo: Arquivo, creds: Optional[dict] = None,
+                      client=None) -> Dataset:
+    """Dataset só com a parte recente da planilha, com o histórico anexado (dataset.arquivo)"""
+    versao, sheets, mudaram = ler_recentes(spreadsheet, arquivo, creds, client)
+    ds = Dataset.from_sheets(versao, sheets)
+    if mudaram:
+        data = ds.data
+        ja_arquivadas = data["Loja"].isin(mudaram) & (data["Data"] < pd.Timestamp(arquivo.corte))
+        aviso = (f"Aba(s) {', '.join(mudaram)}: linhas já arquivadas foram alteradas na planilha. "
+                 f"Rode `python arquivar.py --refazer` para reconstruir o histórico.")
+        qualidade = ds.qualidade
+        ds = Dataset(versao, data.loc[~ja_arquivadas].reset_index(drop=True), ds.avisos + [aviso])
+        ds.qualidade = qualidade
+    ds.arquivo = arquivo
+    return ds
+
+
+HISTORICO_CACHE_SIZE = 4  # combinações (versão, meses) guardadas em memória
+
+_combinados: "OrderedDict[Tuple[str, Tuple[str, ...]], Dataset]" = OrderedDict()
+_combinados_lock = threading.Lock()
+
+
+def _juntar(antigos: pd.DataFrame, recentes: pd.DataFrame) -> pd.DataFrame:
+    """Histórico + parte recente com as colunas e os tipos da parte recente (e os mesmos nomes canônicos)"""
+    if recentes.empty and not len(recentes.columns):
+        return antigos
+    antigos = antigos[[c for c in recentes.columns if c in antigos.columns]]
+    for col in antigos.columns:
+        if antigos[col].dtype != recentes[col].dtype:
+            antigos[col] = antigos[col].astype(recentes[col].dtype)
+    return canonizar(pd.concat([antigos, recentes], ignore_index=True))
+
+
+def com_historico(dataset: Dataset, d_ini=None, d_fim=None, outros: Sequence[Tuple] = ()) -> Dataset:
+    """Dataset com os meses arquivados que o período pede; o próprio dataset se nenhum
+
+    Mesmo critério de período de aplicar_filtros (sem d_ini = tudo, só d_ini = um dia).
+    `outros`: mais períodos (d_ini, d_fim) lidos junto, ex.: o período de comparação.
+    """
+    arquivo = dataset.arquivo
+    if arquivo is None:
+        return dataset
+    meses = tuple(sorted(set(arquivo.meses_para(d_ini, d_fim)).union(*(arquivo.meses_para(*p) for p in outros))))
+    if not meses:
+        return dataset
+    chave = (dataset.version, meses)
+    incr("cache.historico.chamadas")
+    with _combinados_lock:
+        if chave in _combinados:
+            _combinados.move_to_end(chave)
+            return _combinados[chave]
+    incr("cache.historico.misses")
+    ds = Dataset(dataset.version, _juntar(arquivo.ler(list(meses)), dataset.data),
+                 dataset.avisos, dataset.carregado_em)
+    ds.qualidade = dataset.qualidade
+    with _combinados_lock:
+        _combinados[chave] = ds
+        while len(_combinados) > HISTORICO_CACHE_SIZE:
+            _combinados.popitem(last=False)
+    return ds
+
+
+# ---------------------------------
+# COMPACTAÇÃO (arquivar.py)
+# ---------------------------------
+def _gravar_json(path: str, obj) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _limpar(pasta: str, manifesto: Dict) -> int:
+    """Apaga partes fora do manifesto (de uma compactação interrompida ou refeita)"""
+    listadas = {os.path.normpath(p["arquivo"]) for partes in manifesto["meses"].values() for p in partes}
+    apagadas = 0
+    for nome in os.listdir(pasta):
+        sub = os.path.join(pasta, nome)
+        if not (nome.startswith("mes=") and os.path.isdir(sub)):
+            continue
+        for arq in os.listdir(sub):
+            if os.path.normpath(os.path.join(nome, arq)) not in listadas:
+                os.remove(os.path.join(sub, arq))
+                apagadas += 1
+        if not os.listdir(sub):
+            os.rmdir(sub)
+    return apagadas
+
+
+def compactar(spreadsheet: str, corte: date, creds: Optional[dict] = None, client=None,
+              refazer: bool = False) -> Dict:
+    """Leva para o histórico as linhas de cada aba anteriores ao corte e retorna o manifesto novo
+
+    Incremental: só lê da planilha o que vem depois da parte já arquivada. refazer=True
+    descarta o histórico existente e recomeça do zero (necessário se linhas antigas
+    foram editadas, apagadas ou reordenadas na planilha).
+    """
+    pasta = pasta_historico(spreadsheet)
+    atual = None if refazer else Arquivo.abrir(spreadsheet)
+    if atual is not None:
+        manifesto = json.loads(json.dumps(atual.manifesto))
+        corte = max(corte, atual.corte)
+    else:
+        manifesto = {"abas": {}, "meses": {}}
+    corte_ts = pd.Timestamp(corte)
+
+    gc = client or get_sheets_client(creds)
+    sh = open_sheet_by_id(spreadsheet, client=gc)
+    pausa = getattr(gc, "pausa_entre_abas", FETCH_PAUSE)
+    novos: List[pd.DataFrame] = []
+    for i, ws in enumerate(sh.worksheets()):
+        if i > 0 and pausa:
+            time.sleep(pausa)
+        with span("sheets_fetch", aba=ws.title) as s:
+            values = ws.get_all_values()
+            s.rows = len(values)
+        if len(values) < 2:
+            continue
+        cabecalho, linhas = values[0], values[1:]
+        info = manifesto["abas"].get(ws.title, {"linhas": 0})
+        n0 = info["linhas"]
+        if n0 and (n0 > len(linhas) or _assinatura(linhas[n0 - 1]) != info["ultima"]):
+            raise RuntimeError(f"Aba '{ws.title}': linhas já arquivadas mudaram na planilha; "
+                               f"use refazer para reconstruir o histórico")
+        datas = parse_datetime_ptbr(pd.Series([r[0] if r else "" for r in linhas[n0:]], dtype=object))
+        no_corte = np.flatnonzero((datas >= corte_ts).to_numpy())
+        n1 = n0 + (int(no_corte[0]) if len(no_corte) else len(linhas) - n0)
+        if n1 == n0:
+            continue
+        try:
+            rec = normalize_sheet(ws.title, _frame(cabecalho, linhas[n0:n1]))
+        except Exception as e:
+            logger.warning("Aba '%s' fora do histórico (problema ao mapear colunas — %s)", ws.title, e)
+            continue
+        novos.append(rec[COLUNAS_ARQUIVO])
+        manifesto["abas"][ws.title] = {"linhas": n1, "ultima": _assinatura(linhas[n1 - 1])}
+
+    versao = hashlib.sha1(json.dumps([manifesto["abas"], corte.isoformat()], sort_keys=True)
+                          .encode("utf-8")).hexdigest()[:12]
+    os.makedirs(pasta, exist_ok=True)
+    if novos:
+        data = pd.concat(novos, ignore_index=True)
+        with span("historico_gravacao", rows=len(data)):
+            meses = data["Data"].dt.strftime("%Y-%m").fillna(SEM_DATA)
+            for mes, g in data.groupby(meses, sort=True):
+                rel = os.path.join(f"mes={mes}", f"parte-{versao}.parquet")
+                os.makedirs(os.path.join(pasta, f"mes={mes}"), exist_ok=True)
+                tmp = os.path.join(pasta, rel + ".tmp")
+                g.to_parquet(tmp, index=False, compression="zstd")
+                os.replace(tmp, os.path.join(pasta, rel))
+                manifesto["meses"].setdefault(mes, []).append({"arquivo": rel, "linhas": len(g)})
+        primeira = data["Data"].min()
+        if pd.notna(primeira):
+            anterior = manifesto.get("primeira_data")
+            manifesto["primeira_data"] = min(filter(None, [anterior, primeira.date().isoformat()]))
+    manifesto.update(versao=versao, corte=corte.isoformat(),
+                     atualizado_em=datetime.now().isoformat(timespec="seconds"))
+    _gravar_json(os.path.join(pasta, MANIFESTO), manifesto)
+    _limpar(pasta, manifesto)
+    return manifesto
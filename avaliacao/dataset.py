@@ -0,0 +1,165 @@
+# avaliacao/dataset.py — Snapshot do dataset normalizado (versão, dados, avisos, qualidade, índices por loja)
+#
+# Um Dataset é montado uma vez por versão da planilha e compartilhado (somente leitura)
+# entre sessões e jobs; os recortes por loja usam índices pré-calculados em vez de
+# comparar a coluna Loja linha a linha.
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import ingest, shared
+from .normalize import build_dataset
+from .perf import incr
+from .quality import RelatorioQualidade, registrar_versao
+from .sources import SPREADSHEET_URL, fetch_sheets
+
+
+def partition_by_store(data: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Índices posicionais das linhas de cada loja"""
+    if data.empty:
+        return {}
+    return {loja: idx for loja, idx in data.groupby("Loja", sort=False).indices.items()}
+
+
+def rows_for_stores(data: pd.DataFrame, stores: Optional[Iterable[str]],
+                    partitions: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    """Linhas das lojas pedidas (None = todas), na ordem original"""
+    if stores is None:
+        return data
+    if partitions is None:
+        partitions = partition_by_store(data)
+    fatias = [partitions[loja] for loja in stores if loja in partitions]
+    if not fatias:
+        return data.iloc[0:0]
+    return data.take(np.sort(np.concatenate(fatias)))
+
+
+class Dataset:
+    """Dataset normalizado de uma versão da planilha; não altere `data` (é compartilhado)"""
+
+    def __init__(self, version: str, data: pd.DataFrame, avisos: Optional[List[str]] = None,
+                 carregado_em: Optional[float] = None):
+        self.version = version
+        self.data = data
+        self.avisos = list(avisos or [])
+        self.carregado_em = carregado_em or time.time()
+        self._partitions: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+        # archive.Arquivo quando as linhas antigas estão no histórico local (ver archive.py)
+        self.arquivo = None
+        # quality.RelatorioQualidade da carga: contagens por aba e quarentena
+        self.qualidade = None
+
+    @classmethod
+    def from_sheets(cls, version: str, sheets: List[Tuple[str, pd.DataFrame]]) -> "Dataset":
+        qualidade = RelatorioQualidade()
+        data, avisos = build_dataset(sheets, qualidade)
+        ds = cls(version, data, avisos)
+        ds.qualidade = qualidade
+        registrar_versao(version, qualidade)
+        return ds
+
+    @property
+    def empty(self) -> bool:
+        return self.data.empty
+
+    @property
+    def partitions(self) -> Dict[str, np.ndarray]:
+        """Índices por loja, calculados no primeiro uso"""
+        if self._partitions is None:
+            with self._lock:
+                if self._partitions is None:
+                    self._partitions = partition_by_store(self.data)
+        return self._partitions
+
+    @property
+    def lojas(self) -> List[str]:
+        return sorted(self.partitions)
+
+    def for_stores(self, stores: Optional[Iterable[str]]) -> pd.DataFrame:
+        """Linhas das lojas pedidas (None = todas)"""
+        return rows_for_stores(self.data, stores, self.partitions)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self):
+        return f"<Dataset {self.version} {len(self.data)} linhas, {len(self.partitions)} lojas>"
+
+
+def load_dataset(spreadsheet: str = SPREADSHEET_URL, creds: Optional[dict] = None, client=None) -> Dataset:
+    """Busca e normaliza a planilha (só a parte ainda não arquivada, se houver histórico)"""
+    from .archive import Arquivo, carregar_recentes
+
+    arquivo = Arquivo.abrir(spreadsheet)
+    if arquivo is not None:
+        return carregar_recentes(spreadsheet, arquivo, creds, client)
+    version, sheets = fetch_sheets(spreadsheet, creds, client)
+    return Dataset.from_sheets(version, sheets)
+
+
+# ---------------------------------
+# SNAPSHOT COMPARTILHADO PELO PROCESSO
+# ---------------------------------
+# Um Dataset por planilha, reaproveitado por todas as sessões (e pelo pré-aquecimento em
+# warmup.py) até vencer o TTL. Cargas da mesma planilha são serializadas: quem chega
+# durante uma carga espera por ela em vez de buscar a planilha de novo. Com
+# AVALIACAO_SNAPSHOT_DIR, a carga passa a ser do host inteiro (ver shared.py). Respostas
+# enviadas pelo formulário (ingest.py) entram no snapshot vigente entre uma carga e outra.
+DATASET_TTL = int(os.environ.get("AVALIACAO_DATASET_TTL", 300))  # segundos
+
+_snapshots: Dict[str, Dataset] = {}
+_cargas: Dict[str, threading.Lock] = {}
+_cargas_lock = threading.Lock()
+
+
+def _vigente(ds: Optional[Dataset], ttl: float, spreadsheet: str) -> bool:
+    if ds is None or time.time() - ds.carregado_em >= ttl:
+        return False
+    # outra réplica do host pode ter publicado ou expirado uma versão
+    return not (shared.ativo() and shared.mudou(spreadsheet))
+
+
+def get_dataset(spreadsheet: str = SPREADSHEET_URL, loader: Optional[Callable[[str], Dataset]] = None,
+                ttl: float = DATASET_TTL) -> Dataset:
+    """Snapshot da planilha, carregado com `loader` (padrão: load_dataset) se não houver um vigente"""
+    incr("cache.planilha.chamadas")
+    ds = _snapshots.get(spreadsheet)
+    if _vigente(ds, ttl, spreadsheet) and not ingest.pendente(spreadsheet):
+        return ds
+    with _cargas_lock:
+        carga = _cargas.setdefault(spreadsheet, threading.Lock())
+    with carga:
+        ds = _snapshots.get(spreadsheet)
+        if not _vigente(ds, ttl, spreadsheet):
+            incr("cache.planilha.misses")
+            if shared.ativo():
+                ds = shared.carregar(spreadsheet, loader or load_dataset, ttl)
+            else:
+                ds = (loader or load_dataset)(spreadsheet)
+            _snapshots[spreadsheet] = ingest.aplicar(spreadsheet, ds, recarga=True)
+        elif ingest.pendente(spreadsheet):
+            _snapshots[spreadsheet] = ingest.aplicar(spreadsheet, ds)
+        ds = _snapshots[spreadsheet]
+    return ds
+
+
+def dataset_pronto(spreadsheet: str = SPREADSHEET_URL, ttl: float = DATASET_TTL) -> bool:
+    """True se get_dataset() responde sem ir à planilha"""
+    return _vigente(_snapshots.get(spreadsheet), ttl, spreadsheet)
+
+
+def invalidate_dataset(spreadsheet: Optional[str] = None) -> None:
+    """Descarta o snapshot de uma planilha (None = todas); a próxima chamada recarrega"""
+    if shared.ativo():
+        for planilha in ([spreadsheet] if spreadsheet else list(_snapshots)):
+            shared.expirar(planilha)
+    if spreadsheet is None:
+        _snapshots.clear()
+    else:
+        _snapshots.pop(spreadsheet, None)
@@ -0,0 +1,167 @@
+# avaliacao/distribution.py — Distribuição das notas por grupo: quantas de cada nota, mediana, p10/p90, % sem nota
+#
+#     distribuicao(dataset, lojas_do_usuario, filtros, ["Região", "Loja"])   # ou rec.distribuicao(...)
+#
+# As médias dos resumos contam nota vazia (ou em texto) como 0, e isso não aparece em
+# lugar nenhum. Aqui cada nota de cada avaliação cai numa de sete faixas: sem nota
+# (Notas_vazias, normalize.py) ou 0, 1, ..., 5. Histogramas se somam, então um cubo
+# (região, loja, setor, colaborador, dia, hora -> contagens por nota e faixa) montado uma
+# vez por dataset atende qualquer combinação dos filtros do app e qualquer nível de
+# agrupamento: filtra o cubo, soma as contagens por grupo e tira os percentis das
+# contagens acumuladas, sem voltar às linhas.
+#
+# O formulário só tem notas inteiras; outras são arredondadas para a faixa mais próxima.
+# Percentis pelo posto (a menor nota com pelo menos q% das respostas até ela), então são
+# sempre notas que alguém deu; média e percentis ignoram quem ficou sem nota.
+
+import threading
+import weakref
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .analytics import NOTAS_RESUMO
+from .dataset import Dataset
+from .perf import span
+
+CHAVES_CUBO = ["Região", "Loja", "Setor", "Colaborador", "Dia", "Hora_num"]
+VALORES = range(6)                        # notas 0..5; a faixa 0 do cubo é "sem nota"
+PERCENTIS = {"p10": 10, "Mediana": 50, "p90": 90}
+COLUNAS_DISTRIBUICAO = ["Nota", "Avaliações", "Sem nota", "% sem nota", *(f"Qtd {v}" for v in VALORES),
+                        "Média (respondidas)", *PERCENTIS]
+
+
+class CuboDistribuicao:
+    """Chaves do cubo (uma linha por região/loja/setor/colaborador/dia/hora) e contagens (linhas, notas, faixas)"""
+
+    def __init__(self, chaves: pd.DataFrame, contagens: np.ndarray):
+        self.chaves = chaves
+        self.contagens = contagens
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+
+_cubos: "weakref.WeakKeyDictionary[Dataset, CuboDistribuicao]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _faixas(data: pd.DataFrame) -> np.ndarray:
+    """(linhas, notas) -> faixa: 0 sem nota, 1 + nota arredondada para as demais"""
+    notas = data[NOTAS_RESUMO].to_numpy(dtype=float)
+    faixas = np.clip(np.rint(np.nan_to_num(notas)), 0, 5).astype(np.int64) + 1
+    vazias = np.isnan(notas)
+    if "Notas_vazias" in data.columns:
+        bits = data["Notas_vazias"].fillna(0).to_numpy(dtype=np.int64)
+        vazias |= ((bits[:, None] >> np.arange(len(NOTAS_RESUMO))) & 1).astype(bool)
+    faixas[vazias] = 0
+    return faixas
+
+
+def cubo_distribuicao(dataset: Dataset) -> CuboDistribuicao:
+    """Contagens por nota e faixa em cada região/loja/setor/colaborador/dia/hora do dataset"""
+    with _lock:
+        cubo = _cubos.get(dataset)
+    if cubo is not None:
+        return cubo
+    data = dataset.data
+    n_faixas = len(VALORES) + 1
+    with span("distribuicao_cubo", rows=len(data)) as s:
+        if data.empty:
+            cubo = CuboDistribuicao(pd.DataFrame(columns=CHAVES_CUBO),
+                                    np.zeros((0, len(NOTAS_RESUMO), n_faixas), dtype=np.int32))
+        else:
+            # sem data não há hora, e o filtro de hora do app sempre descarta essas linhas
+            base = data.loc[data["Data"].notna()]
+            chaves = base[[c for c in CHAVES_CUBO if c != "Dia"]].assign(Dia=base["Data"].dt.normalize())
+            grupos = chaves.groupby(CHAVES_CUBO, sort=True, dropna=False)
+            ids = grupos.ngroup().to_numpy()
+            n = int(ids.max()) + 1 if len(ids) else 0
+            faixas = _faixas(base)
+            contagens = np.stack([np.bincount(ids * n_faixas + faixas[:, j], minlength=n * n_faixas)
+                                  .reshape(n, n_faixas) for j in range(len(NOTAS_RESUMO))], axis=1)
+            cubo = CuboDistribuicao(grupos.size().index.to_frame(index=False), contagens.astype(np.int32))
+        s.rows = len(cubo)
+    with _lock:
+        _cubos[dataset] = cubo
+    return cubo
+
+
+def _mascara(chaves: pd.DataFrame, stores: Optional[Sequence[str]], filtros) -> np.ndarray:
+    """Os filtros de analytics.aplicar_filtros aplicados às chaves do cubo (dia e hora em vez da data)"""
+    d_ini, d_fim, regiao, lojas, setores, hora_ini, hora_fim = tuple(filtros)
+    mask = np.ones(len(chaves), dtype=bool)
+    dia = chaves["Dia"]
+    if d_ini and d_fim and d_ini != d_fim:
+        mask &= dia.between(pd.Timestamp(d_ini), pd.Timestamp(d_fim)).to_numpy()
+    elif d_ini:
+        mask &= (dia == pd.Timestamp(d_ini)).to_numpy()
+    if stores is not None:
+        mask &= chaves["Loja"].isin(list(stores)).to_numpy()
+    if regiao != "Todos":
+        mask &= (chaves["Região"] == regiao).to_numpy()
+    if lojas:
+        mask &= chaves["Loja"].isin(lojas).to_numpy()
+    if setores:
+        mask &= chaves["Setor"].isin(setores).to_numpy()
+    mask &= chaves["Hora_num"].between(hora_ini, hora_fim).to_numpy()
+    return mask
+
+
+def _percentil(respondidas: np.ndarray, q: int) -> np.ndarray:
+    """Menor nota com pelo menos q% das respostas até ela (contas inteiras: sem erro de arredondamento)"""
+    total = respondidas.sum(axis=-1, keepdims=True)
+    acumulado = respondidas.cumsum(axis=-1)
+    posicao = (acumulado * 100 < q * total).sum(axis=-1).astype(float)
+    posicao[total[..., 0] == 0] = np.nan
+    return posicao
+
+
+def resumir_contagens(chaves: pd.DataFrame, contagens: np.ndarray) -> pd.DataFrame:
+    """Uma linha por grupo e nota a partir das contagens (grupos, notas, faixas)"""
+    g, k, _ = contagens.shape
+    sem_nota = contagens[:, :, 0].astype(np.int64)
+    respondidas = contagens[:, :, 1:].astype(np.int64)
+    total = sem_nota + respondidas.sum(axis=-1)
+    n_resp = respondidas.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = (respondidas * np.arange(len(VALORES))).sum(axis=-1) / n_resp
+        pct_vazias = 100 * sem_nota / total
+    out = chaves.loc[chaves.index.repeat(k)].reset_index(drop=True)
+    out["Nota"] = np.tile(NOTAS_RESUMO, g)
+    out["Avaliações"] = total.ravel()
+    out["Sem nota"] = sem_nota.ravel()
+    out["% sem nota"] = pct_vazias.ravel().round(1)
+    for v in VALORES:
+        out[f"Qtd {v}"] = respondidas[:, :, v].ravel()
+    out["Média (respondidas)"] = media.ravel().round(2)
+    for nome, q in PERCENTIS.items():
+        out[nome] = _percentil(respondidas, q).ravel()
+    return out
+
+
+def distribuicao(dataset: Dataset, stores: Optional[Sequence[str]], filtros, by_cols: List[str]) -> pd.DataFrame:
+    """Distribuição de cada nota por grupo de `by_cols` ([] = geral) dentro dos filtros do app
+
+    Colunas: by_cols + COLUNAS_DISTRIBUICAO, uma linha por grupo e nota (na ordem de
+    NOTAS_RESUMO), grupos na ordem das chaves. Os mesmos `filtros` de engines.recorte.
+    """
+    cubo = cubo_distribuicao(dataset)
+    with span("distribuicao[" + ("/".join(by_cols) or "geral") + "]", rows=len(cubo)) as s:
+        mask = _mascara(cubo.chaves, stores, filtros)
+        chaves = cubo.chaves.loc[mask, by_cols]
+        contagens = cubo.contagens[mask]
+        if not by_cols:
+            out = resumir_contagens(pd.DataFrame(index=[0]), contagens.sum(axis=0, keepdims=True))
+        elif not len(chaves):
+            out = pd.DataFrame(columns=[*by_cols, *COLUNAS_DISTRIBUICAO])
+        else:
+            grupos = chaves.groupby(by_cols, sort=True, dropna=False)
+            ids = grupos.ngroup().to_numpy()
+            ordem = np.argsort(ids, kind="stable")
+            inicios = np.flatnonzero(np.r_[True, np.diff(ids[ordem]) != 0])
+            somas = np.add.reduceat(contagens[ordem], inicios, axis=0)
+            out = resumir_contagens(grupos.size().index.to_frame(index=False), somas)
+        s.rows = len(out)
+    return out
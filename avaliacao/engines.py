@@ -0,0 +1,323 @@
+# avaliacao/engines.py — Motor das agregações do painel: pandas (padrão) ou DuckDB
+#
+#     rec = recorte(dataset, lojas_do_usuario, (d_ini, d_fim, regiao, lojas, setores, hora_ini, hora_fim))
+#     rec.df                      # linhas filtradas (prévia, KPIs, exportações)
+#     rec.resumo(["Região", "Loja"]); rec.ranking_avaliadores(); rec.volume_por_hora()
+#     rec.distribuicao(["Região", "Loja"])
+#
+# Com o motor DuckDB (AVALIACAO_ENGINE=duckdb) as avaliações normalizadas são copiadas
+# uma vez por versão do dataset para uma base DuckDB em memória, e filtros e groupbys
+# viram SQL; as linhas filtradas só são montadas se alguém pedir rec.df. O acabamento
+# (média geral, arredondamento, ordem, pivots) é o mesmo código do caminho pandas
+# (analytics.py), e as chaves saem do SQL na ordem do groupby do pandas, então os dois
+# motores devolvem exatamente os mesmos DataFrames.
+
+import os
+import threading
+import weakref
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .analytics import (HORA_COLS, NOTAS_RESUMO, RANKING_COLS, aplicar_filtros, build_summary,
+                        finalizar_comparacao, finalizar_resumo, ordenar_ranking, pivot_hora,
+                        ranking_avaliadores, rotular_periodos, volume_por_hora)
+from .archive import com_historico
+from .dataset import Dataset
+from .distribution import distribuicao
+from .perf import span
+
+ENGINES = ("pandas", "duckdb")
+ENGINE = os.environ.get("AVALIACAO_ENGINE", "pandas").strip().lower()
+
+# (d_ini, d_fim, regiao, lojas, setores, hora_ini, hora_fim): os argumentos de aplicar_filtros
+Filtros = Tuple
+
+
+class Recorte:
+    """Linhas de `stores` (None = todas) dentro dos filtros, com as agregações do painel (pandas)"""
+
+    engine = "pandas"
+
+    def __init__(self, dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros):
+        # meses do histórico arquivado que o período pede (nenhum para períodos recentes)
+        self.dataset = com_historico(dataset, *tuple(filtros)[:2])
+        self.stores = None if stores is None else list(stores)
+        self.filtros = tuple(filtros)
+        self._df: Optional[pd.DataFrame] = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            self._df = aplicar_filtros(self.dataset.for_stores(self.stores), *self.filtros)
+        return self._df
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def resumo(self, by_cols: List[str]) -> pd.DataFrame:
+        return build_summary(self.df, by_cols)
+
+    def ranking_avaliadores(self) -> pd.DataFrame:
+        return ranking_avaliadores(self.df)
+
+    def volume_por_hora(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        return volume_por_hora(self.df)
+
+    def distribuicao(self, by_cols: List[str]) -> pd.DataFrame:
+        """Contagem por nota, mediana, p10/p90 e % sem nota (do cubo de distribution.py, nos dois motores)"""
+        return distribuicao(self.dataset, self.stores, self.filtros, by_cols)
+
+
+class Comparacao:
+    """Resumos do período do filtro lado a lado com os de outro período (pandas)
+
+    As linhas dos dois períodos são filtradas juntas e cada resumo é um groupby só,
+    com o período como chave a mais, em vez de dois recortes completos.
+    """
+
+    engine = "pandas"
+
+    def __init__(self, dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros,
+                 anterior: Tuple[date, date]):
+        d_ini, d_fim = tuple(filtros)[:2]
+        if d_ini is None:
+            raise ValueError("A comparação precisa de um período no filtro de datas")
+        self.atual = (d_ini, d_fim or d_ini)
+        self.anterior = tuple(anterior)
+        self.dataset = com_historico(dataset, *self.atual, outros=[self.anterior])
+        self.stores = None if stores is None else list(stores)
+        self.filtros = tuple(filtros)
+        self._df: Optional[pd.DataFrame] = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Linhas dos dois períodos dentro dos outros filtros, com _periodo (0 atual, 1 anterior)"""
+        if self._df is None:
+            linhas = self.dataset.for_stores(self.stores)
+            linhas = linhas.loc[rotular_periodos(linhas["Data"], self.atual, self.anterior) >= 0]
+            df = aplicar_filtros(linhas, None, None, *self.filtros[2:])
+            df["_periodo"] = rotular_periodos(df["Data"], self.atual, self.anterior)
+            self._df = df
+        return self._df
+
+    def resumo(self, by_cols: List[str]) -> pd.DataFrame:
+        with span("comparacao[" + ("/".join(by_cols) or "geral") + "]", rows=len(self.df)):
+            work = self.df.assign(Avaliações=1)
+            grupos = work.groupby([*by_cols, "_periodo"], dropna=False)
+            out = grupos[NOTAS_RESUMO].mean(numeric_only=True).join(grupos["Avaliações"].sum()).reset_index()
+            return finalizar_comparacao(out, by_cols)
+
+
+# ---------------------------------
+# DUCKDB
+# ---------------------------------
+# Colunas copiadas para a base (Data_dia e Hora só servem para exibição; _linha é a
+# posição no dataset, para montar rec.df com as mesmas linhas e tipos do pandas)
+COLUNAS_SQL = ["Data", "Setor", "Colaborador", *NOTAS_RESUMO, "Avaliador", "Hora_num", "Loja", "Região"]
+
+_bases: "weakref.WeakKeyDictionary[Dataset, BaseDuckDB]" = weakref.WeakKeyDictionary()
+_bases_lock = threading.Lock()
+
+
+def _q(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+
+class BaseDuckDB:
+    """Avaliações de um Dataset numa base DuckDB em memória (somente leitura depois de criada)"""
+
+    def __init__(self, dataset: Dataset):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError("AVALIACAO_ENGINE=duckdb requer o pacote duckdb (pip install duckdb)")
+        import pyarrow as pa
+
+        data = dataset.data
+        with span("duckdb_carga", rows=len(data)):
+            self.con = duckdb.connect(":memory:")
+            tabela = data[[c for c in COLUNAS_SQL if c in data.columns]].copy()
+            tabela["_linha"] = np.arange(len(data), dtype=np.int64)
+            # via Arrow: o DuckDB lê as colunas de texto direto, sem passar objeto a objeto
+            self.con.register("_entrada", pa.Table.from_pandas(tabela, preserve_index=False))
+            self.con.execute("CREATE TABLE avaliacoes AS SELECT * FROM _entrada")
+            self.con.unregister("_entrada")
+        self.dtypes = data.dtypes
+        self.version = dataset.version
+
+    def consultar(self, sql: str, params: Sequence = ()) -> pd.DataFrame:
+        # cada consulta num cursor próprio: a conexão é compartilhada entre sessões (threads)
+        cur = self.con.cursor()
+        try:
+            return cur.execute(sql, list(params)).df()
+        finally:
+            cur.close()
+
+    def tipos_como_dataset(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Chaves de grupo com o mesmo dtype das colunas do dataset (o DuckDB devolve object/float)"""
+        for col in df.columns:
+            if col in self.dtypes.index and df[col].dtype != self.dtypes[col]:
+                df[col] = df[col].astype(self.dtypes[col])
+        return df
+
+
+def base_duckdb(dataset: Dataset) -> BaseDuckDB:
+    """Base DuckDB do dataset, criada no primeiro uso e descartada junto com ele"""
+    base = _bases.get(dataset)
+    if base is None:
+        with _bases_lock:
+            base = _bases.get(dataset)
+            if base is None:
+                base = _bases[dataset] = BaseDuckDB(dataset)
+    return base
+
+
+def where_sql(stores: Optional[Sequence[str]], d_ini=None, d_fim=None, regiao: str = "Todos",
+              lojas: Optional[List[str]] = None, setores: Optional[List[str]] = None,
+              hora_ini: int = 0, hora_fim: int = 23) -> Tuple[str, List]:
+    """Cláusula WHERE equivalente a aplicar_filtros(dataset.for_stores(stores), ...)"""
+    conds, params = [], []
+
+    def em(col: str, valores):
+        conds.append(f"{_q(col)} IN ({', '.join('?' * len(valores))})" if valores else "FALSE")
+        params.extend(valores)
+
+    if stores is not None:
+        em("Loja", list(stores))
+    if d_ini and d_fim and d_ini != d_fim:
+        conds.append('"Data" BETWEEN ? AND ?')
+        params += [pd.Timestamp(d_ini).to_pydatetime(),
+                   (pd.Timestamp(d_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)).to_pydatetime()]
+    elif d_ini:
+        conds.append('CAST("Data" AS DATE) = ?')
+        params.append(d_ini if isinstance(d_ini, date) else pd.Timestamp(d_ini).date())
+    if regiao != "Todos":
+        conds.append('"Região" = ?')
+        params.append(regiao)
+    if lojas:
+        em("Loja", lojas)
+    if setores:
+        em("Setor", setores)
+    conds.append('"Hora_num" BETWEEN ? AND ?')
+    params += [hora_ini, hora_fim]
+    return " AND ".join(conds), params
+
+
+class RecorteDuckDB(Recorte):
+    """Mesmo contrato do Recorte, com filtros e agregações em SQL"""
+
+    engine = "duckdb"
+
+    def __init__(self, dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros):
+        super().__init__(dataset, stores, filtros)
+        self.base = base_duckdb(self.dataset)
+        self.where, self.params = where_sql(self.stores, *self.filtros)
+        self._n: Optional[int] = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            with span("filtros", engine="duckdb") as s:
+                pos = self.base.consultar(f"SELECT _linha FROM avaliacoes WHERE {self.where} ORDER BY _linha",
+                                          self.params)["_linha"].to_numpy()
+                self._df = self.dataset.data.take(pos).copy()
+                s.rows = len(self._df)
+        return self._df
+
+    def __len__(self) -> int:
+        if self._df is not None:
+            return len(self._df)
+        if self._n is None:
+            self._n = int(self.base.consultar(f"SELECT COUNT(*) AS n FROM avaliacoes WHERE {self.where}",
+                                              self.params)["n"].iloc[0])
+        return self._n
+
+    def _agrupar(self, chaves: List[str], colunas: str, nulos: bool) -> pd.DataFrame:
+        """SELECT chaves, colunas ... GROUP BY chaves, na ordem do groupby do pandas (nulos por último)"""
+        sel = ", ".join([_q(c) for c in chaves] + [colunas])
+        where = self.where
+        if not nulos:  # groupby padrão do pandas descarta grupos com chave vazia
+            where += "".join(f" AND {_q(c)} IS NOT NULL" for c in chaves)
+        ordem = ", ".join(f"{_q(c)} ASC NULLS LAST" for c in chaves)
+        sql = f"SELECT {sel} FROM avaliacoes WHERE {where} GROUP BY ALL ORDER BY {ordem}"
+        return self.base.tipos_como_dataset(self.base.consultar(sql, self.params))
+
+    def resumo(self, by_cols: List[str]) -> pd.DataFrame:
+        with span("build_summary[" + ("/".join(by_cols) or "geral") + "]", engine="duckdb"):
+            medias = ", ".join(f"AVG({_q(n)}) AS {_q(n)}" for n in NOTAS_RESUMO) + ', COUNT(*) AS "Avaliações"'
+            if by_cols:
+                out = self._agrupar(by_cols, medias, nulos=True)
+            else:
+                out = self.base.consultar(f"SELECT {medias} FROM avaliacoes WHERE {self.where}", self.params)
+            out[NOTAS_RESUMO] = out[NOTAS_RESUMO].astype("float64")
+            out["Avaliações"] = out["Avaliações"].astype("int64")
+            return finalizar_resumo(out, by_cols)
+
+    def ranking_avaliadores(self) -> pd.DataFrame:
+        with span("ranking_avaliadores", engine="duckdb"):
+            out = self._agrupar(RANKING_COLS, 'COUNT(*) AS "Avaliações feitas"', nulos=False)
+            out["Avaliações feitas"] = out["Avaliações feitas"].astype("int64")
+            return ordenar_ranking(out)
+
+    def volume_por_hora(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        with span("volume_por_hora", engine="duckdb"):
+            por_hora = self._agrupar(HORA_COLS, 'COUNT(*) AS "Avaliações"', nulos=False)
+            por_hora["Avaliações"] = por_hora["Avaliações"].astype("int64")
+            return por_hora, pivot_hora(por_hora)
+
+
+class ComparacaoDuckDB(Comparacao):
+    """Mesmo contrato da Comparacao, com o período como CASE no GROUP BY do SQL"""
+
+    engine = "duckdb"
+
+    def __init__(self, dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros,
+                 anterior: Tuple[date, date]):
+        super().__init__(dataset, stores, filtros, anterior)
+        self.base = base_duckdb(self.dataset)
+        where, params = where_sql(self.stores, None, None, *self.filtros[2:])
+        casos, limites = [], []
+        for valor, (ini, fim) in ((0, self.atual), (1, self.anterior)):
+            casos.append(f'WHEN "Data" >= ? AND "Data" < ? THEN {valor}')
+            limites += [pd.Timestamp(ini).to_pydatetime(), (pd.Timestamp(fim) + pd.Timedelta(days=1)).to_pydatetime()]
+        self.periodo = f"CASE {' '.join(casos)} END"
+        self.where = f"{where} AND {self.periodo} IS NOT NULL"
+        # o CASE aparece no SELECT e no WHERE: os limites vão duas vezes
+        self.params = limites + params + limites
+
+    def resumo(self, by_cols: List[str]) -> pd.DataFrame:
+        with span("comparacao[" + ("/".join(by_cols) or "geral") + "]", engine="duckdb"):
+            medias = ", ".join(f"AVG({_q(n)}) AS {_q(n)}" for n in NOTAS_RESUMO) + ', COUNT(*) AS "Avaliações"'
+            chaves = "".join(f"{_q(c)}, " for c in by_cols)
+            ordem = ", ".join([f"{_q(c)} ASC NULLS LAST" for c in by_cols] + ["_periodo"])
+            sql = (f"SELECT {chaves}{self.periodo} AS _periodo, {medias} FROM avaliacoes "
+                   f"WHERE {self.where} GROUP BY ALL ORDER BY {ordem}")
+            out = self.base.tipos_como_dataset(self.base.consultar(sql, self.params))
+            out[NOTAS_RESUMO] = out[NOTAS_RESUMO].astype("float64")
+            out["Avaliações"] = out["Avaliações"].astype("int64")
+            return finalizar_comparacao(out, by_cols)
+
+
+_RECORTES: Dict[str, type] = {"pandas": Recorte, "duckdb": RecorteDuckDB}
+_COMPARACOES: Dict[str, type] = {"pandas": Comparacao, "duckdb": ComparacaoDuckDB}
+
+
+def recorte(dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros,
+            engine: Optional[str] = None) -> Recorte:
+    """Recorte no motor pedido (padrão: AVALIACAO_ENGINE, senão pandas)"""
+    engine = (engine or ENGINE).lower()
+    if engine not in _RECORTES:
+        raise ValueError(f"Motor desconhecido: {engine!r} (use {', '.join(ENGINES)})")
+    return _RECORTES[engine](dataset, stores, filtros)
+
+
+def comparacao(dataset: Dataset, stores: Optional[Sequence[str]], filtros: Filtros,
+               anterior: Tuple[date, date], engine: Optional[str] = None) -> Comparacao:
+    """Comparação do período do filtro com `anterior` (analytics.periodo_anterior) no motor pedido"""
+    engine = (engine or ENGINE).lower()
+    if engine not in _COMPARACOES:
+        raise ValueError(f"Motor desconhecido: {engine!r} (use {', '.join(ENGINES)})")
+    return _COMPARACOES[engine](dataset, stores, filtros, anterior)
@@ -0,0 +1,289 @@
+# avaliacao/excel_report.py — Motor de exportação do relatório Excel (streaming, memória constante)
+#
+# As linhas são escritas uma a uma direto no arquivo (xlsxwriter com constant_memory
+# ou openpyxl write-only), e a formatação vem de formatos por coluna / estilos nomeados,
+# sem criar objetos de borda/alinhamento por célula. Os dois motores geram abas idênticas.
+#
+# Benchmark:  python -m avaliacao.excel_report --rows 10000 [--engine xlsxwriter|openpyxl|ambos]
+
+import math
+import os
+import re
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+# Larguras e formatos das abas por loja
+LARGURAS_LOJA = {
+    "Colaborador": 36, "Região": 10, "Loja": 18, "Setor": 20,
+    "Velocidade": 12, "Atendimento": 12, "Qualidade": 12, "Ajuda": 10,
+    "Avaliações": 12, "Média Geral": 12,
+}
+COLS_NUM2 = ["Velocidade", "Atendimento", "Qualidade", "Ajuda", "Média Geral"]
+COLS_INT0 = ["Avaliações", "Avaliações feitas"]
+
+ALTURA_LINHA = 18
+COR_CABECALHO = "B7B7B7"
+ESCALA_CORES = ("FCA5A5", "FDE68A", "86EFAC")  # mín / mediana / máx
+
+
+class AbaSpec:
+    """Descreve uma aba: dados, larguras e formatação por coluna"""
+
+    def __init__(self, nome: str, df: pd.DataFrame, larguras: Dict[str, int],
+                 largura_padrao: int = 14, escala_cor: Optional[str] = None):
+        self.nome = _sheet_name(nome)
+        self.df = df
+        self.colunas = list(df.columns)
+        self.larguras = [larguras.get(c, largura_padrao) for c in self.colunas]
+        self.formatos = [_formato_coluna(c) for c in self.colunas]
+        self.escala_cor = self.colunas.index(escala_cor) if escala_cor in self.colunas else None
+
+    def linhas(self) -> Iterable[Tuple]:
+        """Itera as linhas como tuplas Python, com NaN convertido em None (célula vazia)"""
+        for row in self.df.itertuples(index=False, name=None):
+            yield tuple(None if isinstance(v, float) and math.isnan(v) else _valor_python(v) for v in row)
+
+
+def _valor_python(v):
+    if v is None or v is pd.NA or v is pd.NaT:
+        return None
+    if hasattr(v, "item"):  # escalares numpy
+        return v.item()
+    return v
+
+
+def _formato_coluna(col: str) -> str:
+    if col in COLS_NUM2:
+        return "num2"
+    if col in COLS_INT0:
+        return "int0"
+    return "texto"
+
+
+def _sheet_name(nome: str) -> str:
+    """Nome de aba válido no Excel (sem []:*?/\\ e com no máximo 31 caracteres)"""
+    nome = re.sub(r"[\[\]:*?/\\]", "-", str(nome)).strip() or "(Sem Loja)"
+    return nome[:31]
+
+
+def _largura_excel(largura: float) -> float:
+    """Largura gravada no arquivo para `largura` caracteres (mesmo padding de 5px do xlsxwriter)"""
+    return int((largura * 7 + 5) / 7 * 256) / 256
+
+
+def _col_letter(idx: int) -> str:
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def abas_relatorio_por_loja(base: pd.DataFrame, rank_av: pd.DataFrame) -> List[AbaSpec]:
+    """Monta as abas do relatório: uma por loja (ordenada por Média Geral) + Avaliadores"""
+    abas: List[AbaSpec] = []
+    for loja, g in base.groupby("Loja", dropna=False, observed=True):
+        nome = str(loja) if pd.notna(loja) else "(Sem Loja)"
+        g = g.sort_values("Média Geral", ascending=False)
+        abas.append(AbaSpec(nome, g, LARGURAS_LOJA, escala_cor="Média Geral"))
+    larguras_av = {c: (24 if c in ["Avaliador", "Loja"] else 18) for c in rank_av.columns}
+    abas.append(AbaSpec("Avaliadores", rank_av, larguras_av))
+    return abas
+
+
+def _escrever_xlsxwriter(abas: List[AbaSpec], path: str) -> None:
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True})
+    base_fmt = {"border": 1, "align": "center", "valign": "vcenter"}
+    fmts = {
+        "cabecalho": wb.add_format({**base_fmt, "bold": True, "bg_color": "#" + COR_CABECALHO,
+                                    "font_color": "#000000"}),
+        "texto": wb.add_format(base_fmt),
+        "num2": wb.add_format({**base_fmt, "num_format": "0.00"}),
+        "int0": wb.add_format({**base_fmt, "num_format": "0"}),
+    }
+    for aba in abas:
+        ws = wb.add_worksheet(aba.nome)
+        # Formato por coluna: células escritas sem formato herdam o da coluna
+        for c_idx, (largura, fmt) in enumerate(zip(aba.larguras, aba.formatos)):
+            ws.set_column(c_idx, c_idx, largura, fmts[fmt])
+        ws.set_default_row(ALTURA_LINHA)
+        ws.freeze_panes(1, 0)
+
+        # constant_memory: linhas precisam ser escritas em ordem, e cada uma vai direto para o disco
+        ws.write_row(0, 0, aba.colunas, fmts["cabecalho"])
+        n = 0
+        for n, row in enumerate(aba.linhas(), start=1):
+            ws.write_row(n, 0, row)
+
+        ws.autofilter(0, 0, n, max(0, len(aba.colunas) - 1))
+        if aba.escala_cor is not None and n:
+            c = aba.escala_cor
+            ws.conditional_format(1, c, n, c, {
+                "type": "3_color_scale",
+                "min_color": "#" + ESCALA_CORES[0],
+                "mid_color": "#" + ESCALA_CORES[1],
+                "max_color": "#" + ESCALA_CORES[2],
+            })
+    wb.close()
+
+
+def _celulas(ws, valores, estilos: List[str]) -> list:
+    from openpyxl.cell import WriteOnlyCell
+
+    cells = []
+    for v, estilo in zip(valores, estilos):
+        if v is None:  # vazio: não cria célula (herda a coluna, como no xlsxwriter)
+            cells.append(None)
+            continue
+        cell = WriteOnlyCell(ws, value=v)
+        cell.style = estilo
+        cells.append(cell)
+    return cells
+
+
+def _escrever_openpyxl(abas: List[AbaSpec], path: str) -> None:
+    from openpyxl import Workbook
+    from openpyxl.formatting.rule import ColorScaleRule
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    wb = Workbook(write_only=True)
+    thin = Side(style="thin", color="000000")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    center = Alignment(horizontal="center", vertical="center")
+    # Estilos nomeados: criados uma vez e referenciados pelo nome em cada célula
+    estilos = {
+        "cabecalho": NamedStyle("rel_cabecalho", font=Font(bold=True, color="000000"),
+                                fill=PatternFill("solid", fgColor="FF" + COR_CABECALHO),
+                                border=border, alignment=center),
+        "texto": NamedStyle("rel_texto", border=border, alignment=center),
+        "num2": NamedStyle("rel_num2", border=border, alignment=center, number_format="0.00"),
+        "int0": NamedStyle("rel_int0", border=border, alignment=center, number_format="0"),
+    }
+    for estilo in estilos.values():
+        wb.add_named_style(estilo)
+
+    for aba in abas:
+        ws = wb.create_sheet(aba.nome)
+        letras = [_col_letter(i) for i in range(len(aba.colunas))]
+        for letra, largura in zip(letras, aba.larguras):
+            ws.column_dimensions[letra].width = _largura_excel(largura)
+        ws.sheet_format.defaultRowHeight = ALTURA_LINHA
+        ws.sheet_format.customHeight = True
+        ws.freeze_panes = "A2"
+
+        nomes_estilo = [estilos[f].name for f in aba.formatos]
+        cabecalho = [estilos["cabecalho"].name] * len(aba.colunas)
+
+        # write-only não guarda as células: cada append vai direto para o arquivo
+        ws.append(_celulas(ws, aba.colunas, cabecalho))
+        n = 0
+        for n, row in enumerate(aba.linhas(), start=1):
+            ws.append(_celulas(ws, row, nomes_estilo))
+
+        ultima = letras[-1] if letras else "A"
+        ws.auto_filter.ref = f"A1:{ultima}{n + 1}"
+        if aba.escala_cor is not None and n:
+            col = letras[aba.escala_cor]
+            ws.conditional_formatting.add(
+                f"{col}2:{col}{n + 1}",
+                ColorScaleRule(start_type="min", start_color=ESCALA_CORES[0],
+                               mid_type="percentile", mid_value=50, mid_color=ESCALA_CORES[1],
+                               end_type="max", end_color=ESCALA_CORES[2]),
+            )
+    wb.save(path)
+
+
+def default_engine() -> str:
+    """xlsxwriter se instalado, senão openpyxl"""
+    try:
+        import xlsxwriter  # noqa
+        return "xlsxwriter"
+    except Exception:
+        return "openpyxl"
+
+
+def escrever_relatorio(abas: List[AbaSpec], path: Optional[str] = None,
+                       engine: Optional[str] = None) -> str:
+    """Escreve as abas em um .xlsx (arquivo temporário se path for None) e retorna o caminho"""
+    engine = engine or default_engine()
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="relatorio_", suffix=".xlsx")
+        os.close(fd)
+    if engine == "xlsxwriter":
+        _escrever_xlsxwriter(abas, path)
+    elif engine == "openpyxl":
+        _escrever_openpyxl(abas, path)
+    else:
+        raise ValueError(f"Engine de Excel desconhecida: {engine}")
+    return path
+
+
+def _dados_benchmark(rows: int, n_lojas: int = 12) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    notas = rng.integers(0, 6, size=(rows, 4)).astype(float)
+    base = pd.DataFrame({
+        "Colaborador": [f"Colaborador {i}" for i in range(rows)],
+        "Região": rng.choice(["RJ", "SP"], rows),
+        "Loja": rng.choice([f"Loja {i}" for i in range(n_lojas)], rows),
+        "Setor": rng.choice(["Caixa", "Açougue", "Padaria", "Hortifruti"], rows),
+        "Velocidade": notas[:, 0], "Atendimento": notas[:, 1],
+        "Qualidade": notas[:, 2], "Ajuda": notas[:, 3],
+        "Avaliações": rng.integers(1, 50, rows),
+    })
+    base["Média Geral"] = base[["Velocidade", "Atendimento", "Qualidade", "Ajuda"]].mean(axis=1).round(2)
+    rank_av = (base.groupby(["Colaborador", "Região", "Loja"]).size()
+                   .reset_index(name="Avaliações feitas")
+                   .rename(columns={"Colaborador": "Avaliador"}).head(max(1, rows // 10)))
+    return base, rank_av
+
+
+def benchmark(rows: int, engines: List[str]) -> List[Dict]:
+    """Mede tempo e pico de memória (tracemalloc) de cada engine, normalizados por 10 mil linhas"""
+    import time
+    import tracemalloc
+
+    base, rank_av = _dados_benchmark(rows)
+    resultados = []
+    for engine in engines:
+        # Tempo medido sem tracemalloc (que distorce o tempo); memória numa segunda passada
+        t0 = time.perf_counter()
+        path = escrever_relatorio(abas_relatorio_por_loja(base, rank_av), engine=engine)
+        elapsed = time.perf_counter() - t0
+        tamanho = os.path.getsize(path)
+        os.remove(path)
+
+        tracemalloc.start()
+        path = escrever_relatorio(abas_relatorio_por_loja(base, rank_av), engine=engine)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        os.remove(path)
+
+        fator = 10_000 / rows
+        resultados.append({
+            "engine": engine, "linhas": rows,
+            "segundos": round(elapsed, 3), "pico_mb": round(peak / 2**20, 2),
+            "segundos_por_10k": round(elapsed * fator, 3),
+            "pico_mb_por_10k": round(peak / 2**20 * fator, 2),
+            "arquivo_kb": round(tamanho / 1024, 1),
+        })
+    return resultados
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark do motor de exportação Excel")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--engine", choices=["xlsxwriter", "openpyxl", "ambos"], default="ambos")
+    args = parser.parse_args()
+    engines = ["xlsxwriter", "openpyxl"] if args.engine == "ambos" else [args.engine]
+    for r in benchmark(args.rows, engines):
+        print(json.dumps(r, ensure_ascii=False))
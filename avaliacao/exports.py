@@ -0,0 +1,222 @@
+# avaliacao/exports.py — Exportações: relatório Excel por loja e linhas cruas para ferramentas de BI
+#
+# Relatório Excel: resumo por pessoa (uma aba por loja) + ranking de avaliadores, escrito
+# em streaming por excel_report.py; os bytes ficam em cache por (versão, filtro).
+#
+# Linhas cruas, formatos:
+#   parquet  — colunar, comprimido (zstd), tipos preservados
+#   arrow    — Arrow IPC / Feather v2 (leitura mais rápida, via mmap)
+#   csv.zip  — CSV em UTF-8 (BOM) escrito em blocos dentro do zip, sem montar o texto inteiro em memória
+#
+# As dimensões (Região, Loja, Setor, Colaborador, Avaliador, Fonte) saem como dicionário/categoria
+# e Data como timestamp, então o arquivo abre já tipado no pandas / Power BI / DuckDB.
+
+import glob
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .analytics import build_summary, ranking_avaliadores
+from .excel_report import abas_relatorio_por_loja, escrever_relatorio
+from .perf import incr, span
+
+COLUNAS_EXPORT = [
+    "Data", "Data_dia", "Hora", "Hora_num", "Região", "Loja", "Setor",
+    "Colaborador", "Avaliador", "Velocidade", "Atendimento", "Qualidade", "Ajuda", "Fonte",
+]
+DIMENSOES = ["Região", "Loja", "Setor", "Colaborador", "Avaliador", "Fonte"]
+
+FORMATOS = {
+    # formato: (extensão, mime)
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+    "csv.zip": ("csv.zip", "application/zip"),
+}
+
+CSV_CHUNK_ROWS = 50_000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "avaliacao_export")
+TMP_MAX_IDADE = 3600  # segundos: .tmp mais velho que isso é de uma gravação que morreu
+
+
+def preparar(df: pd.DataFrame) -> pd.DataFrame:
+    """Seleciona as colunas de exportação e fixa os tipos (categorias, datas, inteiros)"""
+    out = df[[c for c in COLUNAS_EXPORT if c in df.columns]].copy()
+    for c in DIMENSOES:
+        if c in out.columns and not isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype("category")
+    if "Data" in out.columns:
+        out["Data"] = pd.to_datetime(out["Data"], errors="coerce")
+    if "Data_dia" in out.columns:
+        # date32 no Arrow; NaT vira nulo
+        out["Data_dia"] = pd.to_datetime(out["Data_dia"], errors="coerce").dt.normalize()
+    if "Hora_num" in out.columns:
+        out["Hora_num"] = out["Hora_num"].astype("Int8")
+    return out.reset_index(drop=True)
+
+
+def _to_arrow(df: pd.DataFrame):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(preparar(df), preserve_index=False)
+    if "Data_dia" in table.column_names:
+        i = table.column_names.index("Data_dia")
+        table = table.set_column(i, "Data_dia", table.column(i).cast(pa.date32()))
+    return table
+
+
+def write_parquet(df: pd.DataFrame, dest) -> None:
+    import pyarrow.parquet as pq
+
+    pq.write_table(_to_arrow(df), dest, compression="zstd")
+
+
+def write_arrow_ipc(df: pd.DataFrame, dest) -> None:
+    import pyarrow.feather as feather
+
+    feather.write_feather(_to_arrow(df), dest, compression="zstd")
+
+
+def write_csv_zip(df: pd.DataFrame, dest, chunk_rows: int = CSV_CHUNK_ROWS,
+                  nome_csv: str = "avaliacoes.csv") -> None:
+    """Escreve o CSV em blocos de `chunk_rows` linhas direto na entrada do zip"""
+    out = df[[c for c in COLUNAS_EXPORT if c in df.columns]]
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(nome_csv, "w", force_zip64=True) as f:
+            f.write("\ufeff".encode("utf-8"))  # BOM para o Excel reconhecer UTF-8
+            for start in range(0, max(len(out), 1), chunk_rows):
+                chunk = out.iloc[start:start + chunk_rows]
+                if "Hora_num" in chunk.columns:
+                    chunk = chunk.assign(Hora_num=chunk["Hora_num"].astype("Int8"))  # 9, não 9.0
+                f.write(chunk.to_csv(index=False, header=(start == 0),
+                                     date_format="%Y-%m-%d %H:%M:%S").encode("utf-8"))
+
+
+WRITERS = {
+    "parquet": write_parquet,
+    "arrow": write_arrow_ipc,
+    "csv.zip": write_csv_zip,
+}
+
+
+def exportar(df: pd.DataFrame, formato: str, dest: Optional[str] = None) -> str:
+    """Grava df no formato pedido (arquivo temporário se dest for None) e retorna o caminho"""
+    if formato not in WRITERS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    if dest is None:
+        fd, dest = tempfile.mkstemp(prefix="avaliacoes_", suffix="." + FORMATOS[formato][0])
+        os.close(fd)
+    WRITERS[formato](df, dest)
+    return dest
+
+
+def arquivo_exportacao(df: pd.DataFrame, formato: str, dataset_version: str, filter_key: str) -> str:
+    """Caminho do export em disco para (versão, filtro, formato), gerando só se ainda não existir
+
+    O próprio arquivo serve de cache entre reruns e sessões; exports de versões
+    antigas do dataset são apagados quando uma versão nova é gerada.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    ext = FORMATOS[formato][0]
+    path = os.path.join(EXPORT_DIR, f"{dataset_version}_{filter_key}.{ext}")
+    if os.path.exists(path):
+        return path
+
+    agora = time.time()
+    for antigo in glob.glob(os.path.join(EXPORT_DIR, "*")):
+        nome = os.path.basename(antigo)
+        try:
+            if nome.endswith(".tmp"):
+                # em gravação por outra sessão, a não ser que tenha ficado para trás
+                if agora - os.path.getmtime(antigo) > TMP_MAX_IDADE:
+                    os.remove(antigo)
+            elif not nome.startswith(dataset_version + "_"):
+                os.remove(antigo)
+        except OSError:
+            pass
+
+    # um temporário por gravação: sessões do mesmo processo exportando a mesma chave
+    # não escrevem no mesmo arquivo, e o replace atômico publica só arquivos completos
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{dataset_version}_{filter_key}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        exportar(df, formato, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def bytes_exportacao(df: pd.DataFrame, formato: str, dataset_version: str, filter_key: str) -> bytes:
+    """Conteúdo de arquivo_exportacao(), com o arquivo fechado ao terminar
+
+    Uma sessão em outra versão do dataset pode apagar o arquivo entre a checagem e a
+    leitura; nesse caso o export é gerado de novo.
+    """
+    for tentativa in range(3):
+        try:
+            with open(arquivo_exportacao(df, formato, dataset_version, filter_key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            if tentativa == 2:
+                raise
+
+
+# ---------------------------------
+# RELATÓRIO EXCEL
+# ---------------------------------
+def gerar_relatorio_excel_por_loja(df_in: pd.DataFrame, path: Optional[str] = None,
+                                   engine: Optional[str] = None) -> str:
+    """Gera o relatório (uma aba por loja + Avaliadores) e retorna o caminho do .xlsx"""
+    with span("excel_export", rows=len(df_in)):
+        return _gerar_relatorio_excel_por_loja(df_in, path, engine)
+
+EXCEL_CACHE_SIZE = 16  # relatórios guardados em memória (os menos usados saem)
+
+_excel_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_excel_lock = threading.Lock()
+
+def relatorio_excel_bytes(df_in: pd.DataFrame, dataset_version: str, filter_key: str) -> bytes:
+    """Bytes do relatório de df_in, em cache por (versão do dataset, filtro) e compartilhado entre sessões"""
+    chave = (dataset_version, filter_key)
+    incr("cache.excel.chamadas")
+    with _excel_lock:
+        if chave in _excel_cache:
+            _excel_cache.move_to_end(chave)
+            return _excel_cache[chave]
+    incr("cache.excel.misses")
+    # Escrita em streaming para um arquivo temporário (ver excel_report.py)
+    path = gerar_relatorio_excel_por_loja(df_in)
+    try:
+        with open(path, "rb") as f:
+            payload = f.read()
+    finally:
+        os.remove(path)
+    with _excel_lock:
+        _excel_cache[chave] = payload
+        while len(_excel_cache) > EXCEL_CACHE_SIZE:
+            _excel_cache.popitem(last=False)
+    return payload
+
+def _gerar_relatorio_excel_por_loja(df_in: pd.DataFrame, path: Optional[str],
+                                    engine: Optional[str]) -> str:
+    # Incluindo Região no relatório Excel
+    base = build_summary(df_in, by_cols=["Colaborador","Região","Loja","Setor"]).copy()
+    base = base.sort_values("Média Geral", ascending=False)
+    cols = ["Colaborador","Região","Loja","Setor","Velocidade","Atendimento","Qualidade","Ajuda","Avaliações","Média Geral"]
+    base = base[[c for c in cols if c in base.columns]]
+
+    # Ranking de avaliadores (aba extra)
+    rank_av = ranking_avaliadores(df_in)
+
+    # Escrita em streaming (ver excel_report.py)
+    return escrever_relatorio(abas_relatorio_por_loja(base, rank_av), path=path, engine=engine)
@@ -0,0 +1,217 @@
+# avaliacao/fake_sheets.py — Cliente gspread falso, em memória, para testes e benchmarks
+#
+# Imita o pedaço da API do gspread que o pipeline usa:
+#     client.open_by_key(id) -> planilha
+#     planilha.worksheets() / worksheet(titulo) / values_batch_get(ranges)
+#     aba.get_all_values() / get_values(range)
+#
+# Cada chamada conta como uma requisição: pode ter latência (fixa + variação) e
+# falhar com 429 (mesma APIError do gspread), por taxa aleatória ou nas N primeiras.
+# Os dados vêm de synthetic_data.py ou de qualquer {aba: linhas} passado pelo chamador.
+#
+#     client = FakeClient(gerar_planilha(dias=7), latencia=0.05, taxa_429=0.1)
+#     set_sheets_client(client)           # avaliacao.sources passa a usar o falso
+#
+# Ou, sem mexer no código (o app e os scripts leem no primeiro acesso):
+#     AVALIACAO_SHEETS_BACKEND=fake AVALIACAO_FAKE_SHEETS='{"linhas": 100000, "latencia": 0.2}'
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .synthetic_data import gerar_planilha, gerar_planilha_por_total
+
+# chaves de AVALIACAO_FAKE_SHEETS que configuram o cliente (o resto vai para o gerador)
+_CHAVES_CLIENTE = {"latencia", "variacao", "taxa_429", "falhar_primeiras", "seed_erros", "titulo", "linhas"}
+
+
+class _FakeResponse:
+    """O suficiente de requests.Response para construir uma gspread APIError"""
+
+    def __init__(self, code: int, message: str, status: str):
+        self.status_code = code
+        self._payload = {"error": {"code": code, "message": message, "status": status}}
+        self.text = json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+def api_error(code: int, message: str, status: str):
+    """APIError do gspread com o mesmo formato que a API real devolve"""
+    from gspread.exceptions import APIError
+
+    return APIError(_FakeResponse(code, message, status))
+
+
+def _trim(row: List[str]) -> List[str]:
+    """A API omite as células vazias no fim da linha"""
+    n = len(row)
+    while n and row[n - 1] == "":
+        n -= 1
+    return row[:n]
+
+
+def _col_index(letras: str) -> int:
+    n = 0
+    for ch in letras.upper():
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, values: List[List[str]], ws_id: int):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = ws_id
+        self._values = values
+
+    @property
+    def row_count(self) -> int:
+        return len(self._values)
+
+    @property
+    def col_count(self) -> int:
+        return max((len(r) for r in self._values), default=0)
+
+    def get_all_values(self) -> List[List[str]]:
+        self.spreadsheet.client._request("get_all_values")
+        return [list(r) for r in self._values]
+
+    def get_values(self, range_name: Optional[str] = None) -> List[List[str]]:
+        self.spreadsheet.client._request("get_values")
+        return self._slice(range_name)
+
+    def _slice(self, range_name: Optional[str]) -> List[List[str]]:
+        """Recorte A1 simples (ex.: "A1:M", "A:M", "A2:C100"); sem range, a aba inteira"""
+        if not range_name:
+            return [list(r) for r in self._values]
+        m = re.fullmatch(r"([A-Za-z]+)(\d*)(?::([A-Za-z]+)(\d*))?", range_name.strip())
+        if not m:
+            raise api_error(400, f"Unable to parse range: {range_name}", "INVALID_ARGUMENT")
+        c0 = _col_index(m.group(1))
+        r0 = int(m.group(2)) - 1 if m.group(2) else 0
+        c1 = _col_index(m.group(3)) + 1 if m.group(3) else c0 + 1
+        r1 = int(m.group(4)) if m.group(4) else len(self._values)
+        return [list(r[c0:c1]) for r in self._values[r0:r1]]
+
+    def __repr__(self):
+        return f"<FakeWorksheet {self.title!r} id:{self.id}>"
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient", key: str, title: str, abas: Dict[str, List[List[str]]]):
+        self.client = client
+        self.id = key
+        self.title = title
+        self._worksheets = [FakeWorksheet(self, t, v, i) for i, (t, v) in enumerate(abas.items())]
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self.client._request("worksheets")
+        return list(self._worksheets)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.client._request("worksheet")
+        for ws in self._worksheets:
+            if ws.title == title:
+                return ws
+        from gspread.exceptions import WorksheetNotFound
+        raise WorksheetNotFound(title)
+
+    def values_batch_get(self, ranges: List[str], params: Optional[Dict] = None) -> Dict:
+        """Várias faixas numa requisição só, no formato de spreadsheets.values.batchGet"""
+        self.client._request("values_batch_get")
+        por_titulo = {ws.title: ws for ws in self._worksheets}
+        value_ranges = []
+        for rng_ in ranges:
+            titulo, _, faixa = rng_.rpartition("!")
+            titulo = titulo.strip("'") or self._worksheets[0].title
+            if titulo not in por_titulo:
+                raise api_error(400, f"Unable to parse range: {rng_}", "INVALID_ARGUMENT")
+            linhas = [_trim(r) for r in por_titulo[titulo]._slice(faixa or None)]
+            while linhas and not linhas[-1]:
+                linhas.pop()
+            value_ranges.append({"range": rng_, "majorDimension": "ROWS", "values": linhas})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def __repr__(self):
+        return f"<FakeSpreadsheet {self.title!r} id:{self.id}>"
+
+
+class FakeClient:
+    """Cliente gspread em memória com latência e erros 429 configuráveis
+
+    key=None aceita qualquer ID (o mesmo conjunto de abas para todos); com key,
+    outros IDs dão 404 como a API real.
+    """
+
+    pausa_entre_abas = 0.0  # sources.fetch_sheets não precisa esperar entre abas
+
+    def __init__(self, abas: Dict[str, List[List[str]]], key: Optional[str] = None,
+                 titulo: str = "Avaliações (sintético)", latencia: float = 0.0, variacao: float = 0.0,
+                 taxa_429: float = 0.0, falhar_primeiras: int = 0, seed_erros: int = 0):
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_429 = taxa_429
+        self.falhar_primeiras = falhar_primeiras
+        self._key = key
+        self._spreadsheet = FakeSpreadsheet(self, key or "fake", titulo, abas)
+        self._rng = random.Random(seed_erros)
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.erros_429 = 0
+
+    def _request(self, metodo: str):
+        """Conta a requisição, espera a latência e, se for a vez, falha com 429"""
+        with self._lock:
+            n = sum(self.requests.values())
+            self.requests[metodo] += 1
+            falha = n < self.falhar_primeiras or (self.taxa_429 and self._rng.random() < self.taxa_429)
+            atraso = self.latencia + (self._rng.uniform(0, self.variacao) if self.variacao else 0.0)
+            if falha:
+                self.erros_429 += 1
+        if atraso:
+            time.sleep(atraso)
+        if falha:
+            raise api_error(429, "Quota exceeded for quota metric 'Read requests' and limit "
+                                 "'Read requests per minute per user'", "RESOURCE_EXHAUSTED")
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self._request("open_by_key")
+        if self._key is not None and key != self._key:
+            raise api_error(404, f"Requested entity was not found: {key}", "NOT_FOUND")
+        return self._spreadsheet
+
+    def stats(self) -> Dict:
+        """Contadores de requisições por método e de 429 injetados"""
+        with self._lock:
+            return {"requests": dict(self.requests), "total": sum(self.requests.values()),
+                    "erros_429": self.erros_429}
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.erros_429 = 0
+
+
+def client_from_config(config: Dict) -> FakeClient:
+    """Monta o cliente a partir de um dict (o JSON de AVALIACAO_FAKE_SHEETS)
+
+    "linhas" gera ~N avaliações no total; sem ela, as demais chaves vão direto
+    para gerar_planilha (dias, linhas_por_dia, colaboradores, taxa_sujeira, seed...).
+    """
+    cliente = {k: v for k, v in config.items() if k in _CHAVES_CLIENTE}
+    gerador = {k: v for k, v in config.items() if k not in _CHAVES_CLIENTE}
+    total = cliente.pop("linhas", None)
+    abas = gerar_planilha_por_total(int(total), **gerador) if total else gerar_planilha(**gerador)
+    return FakeClient(abas, **cliente)
+
+
+def client_from_env() -> FakeClient:
+    """Cliente configurado por AVALIACAO_FAKE_SHEETS (JSON; vazio = padrões do gerador)"""
+    return client_from_config(json.loads(os.environ.get("AVALIACAO_FAKE_SHEETS") or "{}"))
@@ -0,0 +1,274 @@
+# avaliacao/federation.py — Várias planilhas de avaliação num dataset só (fontes.toml)
+#
+# Cada região pode ter a própria planilha de formulário. fontes.toml lista as planilhas,
+# cada uma com nome, região opcional e mapeamento aba -> loja:
+#
+#     [[fontes]]
+#     nome = "MG"
+#     planilha = "https://docs.google.com/spreadsheets/d/.../edit"
+#     regiao = "MG"
+#     ignorar = ["Resumo"]
+#     [fontes.abas]
+#     "Respostas BH" = "BH Centro"
+#
+# get_dataset_federado() carrega as fontes em paralelo, cada uma no próprio snapshot
+# (dataset.get_dataset, com TTL por planilha), e junta tudo com a coluna Fonte. Uma
+# planilha fora do ar não derruba o painel: entra a última versão boa dela (ou nada) com
+# um aviso, e ela só é tentada de novo depois de FALHA_TTL. Sem fontes.toml, a fonte é
+# só a planilha padrão (SPREADSHEET_URL).
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .dataset import Dataset, dataset_pronto, get_dataset, invalidate_dataset, load_dataset
+from .identity import canonizar
+from .normalize import get_regiao
+from .quality import RelatorioQualidade
+from .sources import SPREADSHEET_URL
+
+logger = logging.getLogger("avaliacao")
+
+# fontes.toml fica na raiz do projeto (ao lado de usuarios.toml)
+FONTES_PATH = os.environ.get(
+    "AVALIACAO_FONTES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fontes.toml"),
+)
+FONTE_PADRAO = "Principal"
+FALHA_TTL = 60  # segundos sem tentar de novo uma planilha que falhou
+MAX_CARGAS_PARALELAS = 8
+
+
+class Fonte:
+    """Uma planilha de avaliações: nome (coluna Fonte), região e abas -> lojas"""
+
+    def __init__(self, nome: str, planilha: str, regiao: Optional[str] = None,
+                 abas: Optional[Dict[str, str]] = None, ignorar: Sequence[str] = ()):
+        self.nome = nome
+        self.planilha = planilha
+        self.regiao = regiao
+        self.abas = dict(abas or {})
+        self.ignorar = list(ignorar)
+
+    def aplicar(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Linhas normalizadas (Loja = título da aba) -> lojas, região e Fonte desta planilha"""
+        if data.empty and not len(data.columns):
+            return data
+        if self.ignorar:
+            data = data.loc[~data["Loja"].isin(self.ignorar)]
+        data = data.copy(deep=False)  # colunas novas sem mexer no frame de quem chamou
+        if self.abas:
+            data["Loja"] = data["Loja"].replace(self.abas)
+        if self.regiao:
+            data["Região"] = self.regiao
+        elif self.abas:
+            data["Região"] = data["Loja"].map({l: get_regiao(l) for l in data["Loja"].unique()})
+        data["Fonte"] = self.nome
+        return data
+
+    def preparar(self, ds: Dataset) -> Dataset:
+        """Dataset da planilha com aplicar() nas linhas recentes e nas do histórico"""
+        out = Dataset(ds.version, self.aplicar(ds.data), ds.avisos, ds.carregado_em)
+        if ds.arquivo is not None:
+            out.arquivo = HistoricoFederado([(self, ds.arquivo)])
+        out.qualidade = ds.qualidade
+        return out
+
+    def __repr__(self):
+        return f"<Fonte {self.nome!r} {self.planilha[:60]}>"
+
+
+def carregar_fontes(path: str = FONTES_PATH) -> List[Fonte]:
+    """Lê fontes.toml; ValueError se faltar campo ou houver nome repetido"""
+    import tomllib
+
+    with open(path, "rb") as f:
+        raw = tomllib.load(f)
+    fontes: List[Fonte] = []
+    for i, f in enumerate(raw.get("fontes", []), 1):
+        if not f.get("nome") or not f.get("planilha"):
+            raise ValueError(f"Fonte {i}: informe nome e planilha")
+        fontes.append(Fonte(f["nome"], f["planilha"], f.get("regiao"), f.get("abas"), f.get("ignorar", [])))
+    nomes = [f.nome for f in fontes]
+    if len(set(nomes)) != len(nomes):
+        raise ValueError(f"Nomes de fonte repetidos: {sorted({n for n in nomes if nomes.count(n) > 1})}")
+    if not fontes:
+        raise ValueError(f"{path}: nenhuma [[fontes]] cadastrada")
+    return fontes
+
+
+_config: Optional[Tuple[Tuple[str, float], List[Fonte]]] = None
+_config_lock = threading.Lock()
+
+
+def get_fontes(path: Optional[str] = None) -> List[Fonte]:
+    """Fontes atuais; relê fontes.toml quando ele muda (erro no arquivo novo mantém as anteriores)"""
+    global _config
+    path = path or FONTES_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return [Fonte(FONTE_PADRAO, SPREADSHEET_URL)]
+    with _config_lock:
+        if _config is None or _config[0] != (path, mtime):
+            try:
+                fontes = carregar_fontes(path)
+            except Exception as e:
+                if _config is None:
+                    raise
+                logger.warning("Erro ao recarregar %s, mantendo as fontes anteriores: %s", path, e)
+                return _config[1]
+            if _config is not None:
+                invalidate_dataset()  # mapeamentos podem ter mudado: recarrega tudo
+            _config = ((path, mtime), fontes)
+            logger.info("Fontes carregadas de %s: %s", path, ", ".join(f.nome for f in fontes))
+        return _config[1]
+
+
+def escolher_fonte(nome: Optional[str] = None, fontes: Optional[List[Fonte]] = None) -> Fonte:
+    """Fonte pelo nome; sem nome, a única cadastrada (ValueError se houver várias ou nenhuma com o nome)"""
+    fontes = fontes or get_fontes()
+    if nome:
+        for f in fontes:
+            if f.nome == nome:
+                return f
+        raise ValueError(f"Fonte desconhecida: {nome!r} (cadastradas: {', '.join(f.nome for f in fontes)})")
+    if len(fontes) > 1:
+        raise ValueError(f"Informe a fonte ({', '.join(f.nome for f in fontes)})")
+    return fontes[0]
+
+
+class HistoricoFederado:
+    """Históricos arquivados (archive.Arquivo) de uma ou mais fontes com a interface de um só"""
+
+    def __init__(self, partes: List[Tuple[Fonte, object]]):
+        self.partes = partes
+
+    @property
+    def versao(self) -> str:
+        return "+".join(a.versao for _, a in self.partes)
+
+    @property
+    def corte(self):
+        return min(a.corte for _, a in self.partes)
+
+    @property
+    def primeira_data(self):
+        datas = [a.primeira_data for _, a in self.partes if a.primeira_data]
+        return min(datas) if datas else None
+
+    @property
+    def linhas(self) -> int:
+        return sum(a.linhas for _, a in self.partes)
+
+    def meses_para(self, d_ini=None, d_fim=None) -> List[str]:
+        return sorted({m for _, a in self.partes for m in a.meses_para(d_ini, d_fim)})
+
+    def ler(self, meses: List[str]) -> pd.DataFrame:
+        frames = []
+        for fonte, arquivo in self.partes:
+            proprios = [m for m in meses if m in arquivo.manifesto["meses"]]
+            if proprios:
+                frames.append(fonte.aplicar(arquivo.ler(proprios)))
+        return pd.concat(frames, ignore_index=True)
+
+
+# ---------------------------------
+# CARGA FEDERADA
+# ---------------------------------
+_ultimos_bons: Dict[str, Dataset] = {}      # planilha -> última carga que deu certo
+_falhas: Dict[str, Tuple[float, str]] = {}  # planilha -> (quando, erro)
+_federado: Optional[Tuple[tuple, Dataset, List[Dataset]]] = None
+_federado_lock = threading.Lock()
+
+
+def _carregar_fonte(fonte: Fonte, loader: Callable[[str], Dataset]) -> Tuple[Optional[Dataset], Optional[str]]:
+    """(dataset, aviso) de uma fonte sem deixar a exceção escapar"""
+    falha = _falhas.get(fonte.planilha)
+    if falha and time.time() - falha[0] < FALHA_TTL and not dataset_pronto(fonte.planilha):
+        erro = falha[1]
+    else:
+        try:
+            ds = get_dataset(fonte.planilha, lambda p: fonte.preparar(loader(p)))
+            _ultimos_bons[fonte.planilha] = ds
+            _falhas.pop(fonte.planilha, None)
+            return ds, None
+        except Exception as e:
+            erro = f"{type(e).__name__}: {e}"
+            _falhas[fonte.planilha] = (time.time(), erro)
+            logger.warning("Fonte '%s' indisponível: %s", fonte.nome, erro)
+    anterior = _ultimos_bons.get(fonte.planilha)
+    if anterior is not None:
+        hora = time.strftime("%H:%M", time.localtime(anterior.carregado_em))
+        return anterior, f"Fonte '{fonte.nome}' indisponível ({erro}); mostrando os dados carregados às {hora}."
+    return None, f"Fonte '{fonte.nome}' indisponível ({erro}); as lojas dela estão fora do painel."
+
+
+def invalidar_fontes() -> None:
+    """Descarta os snapshots e o intervalo de espera das fontes que falharam (botão Atualizar)"""
+    _falhas.clear()
+    invalidate_dataset()
+
+
+def juntar_fontes(partes: List[Tuple[Fonte, Dataset]], avisos: Sequence[str] = ()) -> Dataset:
+    """Um Dataset com as linhas de todas as fontes (coluna Fonte) e os históricos delas"""
+    version = hashlib.sha1("|".join(f"{f.nome}:{ds.version}" for f, ds in partes).encode("utf-8")).hexdigest()[:12]
+    frames = [ds.data for _, ds in partes if len(ds.data.columns)]
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if len(frames) > 1:
+        data = canonizar(data)  # a mesma pessoa pode aparecer em mais de uma planilha
+    todos_avisos = [f"[{f.nome}] {a}" for f, ds in partes for a in ds.avisos] + list(avisos)
+    out = Dataset(version, data, todos_avisos, min(ds.carregado_em for _, ds in partes))
+    relatorios = [ds.qualidade.com_fonte(f.nome) for f, ds in partes if ds.qualidade is not None]
+    if relatorios:
+        out.qualidade = RelatorioQualidade.juntar(relatorios)
+    historicos = [p for _, ds in partes if ds.arquivo is not None for p in ds.arquivo.partes]
+    if historicos:
+        out.arquivo = HistoricoFederado(historicos)
+    return out
+
+
+def get_dataset_federado(loader: Optional[Callable[[str], Dataset]] = None,
+                         fontes: Optional[List[Fonte]] = None) -> Dataset:
+    """Dataset de todas as fontes; as que precisam de carga vão em paralelo
+
+    `loader(planilha)` busca uma planilha (padrão: load_dataset). Com uma fonte só o
+    snapshot dela é devolvido direto; com várias, a junção fica em cache até alguma
+    fonte mudar. RuntimeError só se nenhuma fonte tiver dados.
+    """
+    global _federado
+    fontes = fontes or get_fontes()
+    loader = loader or load_dataset
+    pendentes = [f for f in fontes if not dataset_pronto(f.planilha)]
+    resultados: Dict[str, Tuple[Optional[Dataset], Optional[str]]] = {}
+    if len(pendentes) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(pendentes), MAX_CARGAS_PARALELAS),
+                                thread_name_prefix="fonte") as pool:
+            for fonte, r in zip(pendentes, pool.map(lambda f: _carregar_fonte(f, loader), pendentes)):
+                resultados[fonte.nome] = r
+    for fonte in fontes:
+        if fonte.nome not in resultados:
+            resultados[fonte.nome] = _carregar_fonte(fonte, loader)
+
+    partes = [(f, resultados[f.nome][0]) for f in fontes if resultados[f.nome][0] is not None]
+    avisos = [resultados[f.nome][1] for f in fontes if resultados[f.nome][1]]
+    if not partes:
+        raise RuntimeError("Nenhuma planilha disponível: " + " | ".join(avisos))
+    if len(fontes) == 1 and not avisos:
+        return partes[0][1]
+
+    chave = tuple((f.nome, id(ds)) for f, ds in partes) + tuple(avisos)
+    with _federado_lock:
+        if _federado is not None and _federado[0] == chave:
+            return _federado[1]
+    ds = juntar_fontes(partes, avisos)
+    with _federado_lock:
+        # guarda junto os datasets da chave para que os ids não sejam reaproveitados
+        _federado = (chave, ds, [d for _, d in partes])
+    return ds
@@ -0,0 +1,288 @@
+# avaliacao/identity.py — Nomes de colaboradores e avaliadores: nome canônico, ID estável e busca por trigramas
+#
+#     canonizar(data)                                        # um nome só por pessoa em Colaborador e Avaliador
+#     indice_pessoas(dataset).buscar("joao sil", lojas_do_usuario)
+#
+# Colaborador e Avaliador são digitados no formulário: "Joao Silva", "João  Silva" e
+# "joao silva" viravam três linhas em cada resumo e ranking. dobrar() tira acentos, caixa
+# e espaços repetidos; nomes com a mesma chave dobrada são a mesma pessoa, mostrada pela
+# variante mais bem escrita (acentos, sem tudo em maiúsculas, iniciais maiúsculas, depois a
+# mais frequente).
+# apelidos.toml cobre o que a dobra não resolve (apelido, abreviação, erro de digitação).
+#
+# canonizar() roda onde as linhas de um dataset são juntadas (normalize.build_dataset,
+# histórico em archive.py, fontes em federation.py) e trabalha sobre os nomes distintos,
+# não linha a linha; respostas recebidas por ingest.py herdam os nomes do snapshot.
+#
+# O ID de uma pessoa é um hash da chave dobrada: o mesmo em todo processo e toda carga, sem
+# cadastro. indice_pessoas() monta uma vez por dataset a lista de pessoas (lojas, avaliações
+# recebidas e feitas) e um índice de trigramas das palavras dos nomes; a busca soma as listas
+# de cada trigrama da consulta com bincount e aceita erro de digitação (basta parte deles).
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import unicodedata
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .perf import span
+
+logger = logging.getLogger("avaliacao")
+
+# apelidos.toml fica na raiz do projeto (ao lado de usuarios.toml e fontes.toml)
+APELIDOS_PATH = os.environ.get(
+    "AVALIACAO_APELIDOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apelidos.toml"),
+)
+COLUNAS_NOMES = ["Colaborador", "Avaliador"]
+SEM_NOME = {"", "nan", "none"}  # avaliador em branco (normalize mantém a linha)
+SIMILARIDADE_MINIMA = 0.4       # fração dos trigramas da consulta que o nome precisa ter
+BUSCA_LIMITE = 10
+COLUNAS_BUSCA = ["ID", "Nome", "Lojas", "Avaliações recebidas", "Avaliações feitas"]
+
+
+def dobrar(nome: str) -> str:
+    """Chave de comparação do nome: sem acentos, minúsculas e espaços simples"""
+    sem_acento = "".join(c for c in unicodedata.normalize("NFKD", str(nome)) if not unicodedata.combining(c))
+    return " ".join(sem_acento.casefold().split())
+
+
+def pessoa_id(chave: str) -> int:
+    """ID estável da chave dobrada (48 bits: cabe num número do JavaScript)"""
+    return int.from_bytes(hashlib.blake2b(chave.encode("utf-8"), digest_size=6).digest(), "big")
+
+
+def _capricho(nome: str) -> Tuple[int, int, int]:
+    """Quanto a variante parece bem escrita: acentos, sem maiúsculas no meio das palavras, iniciais maiúsculas"""
+    palavras = nome.split()
+    return (sum(1 for c in nome if ord(c) > 127),
+            -sum(1 for p in palavras for c in p[1:] if c.isupper()),
+            sum(1 for p in palavras if p[:1].isupper()))
+
+
+# ---------------------------------
+# APELIDOS
+# ---------------------------------
+def carregar_apelidos(path: str = APELIDOS_PATH) -> Dict[str, str]:
+    """apelidos.toml -> {chave dobrada do apelido: nome canônico}; ValueError se mal formado"""
+    import tomllib
+
+    with open(path, "rb") as f:
+        tabela = tomllib.load(f).get("apelidos", {})
+    if not isinstance(tabela, dict) or not all(isinstance(v, str) and v.strip() for v in tabela.values()):
+        raise ValueError(f'{path}: [apelidos] deve ter linhas "como foi digitado" = "nome canônico"')
+    return {dobrar(k): " ".join(v.split()) for k, v in tabela.items()}
+
+
+_apelidos: Optional[Tuple[Tuple[str, float], Dict[str, str]]] = None
+_apelidos_lock = threading.Lock()
+
+
+def get_apelidos(path: Optional[str] = None) -> Dict[str, str]:
+    """Apelidos atuais; relidos quando o arquivo muda (sem arquivo, nenhum; erro mantém os anteriores)"""
+    global _apelidos
+    path = path or APELIDOS_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _apelidos_lock:
+        if _apelidos is None or _apelidos[0] != (path, mtime):
+            try:
+                apelidos = carregar_apelidos(path)
+            except Exception as e:
+                logger.warning("Erro ao ler %s, mantendo os apelidos anteriores: %s", path, e)
+                return _apelidos[1] if _apelidos is not None else {}
+            _apelidos = ((path, mtime), apelidos)
+            logger.info("Apelidos carregados de %s: %d", path, len(apelidos))
+        return _apelidos[1]
+
+
+# ---------------------------------
+# NOME CANÔNICO
+# ---------------------------------
+def _canonicos(contagens: pd.Series, apelidos: Dict[str, str],
+               conhecidos: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Nome distinto -> nome canônico, a partir de quantas linhas têm cada nome
+
+    `conhecidos`: chave dobrada -> nome já em uso (o do snapshot), que prevalece.
+    """
+    limpos = contagens.groupby(np.array([" ".join(str(v).split()) for v in contagens.index], dtype=object),
+                               sort=False).sum()
+    forcados = {dobrar(v): v for v in apelidos.values()}
+    melhor: Dict[str, Tuple] = {}
+    chave_de: Dict[str, str] = {}
+    for nome, n in limpos.items():
+        chave = dobrar(nome)
+        chave = dobrar(apelidos[chave]) if chave in apelidos else chave
+        chave_de[nome] = chave
+        nota = (*_capricho(nome), int(n))
+        if chave not in melhor or nota > melhor[chave][0] or (nota == melhor[chave][0] and nome < melhor[chave][1]):
+            melhor[chave] = (nota, nome)
+    conhecidos = conhecidos or {}
+    saida = {}
+    for original in contagens.index:
+        chave = chave_de[" ".join(str(original).split())]
+        if chave in SEM_NOME:
+            saida[original] = original
+        else:
+            saida[original] = forcados.get(chave) or conhecidos.get(chave) or melhor[chave][1]
+    return saida
+
+
+def canonizar(data: pd.DataFrame, conhecidos: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Colaborador e Avaliador com o nome canônico de cada pessoa (sem alterar o frame recebido)
+
+    As duas colunas são resolvidas juntas: quem avalia e é avaliado aparece com o mesmo nome.
+    """
+    colunas = [c for c in COLUNAS_NOMES if c in data.columns]
+    if data.empty or not colunas:
+        return data
+    with span("nomes_canonicos", rows=len(data)) as s:
+        fatores = {c: pd.factorize(data[c]) for c in colunas}
+        contagens = pd.concat([
+            pd.Series(np.bincount(codigos[codigos >= 0], minlength=len(nomes)), index=np.asarray(nomes, dtype=object))
+            for codigos, nomes in fatores.values()
+        ])
+        contagens = contagens.groupby(level=0, sort=False).sum()
+        nomes_canonicos = _canonicos(contagens, get_apelidos(), conhecidos)
+        out = data
+        trocados = 0
+        for c, (codigos, nomes) in fatores.items():
+            antes = np.asarray(nomes, dtype=object)
+            depois = np.array([nomes_canonicos[n] for n in antes], dtype=object)
+            mudou = antes != depois
+            if not mudou.any():
+                continue
+            if out is data:
+                out = data.copy(deep=False)  # colunas novas sem mexer no frame de quem chamou
+            valores = depois.take(np.maximum(codigos, 0)) if len(depois) else np.empty(len(codigos), dtype=object)
+            valores[codigos < 0] = None
+            out[c] = pd.Series(valores, index=data.index).astype(data[c].dtype)
+            trocados += int(mudou[codigos[codigos >= 0]].sum())
+        s.rows = trocados
+    return out
+
+
+# ---------------------------------
+# ÍNDICE DE PESSOAS E BUSCA
+# ---------------------------------
+def _trigramas(chave: str, completo: bool = True) -> List[str]:
+    """Trigramas de cada palavra (com dois espaços antes; um depois se a palavra está completa)"""
+    palavras = chave.split()
+    out = []
+    for i, p in enumerate(palavras):
+        p = "  " + p + (" " if completo or i < len(palavras) - 1 else "")
+        out.extend(p[j:j + 3] for j in range(len(p) - 2))
+    return list(dict.fromkeys(out))
+
+
+class IndicePessoas:
+    """Colaboradores e avaliadores de um dataset, com as lojas onde aparecem e busca por trigramas"""
+
+    def __init__(self, data: pd.DataFrame):
+        partes = []
+        for col, medida in (("Colaborador", "Avaliações recebidas"), ("Avaliador", "Avaliações feitas")):
+            if col in data.columns and "Loja" in data.columns:
+                partes.append(data.groupby([col, "Loja"], sort=False).size().rename(medida).rename_axis(["Nome", "Loja"]))
+        presenca = (pd.concat(partes, axis=1).fillna(0).astype(np.int64).reset_index() if partes
+                    else pd.DataFrame(columns=["Nome", "Loja", "Avaliações recebidas", "Avaliações feitas"]))
+        chaves = presenca["Nome"].map(dobrar)
+        presenca = presenca.loc[~chaves.isin(SEM_NOME).to_numpy()]
+        chaves = chaves.loc[presenca.index]
+        # uma pessoa por chave (num dataset canonizado, chave e nome andam juntos)
+        codigos, unicas = pd.factorize(chaves)
+        self.chaves: List[str] = list(unicas)
+        self.nomes = presenca["Nome"].groupby(codigos).first().to_numpy(dtype=object)
+        self.ids = np.array([pessoa_id(k) for k in self.chaves], dtype=np.int64)
+        self.canonicos: Dict[str, str] = dict(zip(self.chaves, self.nomes))
+        self._pessoa = codigos.astype(np.int64)
+        self._loja = presenca["Loja"].to_numpy(dtype=object)
+        self._recebidas = presenca["Avaliações recebidas"].to_numpy(dtype=np.int64)
+        self._feitas = presenca["Avaliações feitas"].to_numpy(dtype=np.int64)
+        self._linhas_da_pessoa = pd.Series(np.arange(len(codigos))).groupby(codigos).indices
+        listas: Dict[str, List[int]] = {}
+        for i, chave in enumerate(self.chaves):
+            for t in _trigramas(chave):
+                listas.setdefault(t, []).append(i)
+        self._trigramas = {t: np.array(v, dtype=np.int32) for t, v in listas.items()}
+        self._escopos: Dict[Optional[Tuple[str, ...]], Tuple[np.ndarray, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+    def id_de(self, nome: str) -> int:
+        """ID da pessoa pelo nome como foi digitado (acentos, caixa, espaços e apelidos não importam)"""
+        chave = dobrar(nome)
+        apelidos = get_apelidos()
+        return pessoa_id(dobrar(apelidos[chave]) if chave in apelidos else chave)
+
+    def _escopo(self, stores: Optional[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(linhas de presença nas lojas, recebidas, feitas e presença por pessoa), em cache por conjunto de lojas"""
+        chave = None if stores is None else tuple(sorted(stores))
+        escopo = self._escopos.get(chave)
+        if escopo is None:
+            linhas = np.ones(len(self._loja), dtype=bool) if chave is None else np.isin(self._loja, list(chave))
+            pessoa, n = self._pessoa[linhas], len(self.chaves)
+            escopo = self._escopos[chave] = (
+                linhas,
+                np.bincount(pessoa, self._recebidas[linhas], n).astype(np.int64),
+                np.bincount(pessoa, self._feitas[linhas], n).astype(np.int64),
+                np.bincount(pessoa, minlength=n) > 0,
+            )
+        return escopo
+
+    def buscar(self, texto: str, stores: Optional[Sequence[str]] = None, limite: int = BUSCA_LIMITE) -> List[Dict]:
+        """Pessoas cujo nome parece com `texto` (pedaço do nome, sem acento, com erro de digitação)
+
+        Só as que aparecem em `stores` (None = todas), com lojas e avaliações dentro delas;
+        um dict por pessoa com as chaves de COLUNAS_BUSCA (registros, sem DataFrame: é a
+        busca de cada tecla digitada).
+        Ordem: nome que contém o texto no início de uma palavra, depois em qualquer lugar,
+        depois mais trigramas em comum, depois mais avaliações.
+        """
+        consulta = dobrar(texto)
+        trigramas = _trigramas(consulta, completo=False)
+        listas = [self._trigramas[t] for t in trigramas if t in self._trigramas]
+        if not listas:
+            return []
+        acertos = np.bincount(np.concatenate(listas), minlength=len(self.chaves))
+        minimo = len(trigramas) if len(consulta) < 4 else max(1, math.ceil(SIMILARIDADE_MINIMA * len(trigramas)))
+        linhas, recebidas, feitas, presentes = self._escopo(stores)
+        candidatos = np.flatnonzero((acertos >= minimo) & presentes)
+        inicio = np.array([(" " + self.chaves[i]).find(" " + consulta) >= 0 for i in candidatos], dtype=bool)
+        contem = np.array([consulta in self.chaves[i] for i in candidatos], dtype=bool)
+        total = recebidas[candidatos] + feitas[candidatos]
+        ordem = np.lexsort((-total, -acertos[candidatos], ~contem, ~inicio))
+        escolhidos = candidatos[ordem][:limite]
+        return [{
+            "ID": int(self.ids[i]),
+            "Nome": self.nomes[i],
+            "Lojas": sorted({self._loja[j] for j in self._linhas_da_pessoa[i] if linhas[j]}),
+            "Avaliações recebidas": int(recebidas[i]),
+            "Avaliações feitas": int(feitas[i]),
+        } for i in escolhidos]
+
+
+_indices: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indices_lock = threading.Lock()
+
+
+def indice_pessoas(dataset) -> IndicePessoas:
+    """Índice de pessoas do dataset (montado no primeiro uso, um por versão)"""
+    with _indices_lock:
+        indice = _indices.get(dataset)
+    if indice is not None:
+        return indice
+    with span("indice_pessoas", rows=len(dataset.data)) as s:
+        indice = IndicePessoas(dataset.data)
+        s.rows = len(indice)
+    with _indices_lock:
+        _indices[dataset] = indice
+    return indice
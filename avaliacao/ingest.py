@@ -0,0 +1,309 @@
+# avaliacao/ingest.py — Avaliações novas enviadas pelo formulário, sem esperar o TTL da planilha
+#
+# O Apps Script do formulário (ou outro webhook) manda cada resposta para
+# POST /api/avaliacoes do api_server.py, no mesmo layout A–M das abas. normalizar_envio()
+# valida e normaliza as linhas na hora (a resposta diz quais foram rejeitadas e por quê) e
+# registrar() grava as aceitas, já normalizadas, no log da planilha:
+#
+#     <AVALIACAO_INGESTAO_DIR>/<id da planilha>.jsonl
+#
+# Todo processo que serve o painel (Streamlit, api_server) acompanha o log: get_dataset
+# vê que ele cresceu e, no máximo a cada LOTE_INTERVALO segundos, junta o que chegou num
+# lote só ao snapshot vigente. O lote vira uma versão nova do dataset, então os caches
+# de agregados, ETags e exports se renovam sozinhos.
+#
+# A recarga da planilha no fim do TTL é a reconciliação: vale o que está na planilha (o
+# que o envio perdeu aparece ali); respostas recebidas pouco antes ou durante a carga que
+# ainda não estão nela são reaplicadas, e as mais antigas deixam de ser aplicadas.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .identity import canonizar, indice_pessoas
+from .normalize import NOTAS, colunas_de_data, normalize_sheet, parse_datetime_ptbr
+from .perf import incr, span
+from .sources import _normalize_sheet_id
+
+logger = logging.getLogger("avaliacao")
+
+INGESTAO_DIR = os.environ.get("AVALIACAO_INGESTAO_DIR", "ingestao")
+LOTE_INTERVALO = 2.0        # segundos mínimos entre dois lotes aplicados ao snapshot
+MARGEM_RECONCILIACAO = 120  # segundos antes da carga cujas respostas podem não estar na planilha ainda
+RETENCAO_LOG = 6 * 3600     # respostas mais antigas saem do log quando ele passa de LOG_MAX_BYTES
+LOG_MAX_BYTES = 8 * 1024 * 1024
+LINHAS_POR_ENVIO = 500
+
+LAYOUT = [chr(ord("A") + i) for i in range(13)]  # A–M
+# colunas que identificam uma resposta (reenvio do webhook, linha que já veio da planilha)
+CHAVE = ["Data", "Loja", "Setor", "Colaborador", "Avaliador", *NOTAS]
+# colunas calculadas de novo a partir de Data ao ler o log
+DERIVADAS = ["Data_dia", "Hora", "Hora_num"]
+
+
+def caminho_log(spreadsheet: str) -> str:
+    return os.path.join(INGESTAO_DIR, _normalize_sheet_id(spreadsheet) + ".jsonl")
+
+
+# ---------------------------------
+# RECEBIMENTO
+# ---------------------------------
+def normalizar_envio(aba: str, linhas: Sequence, fonte=None) -> Tuple[pd.DataFrame, List[Dict]]:
+    """(linhas normalizadas, rejeitadas) de um envio no layout A–M
+
+    `aba` é o título da aba da resposta (a loja, ou o que fontes.toml mapeia para ela) e
+    `fonte` a federation.Fonte da planilha, se houver. Cada rejeitada é
+    {"linha": posição no envio, "erro": motivo}. ValueError se o envio todo é inválido.
+    """
+    if not isinstance(aba, str) or not aba.strip():
+        raise ValueError("Informe a aba (título da aba da planilha) das respostas")
+    if not isinstance(linhas, (list, tuple)) or not linhas:
+        raise ValueError("Informe as linhas: [[A, B, ..., M], ...]")
+    if len(linhas) > LINHAS_POR_ENVIO:
+        raise ValueError(f"Máximo de {LINHAS_POR_ENVIO} linhas por envio")
+
+    erros: Dict[int, str] = {}
+    brutas = []
+    for i, linha in enumerate(linhas):
+        if (not isinstance(linha, (list, tuple)) or not linha
+                or any(isinstance(v, (list, dict)) for v in linha)):
+            erros[i] = "linha deve ser uma lista de valores (colunas A–M)"
+            linha = []
+        valores = ["" if v is None else str(v) for v in linha[:len(LAYOUT)]]
+        brutas.append(valores + [""] * (len(LAYOUT) - len(valores)))
+    df = pd.DataFrame(brutas, columns=LAYOUT)
+
+    # as mesmas conversões do normalize, de uma vez para o envio todo
+    datas = parse_datetime_ptbr(df["A"])
+    colab = df["C"].str.strip()
+    brancas = df[["D", "F", "H", "J"]].apply(lambda s: s.str.strip())
+    notas = brancas.apply(pd.to_numeric, errors="coerce")
+    nota_ruim = ((brancas != "") & (notas.isna() | (notas < 0) | (notas > 5))).any(axis=1)
+    for motivo, mascara in (("nota inválida (D, F, H ou J: de 0 a 5)", nota_ruim),
+                            ("colaborador vazio (C)", colab.str.lower().isin(["", "nan", "none"])),
+                            ("data inválida (A)", datas.isna())):
+        for i in np.flatnonzero(mascara.to_numpy()):
+            erros.setdefault(int(i), motivo)
+    rejeitadas = [{"linha": i, "erro": e} for i, e in sorted(erros.items())]
+
+    ok = df.drop(index=list(erros))
+    if ok.empty:
+        return pd.DataFrame(), rejeitadas
+    rec = normalize_sheet(aba.strip(), ok.reset_index(drop=True))
+    if fonte is not None:
+        rec = fonte.aplicar(rec)
+    return rec.reset_index(drop=True), rejeitadas
+
+
+_log_lock = threading.Lock()
+
+
+def registrar(spreadsheet: str, rec: pd.DataFrame, recebido_em: Optional[float] = None) -> int:
+    """Acrescenta as linhas normalizadas ao log da planilha; retorna quantas"""
+    if rec.empty:
+        return 0
+    t = recebido_em or time.time()
+    cols = [c for c in rec.columns if c not in DERIVADAS]
+    saida = rec[cols].assign(Data=rec["Data"].dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    registros = [{"t": t, **r} for r in saida.to_dict(orient="records")]
+    texto = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+    path = caminho_log(spreadsheet)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(texto)  # uma escrita só: quem lê o log nunca vê meio envio
+        if os.path.getsize(path) > LOG_MAX_BYTES:
+            _podar(path)
+    incr("ingestao.recebidas", len(registros))
+    return len(registros)
+
+
+def _podar(path: str) -> None:
+    """Reescreve o log sem as respostas mais velhas que RETENCAO_LOG (os leitores releem do início)"""
+    limite = time.time() - RETENCAO_LOG
+    with open(path, encoding="utf-8") as f:
+        manter = [l for l in f if l.strip() and json.loads(l)["t"] >= limite]
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(manter)
+    os.replace(tmp, path)
+
+
+# ---------------------------------
+# APLICAÇÃO AO SNAPSHOT (dataset.get_dataset)
+# ---------------------------------
+class _Leitura:
+    """Quanto do log de uma planilha já entrou no snapshot deste processo"""
+
+    def __init__(self, base: str, inode: Optional[int]):
+        self.base = base           # versão da última carga completa da planilha
+        self.inode = inode
+        self.offset = 0
+        self.aplicadas = 0
+        self.assinaturas = set()   # hashes das linhas já acrescentadas desde a carga
+        self.ultimo_lote = 0.0
+
+
+_leituras: Dict[str, _Leitura] = {}
+
+
+def _stat(spreadsheet: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(caminho_log(spreadsheet))
+    except OSError:
+        return None
+
+
+def pendente(spreadsheet: str) -> bool:
+    """True se o log tem respostas novas e já passou o intervalo do lote"""
+    st = _stat(spreadsheet)
+    if st is None:
+        return False
+    lido = _leituras.get(spreadsheet)
+    if lido is not None and (lido.inode, lido.offset) == (st.st_ino, st.st_size):
+        return False
+    return lido is None or time.time() - lido.ultimo_lote >= LOTE_INTERVALO
+
+
+def _ler_log(path: str, offset: int) -> Tuple[List[Dict], int]:
+    """Registros completos a partir de `offset` e o offset depois do último"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        bruto = f.read()
+    fim = bruto.rfind(b"\n") + 1  # uma escrita em andamento fica para o próximo lote
+    linhas = bruto[:fim].decode("utf-8").splitlines()
+    return [json.loads(l) for l in linhas if l.strip()], offset + fim
+
+
+def _assinaturas(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[[c for c in CHAVE if c in df.columns]], index=False).to_numpy()
+
+
+def _quadro(registros: List[Dict], modelo: pd.DataFrame) -> pd.DataFrame:
+    """Registros do log com as colunas e os tipos do snapshot"""
+    df = pd.DataFrame(registros).drop(columns="t")
+    df["Data"] = pd.to_datetime(df["Data"], format="%Y-%m-%dT%H:%M:%S")
+    colunas_de_data(df)
+    if not len(modelo.columns):
+        return df
+    df = df.reindex(columns=modelo.columns)
+    if "Notas_vazias" in df.columns:  # linhas gravadas antes da coluna existir
+        df["Notas_vazias"] = df["Notas_vazias"].fillna(0)
+    for col in df.columns:
+        if df[col].dtype != modelo[col].dtype:
+            df[col] = df[col].astype(modelo[col].dtype)
+    return df
+
+
+def _particoes(ds, novas: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Índices por loja do snapshot antigo mais os das linhas novas, sem reagrupar tudo"""
+    partes = dict(ds.partitions)
+    for loja, idx in novas.groupby("Loja", sort=False).indices.items():
+        idx = idx + len(ds.data)
+        partes[loja] = np.concatenate([partes[loja], idx]) if loja in partes else idx
+    return partes
+
+
+def aplicar(spreadsheet: str, ds, recarga: bool = False):
+    """Snapshot com as respostas do log que ainda não estão nele (o próprio ds se nenhuma)
+
+    Com `recarga` (ds acabou de vir da planilha) o log é relido do início e só entram as
+    respostas recebidas a partir de MARGEM_RECONCILIACAO antes da carga.
+    """
+    from .dataset import Dataset
+
+    st = _stat(spreadsheet)
+    lido = _leituras.get(spreadsheet)
+    desde = None
+    if recarga or lido is None or st is None or lido.inode != st.st_ino:
+        lido = _leituras[spreadsheet] = _Leitura(ds.version, st.st_ino if st else None)
+        desde = ds.carregado_em - MARGEM_RECONCILIACAO
+    if st is None:
+        return ds
+    lido.ultimo_lote = time.time()
+    registros, lido.offset = _ler_log(caminho_log(spreadsheet), lido.offset)
+    if desde is not None:
+        # as mais antigas já tiveram tempo de chegar à planilha: vale o que ela trouxe
+        registros = [r for r in registros if r["t"] >= desde]
+    if not registros:
+        return ds
+
+    with span("ingestao_lote", rows=len(registros)) as s:
+        # nomes como no snapshot, antes das assinaturas: a mesma resposta vinda da planilha já está canonizada
+        novas = canonizar(_quadro(registros, ds.data), indice_pessoas(ds).canonicos)
+        hashes = _assinaturas(novas)
+        # uma resposta só entra uma vez: nem reenvio do webhook, nem linha que a planilha já trouxe
+        _, primeira = np.unique(hashes, return_index=True)
+        manter = np.zeros(len(novas), dtype=bool)
+        manter[primeira] = True
+        manter &= ~np.isin(hashes, list(lido.assinaturas))
+        if len(ds.data.columns) and manter.any():
+            recentes = ds.data.loc[ds.data["Data"] >= novas["Data"].min()]
+            manter &= ~np.isin(hashes, _assinaturas(recentes))
+        novas, hashes = novas.loc[manter].reset_index(drop=True), hashes[manter]
+        s.rows = len(novas)
+        if novas.empty:
+            return ds
+        lido.assinaturas.update(hashes.tolist())
+        lido.aplicadas += len(novas)
+
+        data = pd.concat([ds.data, novas], ignore_index=True) if len(ds.data.columns) else novas
+        versao = hashlib.sha1(f"{lido.base}+{lido.aplicadas}".encode("utf-8")).hexdigest()[:12]
+        out = Dataset(versao, data, ds.avisos, ds.carregado_em)
+        out.arquivo = ds.arquivo
+        out.qualidade = ds.qualidade
+        out._partitions = _particoes(ds, novas) if len(ds.data.columns) else None
+    incr("ingestao.aplicadas", len(novas))
+    logger.info("%d avaliação(ões) recebida(s) entraram no snapshot %s", len(novas), versao)
+    return out
+
+
+# ---------------------------------
+# CLIENTES
+# ---------------------------------
+class ClienteIngestao:
+    """Envia respostas para POST /api/avaliacoes (o que o Apps Script do formulário faz)"""
+
+    def __init__(self, url: str, token: str, timeout: float = 10):
+        self.url = url.rstrip("/") + "/api/avaliacoes"
+        self.token = token
+        self.timeout = timeout
+
+    def enviar(self, aba: str, linhas: Sequence, fonte: Optional[str] = None) -> Dict:
+        """{"aceitas": n, "rejeitadas": [...]}; HTTPError se o servidor recusar o envio todo"""
+        from urllib.error import HTTPError
+        from urllib.request import Request, urlopen
+
+        corpo = {"aba": aba, "linhas": [list(l) for l in linhas]}
+        if fonte:
+            corpo["fonte"] = fonte
+        req = Request(self.url, data=json.dumps(corpo, ensure_ascii=False).encode("utf-8"), method="POST",
+                      headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"})
+        try:
+            with urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except HTTPError as e:
+            if e.code == 422:  # nenhuma linha aceita: o corpo diz por quê
+                return json.loads(e.read())
+            raise
+
+
+class ClienteLocal:
+    """Mesma interface do ClienteIngestao, sem HTTP (testes, scripts no próprio host)"""
+
+    def __init__(self, fontes=None):
+        self.fontes = fontes  # lista de federation.Fonte (padrão: fontes.toml)
+
+    def enviar(self, aba: str, linhas: Sequence, fonte: Optional[str] = None) -> Dict:
+        from .federation import escolher_fonte
+
+        f = escolher_fonte(fonte, self.fontes)
+        rec, rejeitadas = normalizar_envio(aba, linhas, f)
+        return {"aceitas": registrar(f.planilha, rec), "rejeitadas": rejeitadas}
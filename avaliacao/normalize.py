@@ -0,0 +1,124 @@
+# avaliacao/normalize.py — Normalização das abas cruas (layout A–M) no formato do dashboard
+# Colunas por posição:
+# A=Data, B=Setor, C=Colaborador, D=Velocidade, F=Atendimento, H=Qualidade, J=Ajuda, M=Avaliador
+# Notas vazias ou em texto viram 0 (como sempre foram nas médias) e ficam marcadas em
+# Notas_vazias: bit i ligado = nota i de NOTAS sem valor (distribution.py conta à parte).
+# As regras de qualidade (quality.py) decidem o que sai e vão para o relatório da carga.
+
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .identity import canonizar
+from .perf import span
+from .quality import DESCARTE, RelatorioQualidade, motivos
+from .user_registry import get_registry
+
+def get_regiao(loja: str) -> str:
+    """Retorna a região da loja ou 'Outra' se não mapeada (cadastro em usuarios.toml)"""
+    return get_registry().get_regiao(loja)
+
+# Mapeamento por letra
+NOTAS_COLS = {"Velocidade": "D", "Atendimento": "F", "Qualidade": "H", "Ajuda": "J"}
+COL_DATA, COL_SETOR, COL_NOME, COL_AVALIADOR = "A", "B", "C", "M"
+NOTAS = ["Velocidade", "Atendimento", "Qualidade", "Ajuda"]
+
+
+def normalize_colnames(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [c.encode("utf-8").decode("utf-8-sig").strip() if isinstance(c, str) else c for c in df.columns]
+    return df
+
+def get_col_by_letter(df: pd.DataFrame, letter: str) -> str:
+    idx = ord(letter.upper()) - ord("A")
+    if not (0 <= idx < len(df.columns)):
+        raise ValueError(f"Letra de coluna inválida: {letter}")
+    return df.columns[idx]
+
+def parse_datetime_ptbr(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(series, errors="coerce", dayfirst=True)
+
+def cast_notas_safe(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    vazias = np.zeros(len(df), dtype=np.int8)
+    for i, c in enumerate(cols):
+        if c not in df.columns:
+            df[c] = 0.0
+            vazias |= np.int8(1 << i)
+            continue
+        obj = df[c]
+        if isinstance(obj, pd.DataFrame):
+            obj = obj.iloc[:, 0]
+        nota = pd.to_numeric(obj, errors="coerce")
+        vazias |= nota.isna().to_numpy().astype(np.int8) << i
+        df[c] = nota.fillna(0.0)
+    df["Notas_vazias"] = vazias
+    return df
+
+def infer_loja_from_filename(name: str) -> str:
+    if not name: return "Desconhecida"
+    m = re.search(r"-\s*([^-()]+?)\s*(?:\(|-|\.|$)", name)
+    if m: return m.group(1).strip()
+    tokens = re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ]+", name)
+    return tokens[-1] if tokens else "Desconhecida"
+
+def normalize_sheet(title: str, df: pd.DataFrame, qualidade: Optional[RelatorioQualidade] = None) -> pd.DataFrame:
+    """Converte uma aba crua (layout A–M) no formato do dashboard; ValueError se as colunas não mapeiam
+
+    Com `qualidade`, registra nele as regras que cada linha violou (quality.py).
+    """
+    df = normalize_colnames(df)
+    # mapear por posição
+    colunas = {"Data": COL_DATA, "Setor": COL_SETOR, "Colaborador": COL_NOME,
+               **NOTAS_COLS, "Avaliador": COL_AVALIADOR}
+    bruto = {nome: df[get_col_by_letter(df, letra)] for nome, letra in colunas.items()}
+
+    rec = pd.DataFrame(bruto)
+    rec["Data"] = parse_datetime_ptbr(rec["Data"])
+    rec = cast_notas_safe(rec, ["Velocidade","Atendimento","Qualidade","Ajuda"])
+    rec["Colaborador"] = rec["Colaborador"].astype(str).str.strip()
+    rec["Avaliador"] = rec["Avaliador"].astype(str).str.strip()
+
+    # cada regra é uma máscara sobre a aba toda; só colaborador vazio tira a linha
+    bits = motivos(rec, bruto, NOTAS)
+    if qualidade is not None:
+        qualidade.registrar(title, bruto, bits)
+    rec = rec.loc[(bits & DESCARTE) == 0].copy()
+
+    # novas colunas de data/hora
+    colunas_de_data(rec)
+
+    rec["Loja"] = title
+    # Adicionando coluna de Região baseada na loja
+    rec["Região"] = get_regiao(title)
+    return rec
+
+def colunas_de_data(rec: pd.DataFrame) -> pd.DataFrame:
+    """Data_dia, Hora e Hora_num a partir de Data (também usado ao ler o histórico arquivado)"""
+    rec["Data_dia"] = rec["Data"].dt.date
+    rec["Hora"] = rec["Data"].dt.strftime("%H:%M")
+    rec["Hora_num"] = rec["Data"].dt.hour
+    return rec
+
+def build_dataset(sheets: List[Tuple[str, pd.DataFrame]],
+                  qualidade: Optional[RelatorioQualidade] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """Normaliza e concatena as abas; retorna (dados, avisos das abas ignoradas)
+
+    `qualidade` recebe as contagens por aba e a quarentena (ver quality.py).
+    """
+    frames: List[pd.DataFrame] = []
+    avisos: List[str] = []
+    for title, df in sheets:
+        try:
+            with span("normalizacao", aba=title) as s:
+                frames.append(normalize_sheet(title, df, qualidade))
+                s.rows = len(frames[-1])
+        except Exception as e:
+            avisos.append(f"Aba '{title}': problema ao mapear colunas — {e}")
+            if qualidade is not None:
+                qualidade.ignorar(title, len(df), str(e))
+    with span("concat") as s:
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        s.rows = len(data)
+    # "Joao Silva" e "João  Silva" na mesma linha dos resumos (identity.py)
+    return canonizar(data), avisos
@@ -0,0 +1,210 @@
+# avaliacao/perf.py — Instrumentação leve por etapa (tempo, linhas, memória)
+#
+#     with span("normalizacao", aba=title) as s:
+#         rec = normalize_sheet(title, df)
+#         s.rows = len(rec)
+#
+# Cada span vira um registro num buffer circular em memória (compartilhado pelo processo)
+# e, se habilitado, uma linha JSON no logger "avaliacao.perf". O painel "Desempenho"
+# do app lê o buffer e mostra p50/p95 por etapa. Sem dependência de Streamlit.
+#
+# Contadores simples (incr) registram chamadas e misses dos caches:
+#     incr("cache.planilha.chamadas")  # a cada uso
+#     incr("cache.planilha.misses")    # dentro da função cacheada (só roda no miss)
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+perf_logger = logging.getLogger("avaliacao.perf")
+
+BUFFER_SIZE = 5000  # spans guardados (os mais antigos saem)
+
+_buffer: Deque[Dict] = deque(maxlen=BUFFER_SIZE)
+_lock = threading.Lock()
+_counters: Counter = Counter()
+_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("perf_run_id", default=None)
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+
+def rss_kb() -> int:
+    """Memória residente atual do processo em KB (pico, fora do Linux; 0 no Windows)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except OSError:
+        try:
+            import resource  # só Unix
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Span:
+    """Registro de uma etapa; `rows` e `attrs` podem ser preenchidos dentro do bloco"""
+
+    __slots__ = ("name", "rows", "attrs")
+
+    def __init__(self, name: str, rows: Optional[int] = None, attrs: Optional[Dict] = None):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs or {}
+
+
+def new_run(label: str = "") -> str:
+    """Inicia um novo rerun/execução: os spans seguintes (nesta thread) levam este id"""
+    run_id = f"{label}{uuid.uuid4().hex[:8]}"
+    _run_id.set(run_id)
+    return run_id
+
+
+@contextmanager
+def span(name: str, rows: Optional[int] = None, **attrs):
+    """Mede a duração, as linhas e a variação de memória de um bloco"""
+    s = Span(name, rows, attrs)
+    rss0 = rss_kb()
+    t0 = time.perf_counter()
+    erro = None
+    try:
+        yield s
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        record = {
+            "ts": time.time(),
+            "run": _run_id.get(),
+            "stage": s.name,
+            "ms": round((time.perf_counter() - t0) * 1000, 3),
+            "rows": s.rows,
+            "mem_delta_kb": rss_kb() - rss0,
+        }
+        if s.attrs:
+            record["attrs"] = s.attrs
+        if erro:
+            record["error"] = erro
+        with _lock:
+            _buffer.append(record)
+        if perf_logger.isEnabledFor(logging.INFO):
+            perf_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def timed(name: Optional[str] = None):
+    """Decorador: cada chamada vira um span com o nome da função (ou `name`)"""
+    def deco(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def records(last_runs: Optional[int] = None) -> List[Dict]:
+    """Cópia dos spans do buffer; com last_runs, só os das últimas N execuções"""
+    with _lock:
+        recs = list(_buffer)
+    if last_runs:
+        runs: List[str] = []
+        for r in reversed(recs):
+            if r["run"] not in runs:
+                runs.append(r["run"])
+                if len(runs) == last_runs:
+                    break
+        keep = set(runs)
+        recs = [r for r in recs if r["run"] in keep]
+    return recs
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def stage_stats(last_runs: Optional[int] = 50) -> List[Dict]:
+    """p50/p95/máx de duração por etapa, mais linhas e memória médias"""
+    por_etapa: Dict[str, List[Dict]] = {}
+    for r in records(last_runs):
+        por_etapa.setdefault(r["stage"], []).append(r)
+    out = []
+    for stage, recs in por_etapa.items():
+        ms = sorted(r["ms"] for r in recs)
+        rows = [r["rows"] for r in recs if r["rows"] is not None]
+        out.append({
+            "etapa": stage,
+            "n": len(recs),
+            "p50_ms": round(_percentile(ms, 0.50), 2),
+            "p95_ms": round(_percentile(ms, 0.95), 2),
+            "max_ms": round(ms[-1], 2),
+            "linhas_media": round(sum(rows) / len(rows)) if rows else None,
+            "mem_delta_kb_media": round(sum(r["mem_delta_kb"] for r in recs) / len(recs)),
+        })
+    out.sort(key=lambda d: d["p95_ms"], reverse=True)
+    return out
+
+
+def incr(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def counters() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters)
+
+
+def cache_stats() -> List[Dict]:
+    """Chamadas, misses e taxa de acerto de cada cache contado com incr("cache.<nome>.*")"""
+    c = counters()
+    out = []
+    for key in sorted(c):
+        if not (key.startswith("cache.") and key.endswith(".chamadas")):
+            continue
+        nome = key[len("cache."):-len(".chamadas")]
+        chamadas = c[key]
+        misses = c.get(f"cache.{nome}.misses", 0)
+        out.append({
+            "cache": nome,
+            "chamadas": chamadas,
+            "misses": misses,
+            "taxa_acerto": round(1 - misses / chamadas, 3) if chamadas else None,
+        })
+    return out
+
+
+def reset():
+    with _lock:
+        _buffer.clear()
+        _counters.clear()
+
+
+def enable_json_logs(dest: Optional[str] = None):
+    """Envia os spans como JSON (uma linha por span) para stderr ou para o arquivo `dest`"""
+    handler = logging.FileHandler(dest, encoding="utf-8") if dest else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    perf_logger.addHandler(handler)
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+
+
+# AVALIACAO_PERF_LOG=1 (stderr) ou AVALIACAO_PERF_LOG=/caminho/perf.jsonl
+_env_log = os.environ.get("AVALIACAO_PERF_LOG")
+if _env_log and not perf_logger.handlers:
+    enable_json_logs(None if _env_log == "1" else _env_log)
@@ -0,0 +1,218 @@
+# avaliacao/quality.py — Regras de qualidade das linhas lidas, quarentena e contagens por aba
+#
+#     rel = RelatorioQualidade()
+#     data, avisos = build_dataset(sheets, rel)     # Dataset.from_sheets faz isso
+#     rel.abas          # uma linha por aba: lidas, aceitas, descartadas, com alerta, uma coluna por regra
+#     rel.quarentena    # linhas que violaram alguma regra, com os valores como vieram da planilha
+#
+# Cada regra é uma máscara sobre a aba inteira (sem laço por linha) e cada linha recebe
+# um inteiro com um bit por regra violada, como Notas_vazias (normalize.py). Só colaborador
+# vazio tira a linha do dataset, como sempre foi; as demais regras só marcam: data vazia ou
+# inválida já fica de fora de qualquer filtro de período/hora, e nota em texto continua
+# contando como 0 nas médias. Nota vazia não é regra (distribution.py mostra o "% sem nota").
+#
+# O relatório sai na mesma passada da normalização e fica no Dataset (dataset.qualidade),
+# então o painel do app só lê o que já foi contado. A quarentena guarda as primeiras
+# QUARENTENA_POR_REGRA linhas de cada regra em cada aba; as contagens são exatas.
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# código -> (descrição, a linha sai do dataset?)
+REGRAS: Dict[str, Tuple[str, bool]] = {
+    "colaborador_vazio": ("Colaborador vazio (C)", True),
+    "data_vazia": ("Data vazia (A)", False),
+    "data_invalida": ("Data que não dá para interpretar (A)", False),
+    "data_futura": ("Data no futuro (A)", False),
+    "nota_invalida": ("Nota em texto, conta como 0 (D, F, H ou J)", False),
+    "nota_fora_da_faixa": ("Nota fora de 0 a 5 (D, F, H ou J)", False),
+    "setor_vazio": ("Setor vazio (B)", False),
+    "avaliador_vazio": ("Avaliador vazio (M)", False),
+}
+BITS = {codigo: 1 << i for i, codigo in enumerate(REGRAS)}
+DESCARTE = sum(BITS[c] for c, (_, descarta) in REGRAS.items() if descarta)
+
+COLUNAS_BRUTAS = ["Data", "Setor", "Colaborador", "Velocidade", "Atendimento", "Qualidade", "Ajuda", "Avaliador"]
+COLUNAS_ABAS = ["Aba", "Situação", "Lidas", "Aceitas", "Descartadas", "Com alerta", *REGRAS, "Erro"]
+COLUNAS_QUARENTENA = ["Aba", "Linha", "Motivos", "Descartada", *COLUNAS_BRUTAS]
+QUARENTENA_POR_REGRA = 50  # linhas guardadas de cada regra em cada aba
+TOLERANCIA_FUTURO = timedelta(days=1)  # relógio do formulário adiantado não é erro
+VERSOES_GUARDADAS = 20
+
+_VAZIOS = ["", "nan", "none"]
+
+
+def _vazio(s: pd.Series) -> np.ndarray:
+    """Célula vazia, só com espaços ou "nan"/"none" (o que a normalização sempre tratou como vazio)"""
+    return (s.isna() | s.astype(str).str.strip().str.lower().isin(_VAZIOS)).to_numpy()
+
+
+def _vazio_em(s: pd.Series, linhas: np.ndarray) -> np.ndarray:
+    """_vazio() só nas posições `linhas` (as poucas que falharam na conversão)"""
+    out = np.zeros(len(s), dtype=bool)
+    if len(linhas):
+        out[linhas] = _vazio(s.iloc[linhas])
+    return out
+
+
+def motivos(rec: pd.DataFrame, bruto: Dict[str, pd.Series], notas: Sequence[str],
+            agora: Optional[datetime] = None) -> np.ndarray:
+    """Bits de REGRAS violados por linha
+
+    `rec` é a aba já convertida (Data em datetime, notas numéricas com Notas_vazias,
+    Colaborador/Avaliador sem espaços) e ainda sem nenhuma linha removida; `bruto` são as
+    colunas como vieram da aba, para separar célula vazia de valor inválido.
+    """
+    out = np.zeros(len(rec), dtype=np.int32)
+
+    def marcar(codigo: str, mascara: np.ndarray):
+        out[mascara] |= BITS[codigo]
+
+    marcar("colaborador_vazio", rec["Colaborador"].str.lower().isin(_VAZIOS).to_numpy())
+    marcar("avaliador_vazio", rec["Avaliador"].str.lower().isin(_VAZIOS).to_numpy())
+    marcar("setor_vazio", _vazio(rec["Setor"]))
+
+    datas = rec["Data"]
+    sem_data = datas.isna().to_numpy()
+    data_vazia = _vazio_em(bruto["Data"], np.flatnonzero(sem_data))
+    marcar("data_vazia", data_vazia)
+    marcar("data_invalida", sem_data & ~data_vazia)
+    limite = pd.Timestamp(agora or datetime.now()) + TOLERANCIA_FUTURO
+    marcar("data_futura", (datas > limite).to_numpy())
+
+    bits_notas = rec["Notas_vazias"].to_numpy(dtype=np.int64)
+    for i, nota in enumerate(notas):
+        falhou = (bits_notas >> i) & 1 == 1
+        # coluna que nem existe na aba já é "sem nota" para todas as linhas
+        if nota in bruto:
+            marcar("nota_invalida", falhou & ~_vazio_em(bruto[nota], np.flatnonzero(falhou)))
+        valor = rec[nota].to_numpy(dtype=float)
+        marcar("nota_fora_da_faixa", ~falhou & ((valor < 0) | (valor > 5)))
+    return out
+
+
+def codigos(bits: int) -> List[str]:
+    """Códigos das regras ligadas em `bits`"""
+    return [c for c, b in BITS.items() if bits & b]
+
+
+class RelatorioQualidade:
+    """Contagens por aba e amostra da quarentena de um dataset (dataset.qualidade)"""
+
+    def __init__(self, abas: Optional[pd.DataFrame] = None, quarentena: Optional[pd.DataFrame] = None):
+        self._abas: List[Dict] = [] if abas is None else abas.to_dict(orient="records")
+        self._amostras: List[pd.DataFrame] = [] if quarentena is None else [quarentena]
+        self._quarentena: Optional[pd.DataFrame] = None
+
+    def registrar(self, aba: str, bruto: Dict[str, pd.Series], bits: np.ndarray) -> None:
+        """Conta os motivos da aba e guarda a amostra da quarentena com os valores de `bruto` (colunas lidas)"""
+        descartadas = (bits & DESCARTE) != 0
+        alerta = (bits != 0) & ~descartadas
+        linha = {"Aba": aba, "Situação": "ok", "Lidas": len(bits), "Aceitas": int(len(bits) - descartadas.sum()),
+                 "Descartadas": int(descartadas.sum()), "Com alerta": int(alerta.sum()), "Erro": ""}
+        for codigo, b in BITS.items():
+            linha[codigo] = int(np.count_nonzero(bits & b))
+        if linha["Descartadas"] or linha["Com alerta"]:
+            linha["Situação"] = "com descartes" if linha["Descartadas"] else "com alertas"
+        self._abas.append(linha)
+
+        # as primeiras de cada regra, para uma regra frequente não esconder as outras
+        marcadas = np.unique(np.concatenate(
+            [np.flatnonzero(bits & b)[:QUARENTENA_POR_REGRA] for b in BITS.values()]))
+        if not len(marcadas):
+            return
+        amostra = pd.DataFrame({
+            "Aba": aba,
+            "Linha": marcadas + 2,  # linha 1 é o cabeçalho
+            "Motivos": [", ".join(codigos(int(b))) for b in bits[marcadas]],
+            "Descartada": descartadas[marcadas],
+            **{col: bruto[col].iloc[marcadas].fillna("").astype(str).to_numpy() if col in bruto else ""
+               for col in COLUNAS_BRUTAS},
+        })
+        self._amostras.append(amostra)
+        self._quarentena = None
+
+    def ignorar(self, aba: str, linhas: int, erro: str) -> None:
+        """Aba inteira fora do dataset (colunas que não mapeiam)"""
+        self._abas.append({"Aba": aba, "Situação": "ignorada", "Lidas": linhas, "Aceitas": 0,
+                           "Descartadas": linhas, "Com alerta": 0, **{c: 0 for c in REGRAS}, "Erro": erro})
+
+    @property
+    def abas(self) -> pd.DataFrame:
+        return pd.DataFrame(self._abas, columns=COLUNAS_ABAS)
+
+    @property
+    def quarentena(self) -> pd.DataFrame:
+        if self._quarentena is None:
+            amostras = [a for a in self._amostras if len(a)]
+            self._quarentena = (pd.concat(amostras, ignore_index=True) if amostras
+                                else pd.DataFrame(columns=COLUNAS_QUARENTENA))
+        return self._quarentena
+
+    def totais(self) -> Dict[str, int]:
+        """Lidas, aceitas, descartadas, com alerta e abas ignoradas no dataset todo"""
+        abas = self.abas
+        out = {c: int(abas[c].sum()) for c in ("Lidas", "Aceitas", "Descartadas", "Com alerta")}
+        out["Abas ignoradas"] = int((abas["Situação"] == "ignorada").sum())
+        return out
+
+    def com_fonte(self, fonte: str) -> "RelatorioQualidade":
+        """O mesmo relatório com as abas prefixadas pela fonte (como os avisos em federation.py)"""
+        abas, quarentena = self.abas, self.quarentena.copy()
+        abas["Aba"] = f"[{fonte}] " + abas["Aba"].astype(str)
+        quarentena["Aba"] = f"[{fonte}] " + quarentena["Aba"].astype(str)
+        return RelatorioQualidade(abas, quarentena)
+
+    @classmethod
+    def juntar(cls, relatorios: Sequence["RelatorioQualidade"]) -> "RelatorioQualidade":
+        out = cls()
+        for rel in relatorios:
+            out._abas.extend(rel._abas)
+            out._amostras.append(rel.quarentena)
+        return out
+
+    def to_json(self) -> Dict:
+        return {"abas": self._abas, "quarentena": self.quarentena.to_dict(orient="records")}
+
+    @classmethod
+    def from_json(cls, obj: Optional[Dict]) -> Optional["RelatorioQualidade"]:
+        if obj is None:
+            return None
+        return cls(pd.DataFrame(obj["abas"], columns=COLUNAS_ABAS),
+                   pd.DataFrame(obj["quarentena"], columns=COLUNAS_QUARENTENA))
+
+    def __repr__(self):
+        t = self.totais()
+        return f"<RelatorioQualidade {t['Lidas']} lidas, {t['Descartadas']} descartadas, {t['Com alerta']} com alerta>"
+
+
+# ---------------------------------
+# CONTAGENS POR VERSÃO
+# ---------------------------------
+# Totais das últimas versões carregadas neste processo, para ver se uma aba piorou de
+# uma carga para outra sem guardar os relatórios inteiros.
+_versoes: "OrderedDict[str, Dict]" = OrderedDict()
+_versoes_lock = threading.Lock()
+
+
+def registrar_versao(versao: str, relatorio: RelatorioQualidade) -> None:
+    linha = {"Versão": versao, "Carregada em": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+             **relatorio.totais()}
+    with _versoes_lock:
+        _versoes.pop(versao, None)
+        _versoes[versao] = linha
+        while len(_versoes) > VERSOES_GUARDADAS:
+            _versoes.popitem(last=False)
+
+
+def historico_versoes() -> pd.DataFrame:
+    """Totais por versão do dataset, da mais nova para a mais antiga"""
+    with _versoes_lock:
+        linhas = list(reversed(_versoes.values()))
+    return pd.DataFrame(linhas, columns=["Versão", "Carregada em", "Lidas", "Aceitas", "Descartadas",
+                                         "Com alerta", "Abas ignoradas"])
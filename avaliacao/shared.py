@@ -0,0 +1,216 @@
+# avaliacao/shared.py — Snapshot do dataset compartilhado entre processos do mesmo host
+#
+# Com várias réplicas do Streamlit atrás de um balanceador, cada processo buscaria e
+# normalizaria a planilha por conta própria (quota e memória multiplicadas). Com
+# AVALIACAO_SNAPSHOT_DIR definido, a carga de get_dataset passa por aqui: quem pega o
+# lock da planilha (fcntl) busca, normaliza e grava o dataset num arquivo Arrow IPC sem
+# compressão; quem chega durante a carga espera o lock e encontra a versão nova pronta.
+# Todos, inclusive quem gravou, abrem o arquivo via mmap somente leitura, então as páginas
+# ficam uma vez só no cache do sistema.
+#
+#     <dir>/<id da planilha>/atual.json                ponteiro: versão vigente, hora da carga, qualidade
+#     <dir>/<id da planilha>/snapshot-<versão>.arrow
+#     <dir>/<id da planilha>/refresh.lock
+#
+# O TTL conta da hora da carga gravada no ponteiro, então as réplicas vencem juntas e
+# passam juntas para a mesma versão; "Atualizar" numa réplica expira o ponteiro e as
+# outras percebem pela data de modificação dele. Sem fcntl (Windows) cada processo
+# continua carregando sozinho.
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .perf import incr, span
+from .sources import _normalize_sheet_id
+
+logger = logging.getLogger("avaliacao")
+
+SNAPSHOT_DIR = os.environ.get("AVALIACAO_SNAPSHOT_DIR", "")
+SNAPSHOTS_MANTIDOS = 2  # arquivos .arrow guardados por planilha (réplicas atrasadas ainda leem o anterior)
+PONTEIRO = "atual.json"
+
+# planilha -> mtime do ponteiro quando este processo leu o snapshot
+_vistos: Dict[str, Optional[int]] = {}
+
+
+if SNAPSHOT_DIR and fcntl is None:
+    logger.warning("AVALIACAO_SNAPSHOT_DIR ignorado: lock de arquivo (fcntl) indisponível nesta plataforma")
+
+
+def ativo() -> bool:
+    return bool(SNAPSHOT_DIR) and fcntl is not None
+
+
+def _pasta(spreadsheet: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, _normalize_sheet_id(spreadsheet))
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _ler_ponteiro(pasta: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(pasta, PONTEIRO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_ponteiro(pasta: str, ponteiro: Dict) -> None:
+    path = os.path.join(pasta, PONTEIRO)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ponteiro, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _fresco(ponteiro: Optional[Dict], pasta: str, ttl: float) -> bool:
+    return (ponteiro is not None and not ponteiro.get("expirado")
+            and time.time() - ponteiro["carregado_em"] < ttl
+            and os.path.exists(os.path.join(pasta, ponteiro["arquivo"])))
+
+
+@contextmanager
+def _lock(pasta: str):
+    """Lock exclusivo entre processos; some sozinho se o processo que o tem morrer"""
+    with open(os.path.join(pasta, "refresh.lock"), "a+") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def mudou(spreadsheet: str) -> bool:
+    """True se outra réplica publicou ou expirou uma versão depois da que este processo leu"""
+    return _vistos.get(spreadsheet, -1) != _mtime(os.path.join(_pasta(spreadsheet), PONTEIRO))
+
+
+def expirar(spreadsheet: str) -> None:
+    """Força a próxima carga (de qualquer réplica) a buscar a planilha de novo"""
+    pasta = _pasta(spreadsheet)
+    ponteiro = _ler_ponteiro(pasta)
+    if ponteiro is not None and not ponteiro.get("expirado"):
+        _gravar_ponteiro(pasta, {**ponteiro, "expirado": True})
+
+
+# ---------------------------------
+# HISTÓRICO ARQUIVADO NO PONTEIRO
+# ---------------------------------
+# O Dataset carrega o histórico (archive.py / federation.py) com o manifesto da hora da
+# carga; ele vai junto no ponteiro para que as outras réplicas vejam exatamente o mesmo.
+def _historico_json(arquivo) -> Optional[Dict]:
+    if arquivo is None:
+        return None
+    from .archive import Arquivo
+
+    if isinstance(arquivo, Arquivo):
+        return {"pasta": arquivo.pasta, "manifesto": arquivo.manifesto}
+    return {"partes": [{"fonte": vars(f), "pasta": a.pasta, "manifesto": a.manifesto} for f, a in arquivo.partes]}
+
+
+def _historico_de_json(obj: Optional[Dict]):
+    if obj is None:
+        return None
+    from .archive import Arquivo
+    from .federation import Fonte, HistoricoFederado
+
+    if "partes" not in obj:
+        return Arquivo(obj["pasta"], obj["manifesto"])
+    return HistoricoFederado([(Fonte(**p["fonte"]), Arquivo(p["pasta"], p["manifesto"])) for p in obj["partes"]])
+
+
+# ---------------------------------
+# CARGA
+# ---------------------------------
+def _abrir(spreadsheet: str, pasta: str, ponteiro: Dict, mtime: Optional[int]):
+    import pandas as pd
+    import pyarrow as pa
+
+    from .dataset import Dataset
+    from .quality import RelatorioQualidade, registrar_versao
+
+    with span("snapshot_mmap") as s:
+        tabela = pa.ipc.open_file(pa.memory_map(os.path.join(pasta, ponteiro["arquivo"]), "r")).read_all()
+        # colunas sem nulos ficam apontando para o mmap em vez de serem copiadas
+        data = tabela.to_pandas(split_blocks=True)
+        if "Data_dia" in data.columns:
+            # o Arrow devolve None onde o normalize deixou NaT
+            dia = data["Data_dia"].to_numpy(dtype=object, copy=True)
+            dia[pd.isna(dia)] = pd.NaT
+            data["Data_dia"] = dia
+        s.rows = len(data)
+    ds = Dataset(ponteiro["versao"], data, ponteiro.get("avisos"), ponteiro["carregado_em"])
+    ds.arquivo = _historico_de_json(ponteiro.get("historico"))
+    ds.qualidade = RelatorioQualidade.from_json(ponteiro.get("qualidade"))
+    if ds.qualidade is not None:
+        registrar_versao(ds.version, ds.qualidade)
+    _vistos[spreadsheet] = mtime
+    return ds
+
+
+def _publicar(pasta: str, ds) -> None:
+    import pyarrow as pa
+
+    nome = f"snapshot-{ds.version}.arrow"
+    path = os.path.join(pasta, nome)
+    if not os.path.exists(path):  # planilha igual à da última carga: só renova o ponteiro
+        with span("snapshot_gravacao", rows=len(ds)):
+            tabela = pa.Table.from_pandas(ds.data, preserve_index=False)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with pa.OSFile(tmp, "wb") as f:
+                with pa.ipc.new_file(f, tabela.schema) as w:
+                    w.write_table(tabela)
+            os.replace(tmp, path)
+    _gravar_ponteiro(pasta, {
+        "versao": ds.version,
+        "arquivo": nome,
+        "carregado_em": ds.carregado_em,
+        "linhas": len(ds),
+        "avisos": ds.avisos,
+        "historico": _historico_json(ds.arquivo),
+        "qualidade": ds.qualidade.to_json() if ds.qualidade is not None else None,
+        "pid": os.getpid(),
+    })
+    # quem ainda tem um arquivo antigo mapeado continua lendo: o inode só some no munmap
+    antigos = sorted((f for f in os.listdir(pasta) if f.startswith("snapshot-") and f.endswith(".arrow")
+                      and f != nome), key=lambda f: os.path.getmtime(os.path.join(pasta, f)), reverse=True)
+    for f in antigos[SNAPSHOTS_MANTIDOS - 1:]:
+        try:
+            os.remove(os.path.join(pasta, f))
+        except OSError:
+            pass
+
+
+def carregar(spreadsheet: str, loader: Callable, ttl: float):
+    """Dataset vigente do host; se vencido, um processo recarrega com `loader` e os outros esperam"""
+    pasta = _pasta(spreadsheet)
+    os.makedirs(pasta, exist_ok=True)
+    incr("cache.snapshot_host.chamadas")
+    path_ponteiro = os.path.join(pasta, PONTEIRO)
+    mtime = _mtime(path_ponteiro)
+    ponteiro = _ler_ponteiro(pasta)
+    if _fresco(ponteiro, pasta, ttl):
+        return _abrir(spreadsheet, pasta, ponteiro, mtime)
+    with _lock(pasta):
+        mtime = _mtime(path_ponteiro)
+        ponteiro = _ler_ponteiro(pasta)
+        if not _fresco(ponteiro, pasta, ttl):  # ninguém atualizou enquanto esperávamos
+            incr("cache.snapshot_host.misses")
+            _publicar(pasta, loader(spreadsheet))
+            mtime = _mtime(path_ponteiro)
+            ponteiro = _ler_ponteiro(pasta)
+        return _abrir(spreadsheet, pasta, ponteiro, mtime)
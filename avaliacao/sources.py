@@ -0,0 +1,150 @@
+# avaliacao/sources.py — Leitura da planilha do Google Sheets (credenciais, cliente, abas cruas)
+#
+# O cliente pode ser o gspread autenticado com a service account ou um substituto
+# compatível (fake_sheets.FakeClient), escolhido por set_sheets_client ou pela
+# variável AVALIACAO_SHEETS_BACKEND.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from .perf import span, timed
+
+logger = logging.getLogger("avaliacao")
+
+# Link padrão do Google Sheets
+SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/196mkyj8XPLouscoiJqmarCJ4H5N7ANnAhmH6V-uXSlw/edit?gid=2014063945#gid=2014063945"
+
+REQUIRED_GCP_FIELDS = {
+    "type","project_id","private_key_id","private_key",
+    "client_email","client_id","auth_uri","token_uri",
+    "auth_provider_x509_cert_url","client_x509_cert_url"
+}
+SECRETS_TOML_PATH = os.path.join(".streamlit", "secrets.toml")
+
+def _normalize_sheet_id(maybe_url_or_id: str) -> str:
+    s = (maybe_url_or_id or "").strip()
+    m = re.search(r"/d/([a-zA-Z0-9\-_]+)", s)
+    return m.group(1) if m else s
+
+@timed("credenciais")
+def load_sa_creds(secrets: Optional[Mapping] = None) -> dict:
+    """Carrega as credenciais da service account
+
+    Ordem: service_account.json, depois a seção [gcp_service_account] de `secrets`
+    (o app passa st.secrets) ou, sem ela, de .streamlit/secrets.toml.
+    """
+    json_path = "service_account.json"
+    try:
+        if os.path.exists(json_path):
+            logger.debug("Carregando credenciais do arquivo JSON")
+            with open(json_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.debug("Erro ao carregar arquivo JSON: %s", e)
+
+    try:
+        if secrets is None:
+            import tomllib
+            with open(SECRETS_TOML_PATH, "rb") as f:
+                secrets = tomllib.load(f)
+        creds = dict(secrets["gcp_service_account"])
+
+        # corrige chave salva com \n literal (duas barras) -> quebra real
+        pk = creds.get("private_key", "")
+        if "\\n" in pk and "\n" not in pk:
+            creds["private_key"] = pk.replace("\\n", "\n")
+
+        missing = [k for k in REQUIRED_GCP_FIELDS if k not in creds or not str(creds[k]).strip()]
+        if missing:
+            present = sorted(creds.keys())
+            raise RuntimeError(f"Credenciais incompletas. Faltando: {missing}. Presentes: {present}.")
+        return creds
+    except Exception as e:
+        logger.debug("Erro ao carregar secrets: %s", e)
+        raise RuntimeError("Não foi possível carregar credenciais nem do arquivo JSON nem do secrets.toml")
+
+# Backend do Sheets: "google" (gspread) ou "fake" (fake_sheets.py, dados sintéticos)
+SHEETS_BACKEND = os.environ.get("AVALIACAO_SHEETS_BACKEND", "google")
+FETCH_PAUSE = 0.5  # segundos entre abas, para não estourar a quota de leitura
+
+_sheets_client = None
+
+def set_sheets_client(client) -> None:
+    """Força um cliente gspread (ou compatível, ex.: fake_sheets.FakeClient); None volta ao padrão"""
+    global _sheets_client
+    _sheets_client = client
+
+def get_sheets_client(creds: Optional[dict] = None, secrets: Optional[Mapping] = None):
+    """Cliente do Sheets: o definido em set_sheets_client, o falso (AVALIACAO_SHEETS_BACKEND=fake)
+    ou o gspread autenticado com a service account"""
+    global _sheets_client
+    if _sheets_client is not None:
+        return _sheets_client
+    if SHEETS_BACKEND == "fake":
+        from .fake_sheets import client_from_env
+        _sheets_client = client_from_env()
+        logger.info("Usando backend falso do Sheets: %s", _sheets_client._spreadsheet)
+        return _sheets_client
+    import gspread
+    return gspread.service_account_from_dict(creds or load_sa_creds(secrets))
+
+@timed("sheets_abrir")
+def open_sheet_by_id(maybe_url_or_id: str, creds: Optional[dict] = None, client=None):
+    from gspread.exceptions import APIError
+
+    sid = _normalize_sheet_id(maybe_url_or_id)
+    gc = client or get_sheets_client(creds)
+    try:
+        sh = gc.open_by_key(sid)
+        logger.debug("Planilha aberta: %s", sh.title)
+        return sh
+    except APIError as e:
+        msg = str(e)
+        if "404" in msg:
+            raise RuntimeError("Planilha não encontrada (404). Verifique ID (trecho entre /d/ e /edit) e se a planilha foi compartilhada com a service account (Leitor).")
+        if "403" in msg:
+            raise RuntimeError("Sem permissão (403). Compartilhe a planilha com a service account como Leitor.")
+        raise
+
+def fetch_sheets(spreadsheet_id: str, creds: Optional[dict] = None,
+                 client=None) -> Tuple[str, List[Tuple[str, pd.DataFrame]]]:
+    """Lê todas as abas e retorna (versão do dataset, [(aba, df)])
+
+    A versão é um hash do conteúdo lido; muda só quando a planilha muda e serve
+    de chave para os caches derivados (exportações etc.).
+    """
+    gc = client or get_sheets_client(creds)
+    sh = open_sheet_by_id(spreadsheet_id, client=gc)
+    # o cliente falso declara pausa 0 (ele mesmo simula latência e 429)
+    pausa = getattr(gc, "pausa_entre_abas", FETCH_PAUSE)
+    ws_list = sh.worksheets()
+    logger.debug("%s: %d aba(s) detectadas", sh.title, len(ws_list))
+    dfs: List[Tuple[str, pd.DataFrame]] = []
+    digest = hashlib.sha1()
+
+    for i, ws in enumerate(ws_list):
+        # Pequena pausa entre requisições para evitar quota
+        if i > 0 and pausa:
+            time.sleep(pausa)
+
+        with span("sheets_fetch", aba=ws.title) as s:
+            values = ws.get_all_values()
+            s.rows = len(values)
+        if not values:
+            continue
+        digest.update(ws.title.encode("utf-8"))
+        for row in values:
+            digest.update("\x1f".join(row).encode("utf-8"))
+        if len(values) >= 2:
+            df = pd.DataFrame(values[1:], columns=values[0])
+        else:
+            df = pd.DataFrame(values)
+        dfs.append((ws.title, df))
+    return digest.hexdigest()[:12], dfs
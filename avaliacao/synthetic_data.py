@@ -0,0 +1,174 @@
+"""
+Gerador de avaliações sintéticas no mesmo layout A–M da planilha do formulário.
+
+Cada loja vira uma aba (lista de linhas de strings, como get_all_values() devolve),
+com cabeçalho na primeira linha. Uma fração configurável das linhas recebe valores
+"sujos" iguais aos que aparecem na planilha real: nota vazia ou em texto, data
+inválida, colaborador vazio e nomes com acento/caixa/espaços diferentes.
+
+Usado pelo backend falso do Google Sheets (fake_sheets.py) e pelos benchmarks.
+
+    python -m avaliacao.synthetic_data --dias 30 --linhas-por-dia 200 --saida /tmp/sinteticos
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# A..M — só A, B, C, D, F, H, J e M são lidas pelo app
+CABECALHO = [
+    "Carimbo de data/hora", "Setor", "Colaborador",
+    "Velocidade", "Comentário velocidade",
+    "Atendimento", "Comentário atendimento",
+    "Qualidade", "Comentário qualidade",
+    "Ajuda", "Comentário ajuda",
+    "Observações", "Avaliador",
+]
+
+LOJAS_PADRAO = [
+    "Carioca", "Santa Cruz", "Mesquita", "Nilópolis", "Madureira", "Bonsucesso",
+    "Taboão", "São Bernardo", "Santo André", "Mauá", "MDC São Mateus", "CDM São Mateus",
+]
+SETORES_PADRAO = ["Caixa", "Açougue", "Padaria", "Hortifruti", "Frios", "Reposição", "Depósito", "Atendimento"]
+
+_NOMES = ["João", "Maria", "José", "Ana", "Antônio", "Francisca", "Carlos", "Luíza", "Paulo", "Márcia",
+          "Pedro", "Fernanda", "Lucas", "Juliana", "Luiz", "Patrícia", "Marcos", "Aline", "Gabriel", "Cláudia",
+          "Rafael", "Sônia", "Daniel", "Vitória", "Thiago", "Letícia", "André", "Beatriz", "Felipe", "Inês"]
+_SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima",
+               "Gomes", "Conceição", "Ribeiro", "Araújo", "Carvalho", "Simões", "Brandão", "Magalhães", "Estêvão"]
+
+_NOTAS_SUJAS = ["", "", "ótimo", "N/A", "5.0", " 4 "]
+_DATAS_SUJAS = ["", "ontem", "31/02/2025 10:00:00", "2025-13-01"]
+
+
+def _nomes_unicos(rng: np.random.Generator, n: int) -> List[str]:
+    """n nomes distintos "Nome Sobrenome" (com sufixo numérico se faltar combinação)"""
+    nomes: List[str] = []
+    vistos = set()
+    while len(nomes) < n:
+        nome = f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)}"
+        if nome in vistos:
+            nome = f"{nome} {len(nomes) + 1}"
+        if nome not in vistos:
+            vistos.add(nome)
+            nomes.append(nome)
+    return nomes
+
+
+def _variante_suja(nome: str, rng: np.random.Generator) -> str:
+    """Mesmo nome digitado de outro jeito (caixa, espaços, sem acento)"""
+    import unicodedata
+    escolha = rng.integers(0, 4)
+    if escolha == 0:
+        return nome.lower()
+    if escolha == 1:
+        return "  " + nome.replace(" ", "  ") + " "
+    if escolha == 2:
+        return unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii")
+    return nome.upper()
+
+
+def gerar_aba(loja: str, setores: List[str], colaboradores: int, avaliadores: int, dias: int,
+              linhas_por_dia: int, taxa_sujeira: float, inicio: datetime,
+              rng: np.random.Generator) -> List[List[str]]:
+    """Linhas (com cabeçalho) de uma loja, em ordem cronológica como o formulário grava"""
+    n = dias * linhas_por_dia
+    nomes = np.array(_nomes_unicos(rng, colaboradores), dtype=object)
+    setor_de = np.array([setores[i % len(setores)] for i in range(colaboradores)], dtype=object)
+    avals = np.array(_nomes_unicos(rng, avaliadores), dtype=object)
+
+    # horário comercial (7h–22h), ordenado dentro do período
+    seg = np.sort(rng.integers(0, dias, n) * 86400 + rng.integers(7 * 3600, 22 * 3600, n))
+    datas = (pd.Timestamp(inicio) + pd.to_timedelta(seg, unit="s")).strftime("%d/%m/%Y %H:%M:%S")
+    datas = np.asarray(datas, dtype=object)
+    idx_colab = rng.integers(0, colaboradores, n)
+    colab = nomes[idx_colab]
+    setor = setor_de[idx_colab]
+    avaliador = avals[rng.integers(0, avaliadores, n)]
+    # notas concentradas em 3–5, como no formulário real
+    notas = rng.choice(np.array(["1", "2", "3", "4", "5"], dtype=object), size=(n, 4),
+                       p=[0.03, 0.07, 0.2, 0.35, 0.35])
+
+    # sujeira: cada linha suja recebe um dos 4 tipos de problema
+    sujo = np.flatnonzero(rng.random(n) < taxa_sujeira)
+    tipo = rng.integers(0, 4, len(sujo))
+    i_nota = sujo[tipo == 0]          # nota vazia / em texto
+    notas[i_nota, rng.integers(0, 4, len(i_nota))] = rng.choice(np.array(_NOTAS_SUJAS, dtype=object), len(i_nota))
+    i_data = sujo[tipo == 1]          # data inválida
+    datas[i_data] = rng.choice(np.array(_DATAS_SUJAS, dtype=object), len(i_data))
+    i_vazio = sujo[tipo == 2]         # colaborador vazio
+    colab[i_vazio] = rng.choice(np.array(["", " ", "nan"], dtype=object), len(i_vazio))
+    for i in sujo[tipo == 3]:         # nome digitado diferente
+        colab[i] = _variante_suja(colab[i], rng)
+
+    vazio = [""] * n
+    colunas = [datas, setor, colab, notas[:, 0], vazio, notas[:, 1], vazio,
+               notas[:, 2], vazio, notas[:, 3], vazio, vazio, avaliador]
+    return [list(CABECALHO)] + [list(row) for row in zip(*colunas)]
+
+
+def gerar_planilha(lojas: Optional[List[str]] = None, setores: Optional[List[str]] = None,
+                   colaboradores: int = 40, avaliadores: int = 6, dias: int = 30,
+                   linhas_por_dia: int = 50, taxa_sujeira: float = 0.02,
+                   inicio: Optional[datetime] = None, seed: int = 0) -> Dict[str, List[List[str]]]:
+    """{aba (loja): linhas} com `dias * linhas_por_dia` avaliações por loja
+
+    colaboradores/avaliadores são por loja; taxa_sujeira é a fração de linhas com
+    algum valor inválido. Mesma seed -> mesma planilha.
+    """
+    rng = np.random.default_rng(seed)
+    lojas = lojas or LOJAS_PADRAO
+    setores = setores or SETORES_PADRAO
+    if inicio is None:
+        hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        inicio = hoje - timedelta(days=dias - 1)
+    return {
+        loja: gerar_aba(loja, setores, colaboradores, avaliadores, dias, linhas_por_dia,
+                        taxa_sujeira, inicio, rng)
+        for loja in lojas
+    }
+
+
+def nomes_lojas(n: int) -> List[str]:
+    """`n` nomes de loja: LOJAS_PADRAO e, além delas, as mesmas com sufixo ("Carioca 2", ...)"""
+    lojas = (LOJAS_PADRAO * (n // len(LOJAS_PADRAO) + 1))[:n]
+    return [f"{l} {i // len(LOJAS_PADRAO) + 1}" if i >= len(LOJAS_PADRAO) else l
+            for i, l in enumerate(lojas)]
+
+
+def gerar_planilha_por_total(linhas: int, n_lojas: int = 12, dias: int = 90, **kwargs) -> Dict[str, List[List[str]]]:
+    """Atalho para benchmarks: ~`linhas` avaliações no total, distribuídas entre as lojas"""
+    lojas = nomes_lojas(n_lojas)
+    linhas_por_dia = max(1, round(linhas / (n_lojas * dias)))
+    return gerar_planilha(lojas=lojas, dias=dias, linhas_por_dia=linhas_por_dia, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+    import csv
+    import os
+
+    parser = argparse.ArgumentParser(description="Gera avaliações sintéticas (uma aba/CSV por loja)")
+    parser.add_argument("--saida", required=True, help="Pasta para os CSVs (um por loja)")
+    parser.add_argument("--lojas", type=int, default=len(LOJAS_PADRAO),
+                        help=f"Número de lojas (além de {len(LOJAS_PADRAO)}, nomes repetidos com sufixo)")
+    parser.add_argument("--colaboradores", type=int, default=40)
+    parser.add_argument("--avaliadores", type=int, default=6)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--linhas-por-dia", type=int, default=50)
+    parser.add_argument("--sujeira", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.lojas < 1:
+        parser.error("--lojas deve ser pelo menos 1")
+
+    abas = gerar_planilha(lojas=nomes_lojas(args.lojas), colaboradores=args.colaboradores,
+                          avaliadores=args.avaliadores, dias=args.dias,
+                          linhas_por_dia=args.linhas_por_dia, taxa_sujeira=args.sujeira, seed=args.seed)
+    os.makedirs(args.saida, exist_ok=True)
+    for loja, linhas in abas.items():
+        with open(os.path.join(args.saida, f"{loja}.csv"), "w", newline="", encoding="utf-8-sig") as f:
+            csv.writer(f).writerows(linhas)
+        print(f"{loja}: {len(linhas) - 1} linhas")
@@ -0,0 +1,227 @@
+# avaliacao/trends.py — Tendência das notas por colaborador, setor e loja (séries e médias móveis)
+#
+#     serie_tendencia(dataset, lojas_do_usuario, filtros, "Colaborador", freq="W")  # pessoa x semana
+#     maiores_variacoes(dataset, lojas_do_usuario, filtros, "Colaborador")            # quem mais subiu / caiu
+#
+# Um cubo diário (região, loja, setor, colaborador, dia -> somas das notas e avaliações)
+# é montado uma vez por dataset, ordenado pelas chaves e pelo dia. As médias móveis de 7 e
+# 28 dias corridos saem de somas acumuladas nesse cubo: para cada linha, searchsorted acha
+# o início da janela dentro do mesmo grupo, e a soma da janela é o acumulado no dia menos o
+# acumulado antes do início, sem loop por colaborador. As médias são ponderadas pelas
+# avaliações (a média da janela, não a média das médias diárias).
+#
+# O filtro de hora não se aplica (o cubo é por dia). Séries e variações ficam em cache por
+# dataset e consulta, como as bases do DuckDB (engines.py).
+
+import threading
+import weakref
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .analytics import NOTAS_RESUMO, chave_filtro
+from .archive import com_historico
+from .dataset import Dataset
+from .perf import incr, span
+
+# Nível -> chaves de agrupamento (as mesmas colunas dos resumos por pessoa, setor e loja)
+NIVEIS_TENDENCIA = {
+    "Colaborador": ["Colaborador", "Região", "Loja", "Setor"],
+    "Setor": ["Setor", "Região", "Loja"],
+    "Loja": ["Região", "Loja"],
+}
+CHAVES_CUBO = ["Região", "Loja", "Setor", "Colaborador"]
+JANELAS = (7, 28)
+MIN_AVALIACOES = 5         # por janela, para entrar nas maiores variações
+TENDENCIAS_POR_DATASET = 32
+
+_cubos: "weakref.WeakKeyDictionary[Dataset, pd.DataFrame]" = weakref.WeakKeyDictionary()
+_respostas: "weakref.WeakKeyDictionary[Dataset, Dict[tuple, pd.DataFrame]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def cubo_diario(dataset: Dataset) -> pd.DataFrame:
+    """Somas das notas e avaliações por região/loja/setor/colaborador/dia, ordenado por essas chaves"""
+    with _lock:
+        cubo = _cubos.get(dataset)
+    if cubo is not None:
+        return cubo
+    data = dataset.data
+    with span("tendencia_cubo", rows=len(data)) as s:
+        if data.empty:
+            cubo = pd.DataFrame(columns=[*CHAVES_CUBO, "Dia", *NOTAS_RESUMO, "Avaliações"])
+        else:
+            base = data.loc[data["Data"].notna(), [*CHAVES_CUBO, *NOTAS_RESUMO]]
+            base = base.assign(Dia=data["Data"].dt.normalize(), Avaliações=1)
+            cubo = base.groupby([*CHAVES_CUBO, "Dia"], sort=True, dropna=False).sum().reset_index()
+        s.rows = len(cubo)
+    with _lock:
+        _cubos[dataset] = cubo
+    return cubo
+
+
+def _escopo(cubo: pd.DataFrame, stores: Optional[Sequence[str]], filtros) -> pd.DataFrame:
+    """Linhas do cubo dentro das lojas do usuário e dos filtros de região, lojas e setores"""
+    _, _, regiao, lojas, setores = tuple(filtros)[:5]
+    mask = np.ones(len(cubo), dtype=bool)
+    if stores is not None:
+        mask &= cubo["Loja"].isin(list(stores)).to_numpy()
+    if regiao != "Todos":
+        mask &= (cubo["Região"] == regiao).to_numpy()
+    if lojas:
+        mask &= cubo["Loja"].isin(lojas).to_numpy()
+    if setores:
+        mask &= cubo["Setor"].isin(setores).to_numpy()
+    return cubo.loc[mask]
+
+
+def _por_nivel(cubo: pd.DataFrame, chaves: List[str]) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]:
+    """(cubo somado por chaves + dia, grupo, dia em inteiros, média geral somada) ordenado por grupo e dia"""
+    por = cubo.groupby([*chaves, "Dia"], sort=True, dropna=False)[[*NOTAS_RESUMO, "Avaliações"]].sum().reset_index()
+    grupo = por.groupby(chaves, sort=True, dropna=False).ngroup().to_numpy()
+    dias = por["Dia"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    # média geral de uma linha = média das quatro notas, então soma = soma das quatro / 4
+    soma = por[NOTAS_RESUMO].to_numpy(dtype=float).sum(axis=1) / len(NOTAS_RESUMO)
+    return por, grupo, dias, soma
+
+
+def _chave(grupo: np.ndarray, dias: np.ndarray, folga: int, *extra: int) -> Tuple[np.ndarray, int, int]:
+    """(chave ordenada grupo*K + dia, K, dia da posição 0) com folga para as janelas antes e depois
+
+    `extra`: outros dias que vão ser procurados na chave (ex.: o fim do período).
+    """
+    valores = ([int(dias.min()), int(dias.max())] if len(dias) else [0]) + [int(d) for d in extra]
+    lo, hi = min(valores), max(valores)
+    k = hi - lo + 2 * folga + 2
+    base = lo - folga
+    return grupo.astype(np.int64) * k + (dias - base), k, base
+
+
+def _somas_janela(chave: np.ndarray, acumulados: List[np.ndarray], ate: np.ndarray, janela: int) -> List[np.ndarray]:
+    """Somas de cada acumulado em (ate − janela, ate] do mesmo grupo (ate já na escala da chave)"""
+    fim = np.searchsorted(chave, ate, side="right")
+    inicio = np.searchsorted(chave, ate - janela, side="right")
+    return [cs[fim] - cs[inicio] for cs in acumulados]
+
+
+def _medias_moveis(por: pd.DataFrame, grupo: np.ndarray, dias: np.ndarray, soma: np.ndarray) -> pd.DataFrame:
+    chave, _, _ = _chave(grupo, dias, max(JANELAS))
+    n = por["Avaliações"].to_numpy(dtype=float)
+    acumulados = [np.concatenate([[0.0], np.cumsum(soma)]), np.concatenate([[0.0], np.cumsum(n)])]
+    out = por.assign(Média=soma / n)
+    for janela in JANELAS:
+        s, c = _somas_janela(chave, acumulados, chave, janela)
+        out[f"Média {janela}d"] = s / c
+    return out
+
+
+def _em_cache(dataset: Dataset, chave: tuple, calcular):
+    incr("cache.tendencias.chamadas")
+    with _lock:
+        por_dataset = _respostas.setdefault(dataset, {})
+        if chave in por_dataset:
+            return por_dataset[chave]
+    incr("cache.tendencias.misses")
+    out = calcular()
+    with _lock:
+        por_dataset[chave] = out
+        while len(por_dataset) > TENDENCIAS_POR_DATASET:
+            por_dataset.pop(next(iter(por_dataset)))
+    return out
+
+
+def _com_janela(dataset: Dataset, filtros) -> Dataset:
+    """Dataset com o histórico que o período e as janelas anteriores a ele pedem"""
+    d_ini, d_fim = tuple(filtros)[:2]
+    if d_ini is None:
+        return com_historico(dataset)
+    return com_historico(dataset, d_ini - timedelta(days=2 * max(JANELAS)), d_fim or d_ini)
+
+
+def _chave_consulta(tipo: str, stores, filtros, *extra) -> tuple:
+    return (tipo, None if stores is None else tuple(sorted(stores)), chave_filtro(*filtros), *extra)
+
+
+def serie_tendencia(dataset: Dataset, stores: Optional[Sequence[str]], filtros, nivel: str = "Colaborador",
+                    freq: str = "D") -> pd.DataFrame:
+    """Série de cada grupo do nível no período: avaliações, média e médias móveis de 7 e 28 dias
+
+    `freq` "D" (uma linha por dia com avaliação) ou "W" (por semana, começando na segunda;
+    as médias móveis são as do último dia da semana). As janelas olham para trás do início
+    do período, então a primeira semana já vem com a média de 28 dias completa.
+    """
+    if nivel not in NIVEIS_TENDENCIA:
+        raise ValueError(f"Nível desconhecido: {nivel!r} (use {', '.join(NIVEIS_TENDENCIA)})")
+    if freq not in ("D", "W"):
+        raise ValueError("freq deve ser 'D' ou 'W'")
+    ds = _com_janela(dataset, filtros)
+    return _em_cache(ds, _chave_consulta("serie", stores, filtros, nivel, freq),
+                     lambda: _serie(ds, stores, filtros, NIVEIS_TENDENCIA[nivel], freq))
+
+
+def _serie(ds: Dataset, stores, filtros, chaves: List[str], freq: str) -> pd.DataFrame:
+    with span("tendencia_serie") as s:
+        por, grupo, dias, soma = _por_nivel(_escopo(cubo_diario(ds), stores, filtros), chaves)
+        out = _medias_moveis(por, grupo, dias, soma)
+        d_ini, d_fim = tuple(filtros)[:2]
+        if d_ini is not None:
+            fim = d_fim or d_ini
+            out = out.loc[out["Dia"].between(pd.Timestamp(d_ini), pd.Timestamp(fim))]
+        if freq == "W":
+            out = out.assign(Semana=out["Dia"] - pd.to_timedelta(out["Dia"].dt.weekday, unit="D"),
+                             _soma=soma[out.index])
+            moveis = [f"Média {j}d" for j in JANELAS]
+            semanas = out.groupby([*chaves, "Semana"], sort=True)
+            out = semanas[["_soma", "Avaliações"]].sum().join(semanas[moveis].last()).reset_index()
+            out["Média"] = out.pop("_soma") / out["Avaliações"]
+            out = out.rename(columns={"Semana": "Dia"})
+        out = out[[*chaves, "Dia", "Avaliações", "Média", *(f"Média {j}d" for j in JANELAS)]]
+        for col in ["Média", *(f"Média {j}d" for j in JANELAS)]:
+            out[col] = out[col].round(2)
+        out["Avaliações"] = out["Avaliações"].astype(int)
+        s.rows = len(out)
+    return out.reset_index(drop=True)
+
+
+def maiores_variacoes(dataset: Dataset, stores: Optional[Sequence[str]], filtros, nivel: str = "Colaborador",
+                      janela: int = 28, minimo: int = MIN_AVALIACOES) -> pd.DataFrame:
+    """Média nos últimos `janela` dias até o fim do período contra os `janela` dias antes disso
+
+    Uma linha por grupo do nível com pelo menos `minimo` avaliações nas duas janelas,
+    da maior subida para a maior queda (coluna Variação).
+    """
+    if nivel not in NIVEIS_TENDENCIA:
+        raise ValueError(f"Nível desconhecido: {nivel!r} (use {', '.join(NIVEIS_TENDENCIA)})")
+    ds = _com_janela(dataset, filtros)
+    return _em_cache(ds, _chave_consulta("variacoes", stores, filtros, nivel, janela, minimo),
+                     lambda: _variacoes(ds, stores, filtros, NIVEIS_TENDENCIA[nivel], janela, minimo))
+
+
+def _variacoes(ds: Dataset, stores, filtros, chaves: List[str], janela: int, minimo: int) -> pd.DataFrame:
+    with span("tendencia_variacoes") as s:
+        por, grupo, dias, soma = _por_nivel(_escopo(cubo_diario(ds), stores, filtros), chaves)
+        colunas = [*chaves, "Média anterior", "Média atual", "Variação", "Avaliações anteriores", "Avaliações atuais"]
+        if por.empty:
+            return pd.DataFrame(columns=colunas)
+        d_fim = tuple(filtros)[1] or tuple(filtros)[0]
+        fim = (np.datetime64(d_fim, "D").astype(np.int64) if isinstance(d_fim, date) else int(dias.max()))
+        chave, k, base = _chave(grupo, dias, 2 * janela, fim)
+        n = por["Avaliações"].to_numpy(dtype=float)
+        acumulados = [np.concatenate([[0.0], np.cumsum(soma)]), np.concatenate([[0.0], np.cumsum(n)])]
+        primeiros = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+        ate = grupo[primeiros].astype(np.int64) * k + (fim - base)
+        s_atual, n_atual = _somas_janela(chave, acumulados, ate, janela)
+        s_ant, n_ant = _somas_janela(chave, acumulados, ate - janela, janela)
+        out = por.iloc[primeiros][chaves].reset_index(drop=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["Média anterior"] = (s_ant / n_ant).round(2)
+            out["Média atual"] = (s_atual / n_atual).round(2)
+        out["Variação"] = (out["Média atual"] - out["Média anterior"]).round(2)
+        out["Avaliações anteriores"] = n_ant.astype(int)
+        out["Avaliações atuais"] = n_atual.astype(int)
+        out = out.loc[(n_ant >= minimo) & (n_atual >= minimo)]
+        out = out.sort_values(["Variação", *chaves], ascending=[False, *[True] * len(chaves)])
+        s.rows = len(out)
+    return out[colunas].reset_index(drop=True)
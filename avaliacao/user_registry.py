@@ -0,0 +1,211 @@
+# avaliacao/user_registry.py — Cadastro de lojas/usuários carregado de arquivo (sem Streamlit)
+#
+# O arquivo (usuarios.toml por padrão; também aceita .json) é lido uma vez e
+# recarregado quando a data de modificação muda. Na carga são montados os índices
+# usuário -> conjunto de lojas, loja -> região e região -> lojas, para que as
+# checagens de acesso sejam consultas em dicionário.
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional
+
+logger = logging.getLogger("avaliacao")
+
+# usuarios.toml fica na raiz do projeto (ao lado de colab.py)
+REGISTRY_PATH = os.environ.get(
+    "AVALIACAO_USUARIOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "usuarios.toml"),
+)
+RELOAD_CHECK_INTERVAL = 2.0  # segundos entre checagens de mtime
+
+ROLES = {"admin", "store"}
+
+
+class UserRegistry:
+    """Usuários e lojas de um arquivo de cadastro, com índices pré-calculados"""
+
+    def __init__(self, lojas: Dict[str, str], usuarios: Dict[str, Dict], mtime: float = 0.0):
+        self.mtime = mtime
+        # loja -> região
+        self.store_regions: Dict[str, str] = dict(lojas)
+        # região -> lojas
+        self.region_stores: Dict[str, FrozenSet[str]] = {}
+        for loja, regiao in self.store_regions.items():
+            self.region_stores[regiao] = self.region_stores.get(regiao, frozenset()) | {loja}
+
+        self.users: Dict[str, Dict] = {}
+        # usuário -> lojas permitidas (None = todas)
+        self.user_stores: Dict[str, Optional[FrozenSet[str]]] = {}
+        for username, u in usuarios.items():
+            self.users[username] = self._build_user(username, u)
+            self.user_stores[username] = self.users[username]["stores"]
+
+    def _build_user(self, username: str, u: Dict) -> Dict:
+        if not u.get("password_hash"):
+            raise ValueError(f"Usuário '{username}': password_hash ausente")
+        role = u.get("role", "store")
+        if role not in ROLES:
+            raise ValueError(f"Usuário '{username}': role inválido '{role}'")
+
+        stores: Optional[FrozenSet[str]] = None
+        if role != "admin":
+            lojas = set(u.get("lojas", []))
+            for regiao in u.get("regioes", []):
+                if regiao not in self.region_stores:
+                    raise ValueError(f"Usuário '{username}': região desconhecida '{regiao}'")
+                lojas |= self.region_stores[regiao]
+            if not lojas:
+                raise ValueError(f"Usuário '{username}': informe lojas e/ou regioes")
+            desconhecidas = lojas - set(self.store_regions)
+            if desconhecidas:
+                raise ValueError(f"Usuário '{username}': loja(s) fora de [lojas]: {sorted(desconhecidas)}")
+            stores = frozenset(lojas)
+
+        return {
+            "username": username,
+            "password_hash": u["password_hash"],
+            "role": role,
+            "name": u.get("name", username),
+            # texto exibido na interface ("Carioca", "Carioca, Mesquita", "all_stores")
+            "access_level": "all_stores" if stores is None else ", ".join(sorted(stores)),
+            "stores": stores,
+        }
+
+    def get(self, username: str) -> Optional[Dict]:
+        return self.users.get(username)
+
+    def stores_for(self, user_data: Dict) -> Optional[FrozenSet[str]]:
+        """Lojas do usuário (None = todas) pelo cadastro atual, não pela cópia guardada no login
+
+        Assim uma mudança no arquivo (loja removida, região com loja nova, usuário apagado)
+        vale para as sessões já abertas. Usuário que saiu do cadastro não vê nenhuma loja.
+        """
+        username = user_data["username"]
+        if username not in self.users:
+            return frozenset()
+        return self.user_stores[username]
+
+    def get_regiao(self, loja: str) -> str:
+        return self.store_regions.get(loja, "Outra")
+
+
+def load_registry(path: str = REGISTRY_PATH) -> UserRegistry:
+    """Lê o arquivo de cadastro (TOML ou JSON)"""
+    mtime = os.path.getmtime(path)
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    else:
+        import tomllib
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    return UserRegistry(raw.get("lojas", {}), raw.get("usuarios", {}), mtime)
+
+
+_registry: Optional[UserRegistry] = None
+_registry_path: Optional[str] = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def get_registry(path: Optional[str] = None) -> UserRegistry:
+    """Cadastro atual; recarrega se o arquivo mudou (checa o mtime no máximo a cada 2s)
+
+    Se o arquivo novo tiver erro, mantém o cadastro anterior e registra um aviso.
+    """
+    global _registry, _registry_path, _last_check
+    path = path or REGISTRY_PATH
+    agora = time.monotonic()
+    if _registry is not None and _registry_path == path and agora - _last_check < RELOAD_CHECK_INTERVAL:
+        return _registry
+    with _lock:
+        _last_check = agora
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            if _registry is None:
+                raise
+            return _registry
+        if _registry is None or _registry_path != path or mtime != _registry.mtime:
+            try:
+                _registry = load_registry(path)
+                _registry_path = path
+                logger.info("Cadastro de usuários carregado: %s (%d usuários, %d lojas)",
+                            path, len(_registry.users), len(_registry.store_regions))
+            except Exception as e:
+                if _registry is None or _registry_path != path:
+                    raise
+                logger.warning("Erro ao recarregar %s, mantendo cadastro anterior: %s", path, e)
+        return _registry
+
+
+# ---------------------------------
+# SESSÕES ENCERRADAS
+# ---------------------------------
+# Usuário -> instante (epoch) antes do qual os tokens de sessão dele não valem mais. O
+# logout grava aqui, então um token copiado deixa de valer antes do vencimento, em
+# todos os processos (app e api_server.py). Vale para todos os tokens do usuário.
+REVOGACOES_PATH = os.environ.get(
+    "AVALIACAO_REVOGACOES", os.path.join(os.path.dirname(REGISTRY_PATH), "sessoes_revogadas.json"))
+
+_revogacoes: Dict[str, float] = {}
+_revogacoes_mtime: Optional[float] = None
+_revogacoes_check = 0.0
+_revogacoes_lock = threading.Lock()
+
+
+def _ler_revogacoes(path: str) -> Dict[str, float]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {str(u): float(t) for u, t in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning("Erro ao ler %s, mantendo revogações anteriores: %s", path, e)
+        return dict(_revogacoes)
+
+
+def tokens_validos_apos(username: str) -> float:
+    """Instante (epoch) a partir do qual os tokens do usuário valem; 0 = todos
+
+    Relê o arquivo se a data de modificação mudou (checa no máximo a cada 2s).
+    """
+    global _revogacoes, _revogacoes_mtime, _revogacoes_check
+    agora = time.monotonic()
+    if agora - _revogacoes_check >= RELOAD_CHECK_INTERVAL:
+        with _revogacoes_lock:
+            _revogacoes_check = agora
+            try:
+                mtime = os.path.getmtime(REVOGACOES_PATH)
+            except OSError:
+                mtime = None
+            if mtime != _revogacoes_mtime:
+                _revogacoes = _ler_revogacoes(REVOGACOES_PATH) if mtime is not None else {}
+                _revogacoes_mtime = mtime
+    return _revogacoes.get(username, 0.0)
+
+
+def revogar_tokens(username: str, quando: Optional[float] = None) -> None:
+    """Invalida os tokens já emitidos para o usuário (logout)"""
+    global _revogacoes, _revogacoes_mtime
+    with _revogacoes_lock:
+        atuais = _ler_revogacoes(REVOGACOES_PATH)
+        atuais[username] = quando or time.time()
+        tmp = f"{REVOGACOES_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(atuais, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, REVOGACOES_PATH)
+        _revogacoes, _revogacoes_mtime = atuais, os.path.getmtime(REVOGACOES_PATH)
+
+
+def store_regions() -> Dict[str, str]:
+    """Mapa loja -> região do cadastro atual"""
+    return get_registry().store_regions
+
+
+def lojas_por_regiao() -> Dict[str, List[str]]:
+    """Região -> lojas (ordenadas), para textos de ajuda"""
+    return {r: sorted(lojas) for r, lojas in sorted(get_registry().region_stores.items())}
@@ -0,0 +1,87 @@
+# avaliacao/warmup.py — Pré-aquecimento do processo em segundo plano
+#
+# A página de login não importa pandas nem o pacote de análises. Na primeira página
+# servida pelo processo, iniciar() dispara uma thread que importa essa pilha e carrega o
+# dataset no snapshot compartilhado (dataset.get_dataset). Quem faz login depois encontra
+# tudo pronto; quem chega durante a carga espera por ela em vez de começar outra.
+#
+# AVALIACAO_PREWARM=0 desliga (a carga volta a acontecer no primeiro login).
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .perf import new_run, span
+
+logger = logging.getLogger("avaliacao")
+
+PREWARM = os.environ.get("AVALIACAO_PREWARM", "1").strip().lower() not in ("0", "false", "no", "")
+
+# Módulos usados em toda renderização do painel; gspread vem com o cliente do Sheets
+# e os engines de Excel/Parquet ficam para a primeira exportação.
+MODULOS_PAINEL = ("pandas", "altair", "avaliacao.analytics", "avaliacao.dataset", "avaliacao.federation")
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_estado: Dict = {}
+
+
+def iniciar(spreadsheet: Optional[str] = None, loader: Optional[Callable] = None) -> bool:
+    """Dispara o pré-aquecimento uma vez por processo; False se já foi disparado ou está desligado"""
+    global _thread
+    if not PREWARM:
+        return False
+    with _lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=_aquecer, args=(spreadsheet, loader),
+                                   name="avaliacao-warmup", daemon=True)
+        _thread.start()
+    return True
+
+
+def _aquecer(spreadsheet: Optional[str], loader: Optional[Callable]) -> None:
+    import importlib
+
+    new_run("warmup")
+    t0 = time.perf_counter()
+    _estado.update(inicio=time.time(), fim=None, erro=None)
+    try:
+        with span("warmup_imports"):
+            for nome in MODULOS_PAINEL:
+                try:
+                    importlib.import_module(nome)
+                except ImportError:
+                    pass  # altair é opcional: o painel segue sem os gráficos
+        from .dataset import get_dataset
+        from .federation import get_dataset_federado
+        with span("warmup_dataset") as s:
+            # sem planilha explícita: todas as fontes de fontes.toml
+            dataset = get_dataset(spreadsheet, loader) if spreadsheet else get_dataset_federado(loader)
+            s.rows = len(dataset)
+        from . import engines
+        if engines.ENGINE == "duckdb":
+            engines.base_duckdb(dataset)  # cópia para o DuckDB também fica pronta antes do login
+    except Exception as e:
+        # sem credenciais ou planilha fora do ar: o primeiro login tenta de novo e mostra o erro
+        _estado["erro"] = f"{type(e).__name__}: {e}"
+        logger.warning("Pré-aquecimento falhou: %s", _estado["erro"])
+    finally:
+        _estado["fim"] = time.time()
+        _estado["segundos"] = round(time.perf_counter() - t0, 3)
+
+
+def estado() -> Dict:
+    """Situação do pré-aquecimento: inicio/fim (epoch), segundos e erro; vazio se não rodou"""
+    return dict(_estado)
+
+
+def aguardar(timeout: Optional[float] = None) -> bool:
+    """Espera o pré-aquecimento terminar (scripts e testes); True se terminou"""
+    t = _thread
+    if t is None:
+        return False
+    t.join(timeout)
+    return not t.is_alive()
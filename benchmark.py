@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline do dashboard com dados sintéticos, com baseline e limite de regressão.
+
+Para cada volume (padrão: 10k, 100k e 1M linhas) gera a planilha com synthetic_data.py,
+serve pelo cliente falso (fake_sheets.py) e mede cada etapa:
+
+    ingestão -> normalização -> filtros -> 5 resumos (build_summary) -> ranking de
+    avaliadores + pivot -> volume por hora -> exportação Excel
+
+e, em seguida, o próprio colab.py rodando no AppTest do Streamlit (primeira execução,
+sem cache, e um rerun), para medir o script de módulo como ele roda no servidor.
+
+Tempo: melhor de --repeticoes passadas. Pico de memória: uma passada extra sob
+tracemalloc (separada, para não inflar os tempos).
+
+Os resultados vão para um JSON; com uma baseline existente, cada etapa é comparada
+e o script sai com código 1 se alguma passar do limite (padrão: +30% e pelo menos
+50 ms / 5 MB acima da baseline).
+
+Exemplos:
+    python benchmark.py --salvar                       # cria/atualiza benchmark_baseline.json
+    python benchmark.py                                # compara com a baseline
+    python benchmark.py --linhas 10000 100000 --sem-excel --limite 0.5
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from avaliacao import analytics, engines, exports, normalize, perf, sources
+from avaliacao.dataset import Dataset, invalidate_dataset
+from avaliacao.fake_sheets import FakeClient
+from avaliacao.synthetic_data import gerar_planilha_por_total
+from avaliacao.user_registry import get_registry
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colab.py")
+BASELINE_PATH = "benchmark_baseline.json"
+
+# mesmos níveis de resumo que o app mostra
+NIVEIS_RESUMO = analytics.NIVEIS_RESUMO
+
+
+def _nome_resumo(by_cols: List[str]) -> str:
+    return "resumo[" + ("/".join(by_cols) or "geral") + "]"
+
+
+def filtros_tipicos(data: pd.DataFrame) -> Tuple:
+    """Filtro típico de uso: últimos 30 dias, horário comercial, todas as lojas e setores"""
+    d_fim = data["Data"].max().date()
+    d_ini = (data["Data"].max() - pd.Timedelta(days=29)).date()
+    return (d_ini, d_fim, "Todos", sorted(data["Loja"].unique()), sorted(data["Setor"].unique()), 8, 20)
+
+
+def etapas_pipeline(client: FakeClient, excel: bool = True,
+                    engine: str = "pandas") -> List[Tuple[str, Callable[[Dict], object]]]:
+    """Etapas em ordem; cada uma lê o que precisa do dict `ctx` e grava o próprio resultado nele"""
+
+    def ingestao(ctx):
+        ctx["versao"], ctx["abas"] = sources.fetch_sheets("benchmark", client=client)
+
+    def normalizacao(ctx):
+        data, _ = normalize.build_dataset(ctx["abas"])
+        ctx["dataset"] = Dataset(ctx["versao"], data)
+
+    def carga_duckdb(ctx):
+        engines.base_duckdb(ctx["dataset"])
+
+    def filtros(ctx):
+        ds = ctx["dataset"]
+        ctx["rec"] = engines.recorte(ds, None, filtros_tipicos(ds.data), engine)
+        ctx["df_f"] = ctx["rec"].df
+
+    def resumo(by_cols):
+        return lambda ctx: ctx["rec"].resumo(by_cols)
+
+    def ranking(ctx):
+        ctx["rank_av"] = ctx["rec"].ranking_avaliadores()
+        analytics.pivot_avaliadores(ctx["rank_av"])
+
+    def por_hora(ctx):
+        ctx["rec"].volume_por_hora()
+
+    def excel_export(ctx):
+        os.remove(exports.gerar_relatorio_excel_por_loja(ctx["df_f"]))
+
+    etapas = [("ingestao", ingestao), ("normalizacao", normalizacao)]
+    if engine == "duckdb":
+        etapas.append(("duckdb_carga", carga_duckdb))
+    etapas.append(("filtros", filtros))
+    etapas += [(_nome_resumo(b), resumo(b)) for b in NIVEIS_RESUMO]
+    etapas += [("ranking_avaliadores", ranking), ("volume_por_hora", por_hora)]
+    if excel:
+        etapas.append(("excel_export", excel_export))
+    return etapas
+
+
+def medir_pipeline(client: FakeClient, repeticoes: int = 1, memoria: bool = True,
+                   excel: bool = True, engine: str = "pandas") -> Dict[str, Dict]:
+    """{etapa: {"s": melhor tempo, "pico_mb": pico do tracemalloc}}"""
+    etapas = etapas_pipeline(client, excel, engine)
+    out: Dict[str, Dict] = {nome: {"s": float("inf"), "pico_mb": None} for nome, _ in etapas}
+    for _ in range(max(1, repeticoes)):
+        ctx: Dict = {}
+        for nome, fn in etapas:
+            gc.collect()
+            t0 = time.perf_counter()
+            fn(ctx)
+            out[nome]["s"] = min(out[nome]["s"], time.perf_counter() - t0)
+    if memoria:
+        ctx = {}
+        tracemalloc.start()
+        try:
+            for nome, fn in etapas:
+                gc.collect()
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                fn(ctx)
+                out[nome]["pico_mb"] = (tracemalloc.get_traced_memory()[1] - base) / 1e6
+        finally:
+            tracemalloc.stop()
+    for r in out.values():
+        r["s"] = round(r["s"], 4)
+        if r["pico_mb"] is not None:
+            r["pico_mb"] = round(r["pico_mb"], 2)
+    return out
+
+
+def _usuario_admin() -> Tuple[str, Dict]:
+    reg = get_registry()
+    for username, u in reg.users.items():
+        if u["role"] == "admin":
+            return username, u
+    raise RuntimeError("Nenhum administrador no cadastro de usuários (usuarios.toml)")
+
+
+def medir_app(client: FakeClient, timeout: float = 1800, memoria: bool = True,
+              engine: str = "pandas") -> Tuple[Dict[str, Dict], Dict]:
+    """Roda colab.py no AppTest como administrador: execução sem cache e um rerun
+
+    Retorna ({"app_frio"/"app_quente": {"s", "pico_mb"}}, spans do perf da execução sem cache).
+    """
+    engine_antes, engines.ENGINE = engines.ENGINE, engine
+    try:
+        return _medir_app(client, timeout, memoria)
+    finally:
+        engines.ENGINE = engine_antes
+
+
+def _medir_app(client: FakeClient, timeout: float, memoria: bool) -> Tuple[Dict[str, Dict], Dict]:
+    import streamlit as st
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    # fora do servidor o Streamlit avisa "missing ScriptRunContext" a cada chamada de cache
+    set_log_level("error")
+    username, user = _usuario_admin()
+
+    def nova_sessao():
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        at.session_state["authenticated"] = True
+        at.session_state["username"] = username
+        at.session_state["user_data"] = user
+        return at
+
+    def rodar(at) -> float:
+        t0 = time.perf_counter()
+        at.run()
+        dt = time.perf_counter() - t0
+        if at.exception:
+            raise RuntimeError(f"colab.py falhou no AppTest: {at.exception[0].value}")
+        return dt
+
+    out: Dict[str, Dict] = {}
+    st.cache_data.clear()
+    invalidate_dataset()
+    perf.reset()
+    at = nova_sessao()
+    out["app_frio"] = {"s": round(rodar(at), 4), "pico_mb": None}
+    spans = {r["etapa"]: r["p50_ms"] for r in perf.stage_stats(last_runs=None)}
+    out["app_quente"] = {"s": round(rodar(at), 4), "pico_mb": None}
+
+    if memoria:
+        st.cache_data.clear()
+        invalidate_dataset()
+        at = nova_sessao()
+        for nome in ("app_frio", "app_quente"):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                rodar(at)
+                out[nome]["pico_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+            finally:
+                tracemalloc.stop()
+    return out, spans
+
+
+def conferir_engines(client: FakeClient) -> List[str]:
+    """Diferenças entre os motores pandas e DuckDB nas agregações do app (lista vazia = idênticos)"""
+    versao, abas = sources.fetch_sheets("benchmark", client=client)
+    data, _ = normalize.build_dataset(abas)
+    ds = Dataset(versao, data)
+    filtros = [filtros_tipicos(data), (None, None, "Todos", [], [], 0, 23)]
+    diferencas = []
+    for f in filtros:
+        a, b = engines.recorte(ds, None, f, "pandas"), engines.recorte(ds, None, f, "duckdb")
+        pares = [("filtros", a.df, b.df)]
+        pares += [(_nome_resumo(c), a.resumo(c), b.resumo(c)) for c in NIVEIS_RESUMO]
+        pares.append(("ranking_avaliadores", a.ranking_avaliadores(), b.ranking_avaliadores()))
+        pares += [(f"volume_por_hora[{i}]", x, y) for i, (x, y) in enumerate(zip(a.volume_por_hora(), b.volume_por_hora()))]
+        for nome, x, y in pares:
+            try:
+                pd.testing.assert_frame_equal(x, y)
+            except AssertionError as e:
+                diferencas.append(f"{nome} ({f[0]}..{f[1]}): {str(e).splitlines()[0]}")
+    return diferencas
+
+
+def comparar(atual: Dict, baseline: Dict, limite: float, limite_memoria: float,
+             folga_s: float, folga_mb: float) -> List[str]:
+    """Lista de regressões (texto) de `atual` contra `baseline`, etapa a etapa"""
+    regressoes = []
+    for linhas, res in atual.items():
+        base = baseline.get(linhas)
+        if not base:
+            continue
+        for etapa, r in res["etapas"].items():
+            b = base["etapas"].get(etapa)
+            if not b:
+                continue
+            if r["s"] > b["s"] * (1 + limite) and r["s"] - b["s"] > folga_s:
+                regressoes.append(f"{linhas} linhas, {etapa}: {r['s']:.3f}s (baseline {b['s']:.3f}s, "
+                                  f"+{(r['s'] / b['s'] - 1) * 100:.0f}%)")
+            if r.get("pico_mb") is not None and b.get("pico_mb") is not None:
+                if r["pico_mb"] > b["pico_mb"] * (1 + limite_memoria) and r["pico_mb"] - b["pico_mb"] > folga_mb:
+                    regressoes.append(f"{linhas} linhas, {etapa}: pico {r['pico_mb']:.1f} MB "
+                                      f"(baseline {b['pico_mb']:.1f} MB)")
+    return regressoes
+
+
+def _tabela(linhas: str, res: Dict, base: Optional[Dict]):
+    print(f"\n== {linhas} linhas (geradas: {res['linhas_geradas']}, após normalização: {res['linhas_dataset']})")
+    print(f"{'etapa':<44}{'s':>10}{'pico MB':>10}{'base s':>10}{'base MB':>10}")
+    for etapa, r in res["etapas"].items():
+        b = (base or {}).get("etapas", {}).get(etapa, {})
+        pico = f"{r['pico_mb']:.1f}" if r.get("pico_mb") is not None else "-"
+        bs = f"{b['s']:.3f}" if "s" in b else "-"
+        bm = f"{b['pico_mb']:.1f}" if b.get("pico_mb") is not None else "-"
+        print(f"{etapa:<44}{r['s']:>10.3f}{pico:>10}{bs:>10}{bm:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline do dashboard com dados sintéticos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticoes", type=int, default=1, help="Passadas de tempo por volume (vale a melhor)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON da baseline")
+    parser.add_argument("--salvar", action="store_true", help="Grava os resultados como nova baseline")
+    parser.add_argument("--saida", help="Grava os resultados desta execução neste JSON")
+    parser.add_argument("--limite", type=float, default=0.30, help="Aumento de tempo tolerado (0.30 = +30%%)")
+    parser.add_argument("--limite-memoria", type=float, default=0.30, help="Aumento de pico de memória tolerado")
+    parser.add_argument("--folga-ms", type=float, default=50, help="Diferença mínima de tempo para contar regressão")
+    parser.add_argument("--folga-mb", type=float, default=5, help="Diferença mínima de memória para contar regressão")
+    parser.add_argument("--sem-memoria", action="store_true", help="Não mede pico de memória (mais rápido)")
+    parser.add_argument("--sem-excel", action="store_true", help="Pula a exportação Excel")
+    parser.add_argument("--sem-app", action="store_true", help="Não roda o colab.py no AppTest")
+    parser.add_argument("--engine", choices=["pandas", "duckdb", "ambos"], default="pandas",
+                        help="Motor das agregações; 'ambos' mede os dois e confere se os resultados batem")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    motores = ["pandas", "duckdb"] if args.engine == "ambos" else [args.engine]
+
+    baseline: Dict = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("resultados", {})
+
+    resultados: Dict[str, Dict] = {}
+    divergencias: List[str] = []
+    for n in args.linhas:
+        print(f"Gerando {n} linhas sintéticas...", flush=True)
+        client = FakeClient(gerar_planilha_por_total(n, seed=args.seed))
+        sources.set_sheets_client(client)
+        try:
+            for engine in motores:
+                # chave da baseline: "100000" (pandas, como antes) ou "100000/duckdb"
+                chave = str(n) if engine == "pandas" else f"{n}/{engine}"
+                etapas = medir_pipeline(client, args.repeticoes, not args.sem_memoria, not args.sem_excel, engine)
+                versao, abas = sources.fetch_sheets("benchmark", client=client)
+                dataset, _ = normalize.build_dataset(abas)
+                res = {"linhas_geradas": sum(len(df) for _, df in abas), "linhas_dataset": len(dataset),
+                       "dataset_version": versao, "engine": engine, "etapas": etapas}
+                del abas, dataset
+                if not args.sem_app:
+                    app, spans = medir_app(client, memoria=not args.sem_memoria, engine=engine)
+                    res["etapas"].update(app)
+                    res["app_spans_ms"] = spans
+                resultados[chave] = res
+                _tabela(chave, res, baseline.get(chave))
+            if len(motores) > 1:
+                divergencias += [f"{n} linhas, {d}" for d in conferir_engines(client)]
+        finally:
+            sources.set_sheets_client(None)
+
+    doc = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "maquina": f"{platform.machine()} / {os.cpu_count()} CPUs",
+        "resultados": resultados,
+    }
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+
+    regressoes = comparar(resultados, baseline, args.limite, args.limite_memoria,
+                          args.folga_ms / 1000, args.folga_mb)
+    if len(motores) > 1:
+        if divergencias:
+            print("\nRESULTADOS DIFERENTES ENTRE OS MOTORES:")
+            for d in divergencias:
+                print(f"  {d}")
+            return 1
+        print("\nMotores pandas e DuckDB: resultados idênticos")
+    if args.salvar:
+        # mantém na baseline os volumes que não foram medidos agora
+        doc["resultados"] = {**baseline, **resultados}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline gravada em {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"\nSem baseline em {args.baseline} (rode com --salvar para criar)")
+        return 0
+    if regressoes:
+        print("\nREGRESSÕES:")
+        for r in regressoes:
+            print(f"  {r}")
+        return 1
+    print("\nSem regressões em relação à baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,281 +1,113 @@
 # app.py — Avaliação de Colaboradores (CSV + Google Sheets)
+# Interface Streamlit; carga, filtros, resumos e exportações ficam no pacote avaliacao/.
 # Colunas por posição:
 # A=Data, B=Setor, C=Colaborador, D=Velocidade, F=Atendimento, H=Qualidade, J=Ajuda, M=Avaliador
+#
+# Partida rápida: até o formulário de login só são importados streamlit, auth e
+# mobile_utils. pandas e o pacote de análises entram depois do login (e já estão
+# carregados, junto com o dataset, pelo pré-aquecimento de avaliacao/warmup.py);
+# gspread, altair e os engines de Excel só no primeiro uso. Perfil: startup_profile.py
 
-import io
+import logging
 import re
 from datetime import datetime
-from typing import List, Tuple
 
-import numpy as np
-import pandas as pd
 import streamlit as st
-from gspread.exceptions import APIError
 
 # Importar sistema de autenticação
 from auth import (
-    is_authenticated, get_current_user, show_login_form, 
-    show_logout_button, filter_data_by_user_access
+    is_authenticated, get_current_user, show_login_form,
+    show_logout_button, filter_data_by_user_access, get_user_stores
 )
 
 # Importar utilitários mobile
 from mobile_utils import (
     detect_mobile, get_mobile_config, apply_mobile_styles,
-    create_mobile_metrics, create_mobile_filters, optimize_dataframe_for_mobile
+    create_mobile_metrics, create_mobile_filters, paginate_dataframe
 )
 
-# ---------------------------------
-# CONFIG & DEBUG
-# ---------------------------------
-st.set_page_config(page_title="Avaliação de Colaboradores", layout="wide")
-DEBUG_LOGS = False  # Desativado - sistema funcionando
-
 # ---------------------------------
 # OTIMIZAÇÕES MOBILE
 # ---------------------------------
-# Detectar dispositivo mobile
+# Detectar dispositivo mobile (headers da requisição, cacheado na sessão)
 is_mobile = detect_mobile()
 mobile_config = get_mobile_config()
 
+# ---------------------------------
+# CONFIG & DEBUG
+# ---------------------------------
+st.set_page_config(page_title="Avaliação de Colaboradores", layout="wide",
+                   initial_sidebar_state="collapsed" if is_mobile else "auto")
+DEBUG_LOGS = False  # Desativado - sistema funcionando
+if DEBUG_LOGS:
+    logging.basicConfig(level=logging.DEBUG)  # logs do pacote avaliacao no console
+
 # Aplicar estilos mobile
 apply_mobile_styles()
 
+def _log(msg):
+    if DEBUG_LOGS:
+        st.write(f"🔍 DEBUG: {msg}")
+        # Remove todos os emojis Unicode para o console do Windows
+        import re
+        console_msg = re.sub(r'[^\x00-\x7F]+', '[EMOJI]', msg)
+        print(f"DEBUG: {console_msg}")  # Console sem emojis
+
 # ---------------------------------
 # SISTEMA DE AUTENTICAÇÃO
 # ---------------------------------
+def _ler_planilha(spreadsheet_id: str):
+    """Busca e normaliza a planilha (chamado por get_dataset, na sessão ou no pré-aquecimento)"""
+    from avaliacao import get_sheets_client, load_dataset
+    _log(f"🔗 URL/ID recebido: {spreadsheet_id}")
+    try:
+        secrets = dict(st.secrets)
+    except Exception:
+        secrets = None  # sem secrets.toml: load_sa_creds tenta só o JSON
+    client = get_sheets_client(secrets=secrets)
+    _log(f"📧 Cliente do Sheets: {type(client).__name__}")
+    return load_dataset(spreadsheet_id, client=client)
+
 # Verificar se o usuário está autenticado
 if not is_authenticated():
+    # Enquanto o usuário digita a senha, o processo importa a pilha de dados e carrega a planilha
+    from avaliacao.warmup import iniciar as iniciar_prewarm
+    iniciar_prewarm(loader=_ler_planilha)
     show_login_form()
     st.stop()
 
+# Dados e análises (pacote avaliacao, sem Streamlit): só depois do login
+import pandas as pd
+
+from avaliacao import (
+    FORMATOS, SPREADSHEET_URL, bytes_exportacao, chave_filtro, get_dataset_federado, invalidar_fontes,
+    COMPARACOES, NIVEIS_TENDENCIA, REGRAS, comparacao, historico_versoes, indice_pessoas, maiores_variacoes,
+    periodo_anterior, pivot_avaliadores, recorte, relatorio_excel_bytes, serie_tendencia
+)
+from avaliacao.perf import cache_stats, new_run, span, stage_stats, records, reset as reset_perf
+from avaliacao.user_registry import get_registry, lojas_por_regiao
+
 # Mostrar botão de logout na sidebar
 show_logout_button()
 
 # Obter dados do usuário atual
 current_user = get_current_user()
-def _log(msg):
-    if DEBUG_LOGS:
-        st.write(f"🔍 DEBUG: {msg}")
-        # Remove todos os emojis Unicode para o console do Windows
-        import re
-        console_msg = re.sub(r'[^\x00-\x7F]+', '[EMOJI]', msg)
-        print(f"DEBUG: {console_msg}")  # Console sem emojis
 
-# Adicionado mapeamento de lojas por região
-MAPEAMENTO_REGIOES = {
-    # Rio de Janeiro
-    "Carioca": "RJ",
-    "Santa Cruz": "RJ",
-    "Mesquita": "RJ",
-    "Nilópolis": "RJ",
-    "Madureira": "RJ",
-    "Bonsucesso": "RJ",
-    # São Paulo
-    "Taboão": "SP",
-    "São Bernardo": "SP",
-    "Santo André": "SP",
-    "Mauá": "SP",
-    "MDC São Mateus": "SP",
-    "CDM São Mateus": "SP",
-}
-
-def get_regiao(loja: str) -> str:
-    """Retorna a região da loja ou 'Outra' se não mapeada"""
-    return MAPEAMENTO_REGIOES.get(loja, "Outra")
-
-# Mapeamento por letra
-NOTAS_COLS = {"Velocidade": "D", "Atendimento": "F", "Qualidade": "H", "Ajuda": "J"}
-COL_DATA, COL_SETOR, COL_NOME, COL_AVALIADOR = "A", "B", "C", "M"
-
-
-def normalize_colnames(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = [c.encode("utf-8").decode("utf-8-sig").strip() if isinstance(c, str) else c for c in df.columns]
-    return df
-
-def get_col_by_letter(df: pd.DataFrame, letter: str) -> str:
-    idx = ord(letter.upper()) - ord("A")
-    if not (0 <= idx < len(df.columns)):
-        raise ValueError(f"Letra de coluna inválida: {letter}")
-    return df.columns[idx]
-
-def parse_datetime_ptbr(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, errors="coerce", dayfirst=True)
-
-def cast_notas_safe(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
-    for c in cols:
-        if c not in df.columns:
-            df[c] = 0.0
-            continue
-        obj = df[c]
-        if isinstance(obj, pd.DataFrame):
-            obj = obj.iloc[:, 0]
-        df[c] = pd.to_numeric(obj, errors="coerce").fillna(0.0)
-    return df
-
-def infer_loja_from_filename(name: str) -> str:
-    if not name: return "Desconhecida"
-    m = re.search(r"-\s*([^-()]+?)\s*(?:\(|-|\.|$)", name)
-    if m: return m.group(1).strip()
-    tokens = re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ]+", name)
-    return tokens[-1] if tokens else "Desconhecida"
-
-def build_summary(df: pd.DataFrame, by_cols: List[str]) -> pd.DataFrame:
-    notas = ["Velocidade", "Atendimento", "Qualidade", "Ajuda"]
-    work = df.copy()
-    work["Avaliações"] = 1
-    if by_cols:
-        means = work.groupby(by_cols, dropna=False)[notas].mean(numeric_only=True)
-        counts = work.groupby(by_cols, dropna=False)["Avaliações"].sum()
-        out = means.join(counts).reset_index()
-    else:
-        out = pd.DataFrame({
-            "Velocidade": [work["Velocidade"].mean()],
-            "Atendimento": [work["Atendimento"].mean()],
-            "Qualidade": [work["Qualidade"].mean()],
-            "Ajuda": [work["Ajuda"].mean()],
-            "Avaliações": [work["Avaliações"].sum()],
-        })
-    out["Média Geral"] = out[["Velocidade","Atendimento","Qualidade","Ajuda"]].mean(axis=1)
-    out[["Velocidade","Atendimento","Qualidade","Ajuda","Média Geral"]] = \
-        out[["Velocidade","Atendimento","Qualidade","Ajuda","Média Geral"]].round(2)
-    if by_cols:
-        out = out.sort_values("Média Geral", ascending=False)
-    return out
-
-
-REQUIRED_GCP_FIELDS = {
-    "type","project_id","private_key_id","private_key",
-    "client_email","client_id","auth_uri","token_uri",
-    "auth_provider_x509_cert_url","client_x509_cert_url"
-}
-
-def _normalize_sheet_id(maybe_url_or_id: str) -> str:
-    s = (maybe_url_or_id or "").strip()
-    m = re.search(r"/d/([a-zA-Z0-9\-_]+)", s)
-    return m.group(1) if m else s
-
-def _load_sa_creds_from_secrets() -> dict:
-    _log("🔑 Tentando carregar credenciais...")
-    
-    # Primeiro, tentar carregar do arquivo JSON
-    try:
-        import json
-        import os
-        json_path = "service_account.json"
-        if os.path.exists(json_path):
-            _log("📄 Carregando credenciais do arquivo JSON...")
-            with open(json_path, 'r') as f:
-                creds = json.load(f)
-            _log(f"✅ Arquivo JSON carregado com sucesso")
-            _log(f"📧 Service Account: {creds.get('client_email', 'NÃO ENCONTRADO')}")
-            return creds
-    except Exception as e:
-        _log(f"❌ Erro ao carregar arquivo JSON: {e}")
-    
-    # Se não conseguir carregar do JSON, tentar do secrets.toml
-    _log("📄 Tentando carregar credenciais do secrets.toml...")
-    try:
-        creds = dict(st.secrets["gcp_service_account"])
-        _log(f"✅ Seção [gcp_service_account] encontrada")
-        _log(f"📧 Service Account: {creds.get('client_email', 'NÃO ENCONTRADO')}")
-        
-        # corrige chave salva com \n literal (duas barras) -> quebra real
-        pk = creds.get("private_key", "")
-        if "\\n" in pk and "\n" not in pk:
-            _log("🔧 Corrigindo formatação da chave privada...")
-            creds["private_key"] = pk.replace("\\n", "\n")
-        
-        missing = [k for k in REQUIRED_GCP_FIELDS if k not in creds or not str(creds[k]).strip()]
-        if missing:
-            present = sorted(creds.keys())
-            _log(f"❌ Credenciais incompletas. Faltando: {missing}")
-            _log(f"📋 Campos presentes: {present}")
-            raise RuntimeError(f"Credenciais incompletas. Faltando: {missing}. Presentes: {present}.")
-        
-        _log("✅ Credenciais do secrets.toml validadas com sucesso")
-        return creds
-        
-    except Exception as e:
-        _log(f"❌ Erro ao carregar secrets: {e}")
-        raise RuntimeError("Não foi possível carregar credenciais nem do arquivo JSON nem do secrets.toml")
-
-def _open_sheet_by_id(maybe_url_or_id: str):
-    import gspread
-    _log(f"🔗 URL/ID recebido: {maybe_url_or_id}")
-    sid = _normalize_sheet_id(maybe_url_or_id)
-    _log(f"🔎 ID normalizado: `{sid}`")
-    
-    creds = _load_sa_creds_from_secrets()
-    _log(f"📧 Service account: {creds.get('client_email')}")
-    
-    _log("🔌 Conectando ao Google Sheets API...")
-    try:
-        gc = gspread.service_account_from_dict(creds)
-        _log("✅ Conectado ao Google Sheets API")
-    except Exception as e:
-        _log(f"❌ Erro ao conectar com Google Sheets API: {e}")
-        raise
-    
-    _log(f"📋 Tentando abrir planilha com ID: {sid}")
-    try:
-        sh = gc.open_by_key(sid)
-        _log(f"✅ Planilha aberta: {sh.title}")
-        return sh
-    except APIError as e:
-        msg = str(e)
-        _log(f"❌ APIError ao abrir planilha: {msg}")
-        if "404" in msg:
-            error_msg = "Planilha não encontrada (404). Verifique ID (trecho entre /d/ e /edit) e se a planilha foi compartilhada com a service account (Leitor)."
-            _log(f"❌ {error_msg}")
-            raise RuntimeError(error_msg)
-        if "403" in msg:
-            error_msg = "Sem permissão (403). Compartilhe a planilha com a service account como Leitor."
-            _log(f"❌ {error_msg}")
-            raise RuntimeError(error_msg)
-        _log(f"❌ Erro não tratado: {msg}")
-        raise
-    except Exception as e:
-        _log(f"❌ Erro inesperado ao abrir planilha: {e}")
-        _log(f"❌ Tipo do erro: {type(e).__name__}")
-        raise
-
-@st.cache_data(ttl=300)  # Cache por 5 minutos
-def _fetch_from_gsheets(spreadsheet_id: str) -> List[Tuple[str, pd.DataFrame]]:
-    import time
-    try:
-        sh = _open_sheet_by_id(spreadsheet_id)
-        ws_list = sh.worksheets()
-        _log(f"📑 {sh.title}: {len(ws_list)} aba(s) detectadas")
-        dfs: List[Tuple[str, pd.DataFrame]] = []
-        
-        for i, ws in enumerate(ws_list):
-            _log(f"➡️ Lendo aba: {ws.title}")
-            
-            # Pequena pausa entre requisições para evitar quota
-            if i > 0:
-                time.sleep(0.5)
-            
-            values = ws.get_all_values()
-            if not values:
-                _log("   (vazia)")
-                continue
-            if len(values) >= 2:
-                df = pd.DataFrame(values[1:], columns=values[0])
-            else:
-                df = pd.DataFrame(values)
-            dfs.append((ws.title, df))
-        return dfs
-    except Exception as e:
-        if "429" in str(e) or "quota" in str(e).lower():
-            st.warning("⚠️ Limite de requisições da API excedido. Aguarde alguns minutos e tente novamente.")
-            st.info("💡 Dica: O cache foi ativado para reduzir requisições.")
-        raise
+# Cada rerun ganha um id para agrupar os spans de tempo (painel "Desempenho")
+new_run()
 
+def show_table(df: pd.DataFrame, key: str, top_n: int = 0):
+    """Exibe tabela; no modo mobile limita ao top N e pagina para reduzir o payload"""
+    if not is_mobile:
+        st.dataframe(df, width="stretch")
+        return
+    if top_n and len(df) > top_n:
+        st.caption(f"📱 Top {top_n} de {len(df)} linhas")
+        df = df.head(top_n)
+    paginate_dataframe(df, key, page_size=mobile_config["page_size"])
 
 st.sidebar.header("Configurações")
-# Link padrão do Google Sheets
-SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/196mkyj8XPLouscoiJqmarCJ4H5N7ANnAhmH6V-uXSlw/edit?gid=2014063945#gid=2014063945"
-frames: List[pd.DataFrame] = []
+dataset = None
 
 # Sempre usar Google Sheets com o link padrão
 spreadsheet_in = SPREADSHEET_URL
@@ -284,68 +116,29 @@ _log(f"🔗 URL da planilha: {SPREADSHEET_URL}")
 col1, col2 = st.sidebar.columns(2)
 with col1:
     if st.button("↻ Atualizar", help="Atualiza os dados da planilha"):
+        invalidar_fontes()
         st.cache_data.clear()
         st.rerun()
 with col2:
     if st.button("⏰ Cache", help="Limpa o cache (use se dados não atualizaram)"):
+        invalidar_fontes()
         st.cache_data.clear()
         st.success("Cache limpo!")
 if spreadsheet_in:
         try:
             _log("📊 Tentando buscar dados do Google Sheets...")
-            sheets = _fetch_from_gsheets(spreadsheet_in)
-            for title, df in sheets:
-                df = normalize_colnames(df)
-                # mapear por posição
-                try:
-                    col_data = get_col_by_letter(df, COL_DATA)
-                    col_setor = get_col_by_letter(df, COL_SETOR)
-                    col_nome  = get_col_by_letter(df, COL_NOME)
-                    col_vel = get_col_by_letter(df, NOTAS_COLS["Velocidade"])
-                    col_atd = get_col_by_letter(df, NOTAS_COLS["Atendimento"])
-                    col_qlt = get_col_by_letter(df, NOTAS_COLS["Qualidade"])
-                    col_ajd = get_col_by_letter(df, NOTAS_COLS["Ajuda"])
-                    col_avaliador = get_col_by_letter(df, COL_AVALIADOR)  # M
-                except Exception as e:
-                    st.warning(f"Aba '{title}': problema ao mapear colunas — {e}")
-                    continue
-
-                rec = pd.DataFrame({
-                    "Data": df[col_data],
-                    "Setor": df[col_setor],
-                    "Colaborador": df[col_nome],
-                    "Velocidade": df[col_vel],
-                    "Atendimento": df[col_atd],
-                    "Qualidade": df[col_qlt],
-                    "Ajuda": df[col_ajd],
-                    "Avaliador": df[col_avaliador],  # novo
-                })
-                rec["Data"] = parse_datetime_ptbr(rec["Data"])
-                rec = cast_notas_safe(rec, ["Velocidade","Atendimento","Qualidade","Ajuda"])
-
-                # ignora linhas sem nome de colaborador
-                rec = rec[rec["Colaborador"].notna()].copy()
-                rec["Colaborador"] = rec["Colaborador"].astype(str).str.strip()
-                rec = rec[(rec["Colaborador"] != "") & 
-                          (rec["Colaborador"].str.lower() != "nan") & 
-                          (rec["Colaborador"].str.lower() != "none")]
-
-                # limpando avaliador (mantenho vazios? se não quiser, descomente 2 linhas abaixo)
-                rec["Avaliador"] = rec["Avaliador"].astype(str).str.strip()
-                # rec = rec[~rec["Avaliador"].str.lower().isin(["", "nan", "none"])]
-
-                # novas colunas de data/hora
-                rec["Data_dia"] = rec["Data"].dt.date
-                rec["Hora"] = rec["Data"].dt.strftime("%H:%M")
-                rec["Hora_num"] = rec["Data"].dt.hour
-
-                rec["Loja"] = title
-                # Adicionando coluna de Região baseada na loja
-                rec["Região"] = rec["Loja"].apply(get_regiao)
-                frames.append(rec)
+            # Planilhas de fontes.toml (padrão: só SPREADSHEET_URL), cada uma num snapshot
+            # compartilhado entre as sessões e recarregado a cada 5 minutos (não alterar)
+            with st.spinner("Carregando dados do Google Sheets..."):
+                dataset = get_dataset_federado(_ler_planilha)
+            for aviso in dataset.avisos:
+                st.warning(aviso)
         except Exception as e:
             _log(f"❌ ERRO CAPTURADO: {e}")
             _log(f"❌ Tipo do erro: {type(e).__name__}")
+            if "429" in str(e) or "quota" in str(e).lower():
+                st.warning("⚠️ Limite de requisições da API excedido. Aguarde alguns minutos e tente novamente.")
+                st.info("💡 Dica: O cache foi ativado para reduzir requisições.")
             st.error(f"Erro ao carregar Google Sheets: {e}")
             st.error(f"Tipo do erro: {type(e).__name__}")
             # Mostrar mais detalhes do erro
@@ -353,15 +146,17 @@ if spreadsheet_in:
             _log(f"❌ Traceback completo: {traceback.format_exc()}")
 
 
-if not frames:
+if dataset is None or dataset.empty:
     st.title("📊 Avaliação de Colaboradores")
     st.info("Carregando dados do Google Sheets...")
     st.stop()
 
-data = pd.concat(frames, ignore_index=True)
+dataset_version = dataset.version
 
-# Filtrar dados baseado no acesso do usuário
-data = filter_data_by_user_access(data, current_user)
+# Filtrar dados baseado no acesso do usuário (índices por loja calculados uma vez por versão)
+with span("filtro_acesso") as _s:
+    data = filter_data_by_user_access(dataset.data, current_user, dataset.partitions)
+    _s.rows = len(data)
 
 # limites de data
 if data["Data"].notna().any():
@@ -371,15 +166,21 @@ else:
     today = datetime.today().date()
     date_min = date_max = today
 
+# Com histórico arquivado o calendário vai até o primeiro mês arquivado, mas o período
+# padrão continua sendo a parte recente (que não abre o histórico)
+limite_min = date_min
+if dataset.arquivo is not None and dataset.arquivo.primeira_data:
+    limite_min = min(date_min, dataset.arquivo.primeira_data)
+
 st.sidebar.subheader("Filtros")
 # Corrigir problema quando date_min == date_max
-if date_min == date_max:
+if date_min == date_max and limite_min == date_min:
     # Se há apenas uma data, usar apenas essa data
     d_ini = st.sidebar.date_input("Data", value=date_min, min_value=date_min, max_value=date_max)
     d_fim = d_ini
 else:
     # Se há período, usar range - com tratamento para evitar erro de unpacking
-    date_range = st.sidebar.date_input("Período", value=(date_min, date_max), min_value=date_min, max_value=date_max)
+    date_range = st.sidebar.date_input("Período", value=(date_min, date_max), min_value=limite_min, max_value=date_max)
     
     # Tratar caso onde apenas uma data é selecionada
     if isinstance(date_range, tuple) and len(date_range) == 2:
@@ -393,7 +194,9 @@ st.sidebar.caption("💡 Dica: Selecione uma data para ver apenas esse dia, ou d
 
 # Filtros de região e loja só aparecem para administradores
 if current_user['role'] == 'admin':
-    regiao_sel = st.sidebar.selectbox("Filtrar por região", options=["Todos", "SP", "RJ"], index=0)
+    # regiões do cadastro mais as definidas em fontes.toml
+    regioes = sorted(set(lojas_por_regiao()) | set(data["Região"].dropna().unique()))
+    regiao_sel = st.sidebar.selectbox("Filtrar por região", options=["Todos"] + regioes, index=0)
 
     # Selectbox para ver loja específica
     loja_especifica = st.sidebar.selectbox(
@@ -413,10 +216,14 @@ if current_user['role'] == 'admin':
         lojas_sel = [loja_especifica]
         st.sidebar.info(f"Visualizando apenas: {loja_especifica}")
 else:
-    # Para usuários de loja, usar apenas a loja deles
+    # Para usuários de loja, usar apenas as lojas deles
     regiao_sel = "Todos"  # Não aplica filtro de região
-    lojas_sel = [current_user['access_level']]  # Apenas a loja do usuário
-    st.sidebar.info(f"📍 Visualizando dados da loja: {current_user['access_level']}")
+    lojas_usuario = get_user_stores(current_user)
+    if len(lojas_usuario) > 1:
+        lojas_sel = st.sidebar.multiselect("Filtrar por loja", options=lojas_usuario, default=lojas_usuario)
+    else:
+        lojas_sel = lojas_usuario  # Apenas a loja do usuário
+        st.sidebar.info(f"📍 Visualizando dados da loja: {current_user['access_level']}")
 
 setores_sel = st.sidebar.multiselect("Filtrar por setor",
                                      options=sorted([x for x in data["Setor"].dropna().unique()]),
@@ -425,30 +232,29 @@ setores_sel = st.sidebar.multiselect("Filtrar por setor",
 # filtro de hora
 hora_ini, hora_fim = st.sidebar.slider("Faixa de hora do dia", min_value=0, max_value=23, value=(0, 23), step=1)
 
-mask = pd.Series(True, index=data.index)
-# Filtro de data - aceita uma data ou período
-if d_ini and d_fim:
-    if d_ini == d_fim:
-        # Se apenas uma data foi selecionada, filtrar apenas essa data
-        mask &= data["Data"].dt.date == d_ini
-    else:
-        # Se período foi selecionado, filtrar o período
-        mask &= data["Data"].between(pd.to_datetime(d_ini),
-                                     pd.to_datetime(d_fim) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1),
-                                     inclusive="both")
-elif d_ini:
-    # Se apenas data inicial foi selecionada
-    mask &= data["Data"].dt.date == d_ini
-if regiao_sel != "Todos":
-    mask &= data["Região"] == regiao_sel
-if lojas_sel:
-    mask &= data["Loja"].isin(lojas_sel)
-if setores_sel:
-    mask &= data["Setor"].isin(setores_sel)
-if "Hora_num" in data.columns:
-    mask &= data["Hora_num"].between(hora_ini, hora_fim)
-
-df_f = data.loc[mask].copy()
+# Comparação: os resumos mostram o período do filtro, o de comparação e a variação lado a lado
+modo_comparacao = st.sidebar.selectbox("Comparar com", options=[None, *COMPARACOES],
+                                       format_func=lambda m: "Sem comparação" if m is None else COMPARACOES[m])
+periodo_comp = periodo_anterior(d_ini, d_fim, modo_comparacao) if modo_comparacao else None
+if periodo_comp:
+    st.sidebar.caption(f"Comparando com {periodo_comp[0]:%d/%m/%Y} – {periodo_comp[1]:%d/%m/%Y}")
+
+# Recorte das lojas do usuário dentro dos filtros; resumos, ranking e volume por hora rodam no
+# motor configurado (AVALIACAO_ENGINE=pandas|duckdb, mesmos resultados nos dois)
+filtros = (d_ini, d_fim, regiao_sel, lojas_sel, setores_sel, hora_ini, hora_fim)
+lojas_escopo = get_registry().stores_for(current_user)
+rec = recorte(dataset, lojas_escopo, filtros)
+df_f = rec.df
+
+# Chave do filtro atual e do escopo do usuário: junto com a versão do dataset identifica df_f
+# sem precisar hashear o dataframe (os caches de exportação são de todas as sessões)
+filter_key = chave_filtro(*filtros, stores=lojas_escopo)
+
+# Exportações sob demanda: os bytes só são gerados quando alguém clica em baixar
+# e ficam em cache por (versão do dataset, filtro, tipo). O "_" evita hashear o dataframe.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _csv_payload(dataset_version: str, filter_key: str, kind: str, _df: pd.DataFrame) -> bytes:
+    return _df.to_csv(index=False).encode("utf-8-sig")
 
 st.title("📊 Avaliação de Colaboradores")
 
@@ -469,76 +275,160 @@ if is_mobile:
 else:
     create_mobile_metrics(df_f, cols=5)
 
+# Busca de pessoas: nomes já canônicos ("joao silva" = "João Silva") e índice de trigramas
+# montado uma vez por versão do dataset (avaliacao/identity.py), só nas lojas do usuário
+busca = st.text_input("🔍 Buscar colaborador ou avaliador", key="busca_pessoa",
+                      placeholder="Parte do nome; acentos, maiúsculas e pequenos erros não importam")
+if busca.strip():
+    encontrados = indice_pessoas(dataset).buscar(busca, lojas_escopo)
+    if not encontrados:
+        st.info(f"Ninguém encontrado para \"{busca}\".")
+    else:
+        pessoas_df = pd.DataFrame(encontrados).assign(Lojas=lambda d: d["Lojas"].str.join(", "))
+        show_table(pessoas_df.drop(columns="ID"), "busca_pessoas")
+        resumo_busca = rec.resumo(["Colaborador", "Região", "Loja", "Setor"])
+        resumo_busca = resumo_busca[resumo_busca["Colaborador"].isin(pessoas_df["Nome"])]
+        if not resumo_busca.empty:
+            st.caption("Resumo das pessoas encontradas no período e nos filtros atuais")
+            show_table(resumo_busca, "busca_resumo")
+
 # Prévia - Otimizada para mobile
 cols_preview = [c for c in ["Data_dia", "Hora", "Região", "Loja", "Setor", "Colaborador", "Avaliador",
                             "Velocidade", "Atendimento", "Qualidade", "Ajuda"] if c in df_f.columns]
 
 st.markdown("### 🔎 Prévia dos dados filtrados")
 
-# Otimizar dataframe para mobile
+# No mobile a prévia é paginada (só a página atual vai para o navegador)
 df_preview = df_f.sort_values(["Data_dia","Hora"], ascending=False)[cols_preview]
-if is_mobile:
-    df_preview = optimize_dataframe_for_mobile(df_preview, max_rows=50)
-
-st.dataframe(df_preview, use_container_width=True)
+show_table(df_preview, "previa")
 
 st.markdown("---")
 st.subheader("👤 Resumo por Pessoa")
+# Com comparação: um groupby por resumo sobre as linhas dos dois períodos (engines.Comparacao)
+comp = comparacao(dataset, lojas_escopo, filtros, periodo_comp) if periodo_comp else None
+if comp is not None:
+    st.caption(f"Atual: {d_ini:%d/%m/%Y} – {d_fim:%d/%m/%Y} · anterior: {periodo_comp[0]:%d/%m/%Y} – "
+               f"{periodo_comp[1]:%d/%m/%Y} · Δ = atual − anterior")
+COLUNAS_COMPARACAO = (["Média Geral", "Δ Média Geral", "Avaliações", "Δ Avaliações"] if is_mobile else
+                      ["Média Geral", "Média Geral (anterior)", "Δ Média Geral", "Avaliações", "Avaliações (anterior)",
+                       "Δ Avaliações", "Δ Velocidade", "Δ Atendimento", "Δ Qualidade", "Δ Ajuda"])
+
+def _resumo(by_cols, key: str):
+    """Resumo do recorte, ou atual x anterior quando há comparação"""
+    if comp is None:
+        show_table(rec.resumo(by_cols), key, top_n=mobile_config["top_n"])
+        return
+    lado = comp.resumo(by_cols)
+    show_table(lado[by_cols + COLUNAS_COMPARACAO], key, top_n=mobile_config["top_n"])
+    st.download_button(
+        "Baixar CSV (comparação completa)",
+        data=lambda: _csv_payload(dataset_version, filter_key, f"comparacao_{modo_comparacao}_{key}", lado),
+        file_name=f"comparacao_{key}.csv",
+        mime="text/csv",
+        on_click="ignore",
+        key=f"csv_comparacao_{key}",
+    )
+
 # Incluindo Região no resumo por pessoa
-resumo_pessoa = build_summary(df_f, by_cols=["Colaborador","Região","Loja","Setor"])
-st.dataframe(resumo_pessoa, use_container_width=True)
+_resumo(["Colaborador","Região","Loja","Setor"], "pessoa")
 
 st.markdown("### 🏬 Resumo por Setor")
 # Incluindo Região no resumo por setor
-resumo_setor = build_summary(df_f, by_cols=["Setor","Região","Loja"])
-st.dataframe(resumo_setor, use_container_width=True)
+_resumo(["Setor","Região","Loja"], "setor")
 
 st.markdown("### 🏪 Resumo por Loja")
 # Incluindo Região no resumo por loja
-resumo_loja = build_summary(df_f, by_cols=["Região","Loja"])
-st.dataframe(resumo_loja, use_container_width=True)
+_resumo(["Região","Loja"], "loja")
 
 # Adicionado novo resumo por região
 st.markdown("### 🗺️ Resumo por Região")
-resumo_regiao = build_summary(df_f, by_cols=["Região"])
-st.dataframe(resumo_regiao, use_container_width=True)
+_resumo(["Região"], "regiao")
 
 st.markdown("### 🌐 Resumo Geral (todas as lojas)")
-resumo_geral = build_summary(df_f, by_cols=[])
-st.dataframe(resumo_geral, use_container_width=True)
+_resumo([], "geral")
+
+
+st.markdown("### 📊 Distribuição das notas")
+# Histogramas por nota somados de um cubo em cache por versão do dataset (avaliacao/distribution.py):
+# nota vazia entra na média dos resumos como 0; aqui ela aparece separada, em "% sem nota"
+NIVEIS_DISTRIBUICAO = {"Loja": ["Região", "Loja"], "Setor": ["Setor", "Região", "Loja"],
+                       "Colaborador": ["Colaborador", "Região", "Loja", "Setor"], "Região": ["Região"], "Geral": []}
+nivel_dist = st.radio("Distribuição por", options=list(NIVEIS_DISTRIBUICAO), horizontal=True, key="dist_nivel")
+geral_dist = rec.distribuicao([])
+if geral_dist["Avaliações"].sum() == 0:
+    st.info("Não há dados filtrados para montar a distribuição das notas.")
+else:
+    try:
+        import altair as alt
+        with span("grafico_distribuicao"):
+            faixas = ["Sem nota", *(f"Qtd {v}" for v in range(6))]
+            barras = geral_dist.melt(id_vars="Nota", value_vars=faixas, var_name="Resposta", value_name="Avaliações")
+            barras["Resposta"] = barras["Resposta"].str.replace("Qtd ", "Nota ", regex=False)
+            chart_dist = alt.Chart(barras).mark_bar().encode(
+                x=alt.X("Avaliações:Q", stack="normalize", title="% das avaliações"),
+                y=alt.Y("Nota:N", sort=list(geral_dist["Nota"]), title=None),
+                color=alt.Color("Resposta:N", sort=[f.replace("Qtd ", "Nota ") for f in faixas],
+                                scale=alt.Scale(scheme="redyellowgreen"), title=None),
+                tooltip=["Nota", "Resposta", "Avaliações"],
+            ).properties(height=mobile_config["chart_height"] if is_mobile else 220)
+            st.altair_chart(chart_dist, width="stretch")
+    except Exception:
+        pass
+
+    nota_dist = st.selectbox("Nota", options=list(geral_dist["Nota"]), key="dist_nota")
+    dist = rec.distribuicao(NIVEIS_DISTRIBUICAO[nivel_dist])
+    chaves_dist = NIVEIS_DISTRIBUICAO[nivel_dist]
+    colunas_dist = (["Mediana", "p10", "p90", "% sem nota", "Avaliações"] if is_mobile else
+                    [c for c in dist.columns if c not in chaves_dist and c != "Nota"])
+    tabela_dist = dist[dist["Nota"] == nota_dist].sort_values("Avaliações", ascending=False, kind="stable")
+    show_table(tabela_dist[chaves_dist + colunas_dist], "distribuicao", top_n=mobile_config["top_n"])
+    st.download_button(
+        "Baixar CSV (distribuição, todas as notas)",
+        data=lambda: _csv_payload(dataset_version, filter_key, f"distribuicao_{nivel_dist}", dist),
+        file_name=f"distribuicao_por_{nivel_dist.lower()}.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
 
 
 st.markdown("### 🧑‍⚖️ Ranking de avaliadores (quem mais faz avaliações)")
 if "Avaliador" in df_f.columns and not df_f.empty:
     # Incluindo Região no ranking de avaliadores
-    rank_av = (df_f.groupby(["Avaliador","Região","Loja"])
-                    .size()
-                    .reset_index(name="Avaliações feitas")
-                    .sort_values(["Avaliações feitas","Avaliador"], ascending=[False, True]))
-    st.dataframe(rank_av, use_container_width=True)
-
-    pivot_av = (rank_av.pivot(index="Avaliador", columns="Loja", values="Avaliações feitas")
-                        .fillna(0).astype(int))
+    rank_av = rec.ranking_avaliadores()
+    show_table(rank_av, "rank_av", top_n=mobile_config["top_n"])
+
+    pivot_av = pivot_avaliadores(rank_av)
     st.markdown("#### 🔄 Distribuição por loja (avaliadores x lojas)")
-    st.dataframe(pivot_av, use_container_width=True)
+    show_table(pivot_av, "pivot_av")
 
     try:
         import altair as alt
-        chart_av = alt.Chart(rank_av).mark_bar().encode(
-            x=alt.X("Avaliador:N", sort="-y"),
-            y=alt.Y("Avaliações feitas:Q"),
-            color="Loja:N",
-            tooltip=["Avaliador","Região","Loja","Avaliações feitas"]
-        ).properties(height=380)
-        st.altair_chart(chart_av, use_container_width=True)
+        with span("grafico_avaliadores"):
+            if is_mobile:
+                # Gráfico pequeno: total por avaliador (todas as lojas), só o top N
+                top_av = (rank_av.groupby("Avaliador", as_index=False)["Avaliações feitas"].sum()
+                                 .nlargest(mobile_config["chart_top_n"], "Avaliações feitas"))
+                chart_av = alt.Chart(top_av).mark_bar().encode(
+                    y=alt.Y("Avaliador:N", sort="-x", title=None),
+                    x=alt.X("Avaliações feitas:Q"),
+                ).properties(height=mobile_config["chart_height"])
+            else:
+                chart_av = alt.Chart(rank_av).mark_bar().encode(
+                    x=alt.X("Avaliador:N", sort="-y"),
+                    y=alt.Y("Avaliações feitas:Q"),
+                    color="Loja:N",
+                    tooltip=["Avaliador","Região","Loja","Avaliações feitas"]
+                ).properties(height=380)
+            st.altair_chart(chart_av, width="stretch")
     except Exception:
         pass
 
     st.download_button(
         "Baixar CSV (ranking de avaliadores)",
-        data=rank_av.to_csv(index=False).encode("utf-8-sig"),
+        data=lambda: _csv_payload(dataset_version, filter_key, "ranking_avaliadores", rank_av),
         file_name="ranking_avaliadores.csv",
         mime="text/csv",
+        on_click="ignore",
     )
 else:
     st.info("Sem dados de 'Avaliador' para este filtro.")
@@ -547,205 +437,208 @@ else:
 st.markdown("### ⏰ Volume por hora (por loja)")
 if not df_f.empty and "Hora_num" in df_f.columns:
     # Incluindo Região no volume por hora
-    por_hora = df_f.groupby(["Região","Loja","Hora_num"]).size().reset_index(name="Avaliações")
-    pivot = por_hora.pivot(index="Hora_num", columns="Loja", values="Avaliações").fillna(0).astype(int).sort_index()
-    st.dataframe(pivot, use_container_width=True)
+    por_hora, pivot = rec.volume_por_hora()
+    show_table(pivot, "pivot_hora")
 
     try:
         import altair as alt
-        chart = alt.Chart(por_hora).mark_bar().encode(
-            x=alt.X("Hora_num:O", title="Hora do dia (0–23)"),
-            y=alt.Y("Avaliações:Q"),
-            color="Loja:N",
-            tooltip=["Região","Loja","Hora_num","Avaliações"]
-        ).properties(height=360)
-        st.altair_chart(chart, use_container_width=True)
+        with span("grafico_hora"):
+            if is_mobile:
+                # Gráfico pequeno: total por hora (no máximo 24 barras), sem quebra por loja
+                total_hora = por_hora.groupby("Hora_num", as_index=False)["Avaliações"].sum()
+                chart = alt.Chart(total_hora).mark_bar().encode(
+                    x=alt.X("Hora_num:O", title="Hora"),
+                    y=alt.Y("Avaliações:Q"),
+                ).properties(height=mobile_config["chart_height"])
+            else:
+                chart = alt.Chart(por_hora).mark_bar().encode(
+                    x=alt.X("Hora_num:O", title="Hora do dia (0–23)"),
+                    y=alt.Y("Avaliações:Q"),
+                    color="Loja:N",
+                    tooltip=["Região","Loja","Hora_num","Avaliações"]
+                ).properties(height=360)
+            st.altair_chart(chart, width="stretch")
     except Exception:
         pass
 
     st.download_button(
         "Baixar CSV (volume por hora x loja)",
-        data=por_hora.to_csv(index=False).encode("utf-8-sig"),
+        data=lambda: _csv_payload(dataset_version, filter_key, "volume_por_hora", por_hora),
         file_name="volume_por_hora_por_loja.csv",
         mime="text/csv",
+        on_click="ignore",
     )
 else:
     st.info("Não há dados filtrados para montar o relatório por hora.")
 
 
-def gerar_relatorio_excel_por_loja(df_in: pd.DataFrame) -> bytes:
-    import io
-    # Incluindo Região no relatório Excel
-    base = build_summary(df_in, by_cols=["Colaborador","Região","Loja","Setor"]).copy()
-    base = base.sort_values("Média Geral", ascending=False)
-    cols = ["Colaborador","Região","Loja","Setor","Velocidade","Atendimento","Qualidade","Ajuda","Avaliações","Média Geral"]
-    base = base[[c for c in cols if c in base.columns]]
+st.markdown("### 📈 Tendência (médias móveis de 7 e 28 dias)")
+# Série por dia/semana e variação das últimas 4 semanas contra as 4 anteriores, calculadas
+# sobre um cubo diário em cache por versão do dataset (avaliacao/trends.py)
+nivel_tend = st.radio("Tendência por", options=list(NIVEIS_TENDENCIA), horizontal=True, key="tend_nivel")
+chaves_rotulo = [c for c in NIVEIS_TENDENCIA[nivel_tend] if c != "Região"]
 
-    # Ranking de avaliadores (aba extra)
-    rank_av = (df_in.groupby(["Avaliador","Região","Loja"])
-                    .size()
-                    .reset_index(name="Avaliações feitas")
-                    .sort_values(["Avaliações feitas","Avaliador"], ascending=[False, True]))
+def _rotulo(df: pd.DataFrame) -> pd.Series:
+    return df[chaves_rotulo].astype(str).agg(" · ".join, axis=1)
 
-    buf = io.BytesIO()
+variacoes = maiores_variacoes(dataset, lojas_escopo, filtros, nivel_tend)
+if variacoes.empty:
+    st.info("Poucas avaliações para comparar as últimas 4 semanas do período com as 4 anteriores.")
+    destaques = []
+else:
+    st.caption("Média geral nos 28 dias até o fim do período contra os 28 dias anteriores "
+               "(mínimo de 5 avaliações em cada janela; o filtro de hora não se aplica).")
+    n_top = mobile_config["top_n"] or 10
+    subidas = variacoes[variacoes["Variação"] > 0].head(n_top)
+    quedas = variacoes[variacoes["Variação"] < 0].iloc[::-1].head(n_top)
+    if is_mobile:
+        col_sobe = col_cai = st.container()
+    else:
+        col_sobe, col_cai = st.columns(2)
+    with col_sobe:
+        st.markdown("#### ⬆️ Maiores subidas")
+        show_table(subidas, "tend_sobe")
+    with col_cai:
+        st.markdown("#### ⬇️ Maiores quedas")
+        show_table(quedas, "tend_cai")
+    destaques = _rotulo(pd.concat([subidas.head(3), quedas.head(3)])).tolist()
+
+semanal = st.toggle("Série semanal", value=not is_mobile, key="tend_semanal")
+serie_df = serie_tendencia(dataset, lojas_escopo, filtros, nivel_tend, freq="W" if semanal else "D")
+if not serie_df.empty:
+    serie_df = serie_df.assign(Grupo=_rotulo(serie_df))
+    opcoes = sorted(serie_df["Grupo"].unique())
+    # os destaques vêm das janelas de 28 dias sem filtro de hora: podem não ter linhas na série
+    grupos_sel = st.multiselect(f"{nivel_tend} no gráfico", options=opcoes,
+                                default=[g for g in destaques if g in opcoes] or opcoes[:5], key="tend_grupos")
+    media_sel = st.radio("Média", options=["Média 7d", "Média 28d", "Média"], horizontal=True, key="tend_media",
+                         help="Média = só as avaliações do dia/semana; 7d e 28d = janela móvel até o dia")
     try:
-        import xlsxwriter  # noqa
-        engine = "xlsxwriter"
+        import altair as alt
+        with span("grafico_tendencia"):
+            chart_tend = alt.Chart(serie_df[serie_df["Grupo"].isin(grupos_sel)]).mark_line(point=not is_mobile).encode(
+                x=alt.X("Dia:T", title="Semana" if semanal else "Dia"),
+                y=alt.Y(f"{media_sel}:Q", scale=alt.Scale(zero=False), title=media_sel),
+                color=alt.Color("Grupo:N", title=nivel_tend),
+                tooltip=["Grupo", "Dia:T", "Avaliações", "Média", "Média 7d", "Média 28d"],
+            ).properties(height=mobile_config["chart_height"] if is_mobile else 360)
+            st.altair_chart(chart_tend, width="stretch")
     except Exception:
-        engine = "openpyxl"
-
-    with pd.ExcelWriter(buf, engine=engine) as writer:
-        if engine == "xlsxwriter":
-            workbook  = writer.book
-            header_fmt = workbook.add_format({
-                "bold": True, "bg_color": "#B7B7B7", "font_color": "#000000",
-                "align": "center", "valign": "vcenter", "border": 1,
-            })
-            num2_fmt   = workbook.add_format({"num_format": "0.00", "border": 1, "align": "center", "valign": "vcenter"})
-            int0_fmt   = workbook.add_format({"num_format": "0",    "border": 1, "align": "center", "valign": "vcenter"})
-            text_fmt   = workbook.add_format({"border": 1, "align": "center", "valign": "vcenter"})
-
-            # abas por loja
-            for loja, g in base.groupby("Loja", dropna=False):
-                sheet = str(loja) if pd.notna(loja) else "(Sem Loja)"
-                g = g.copy().sort_values("Média Geral", ascending=False)
-                g.to_excel(writer, index=False, sheet_name=sheet)
-                ws = writer.sheets[sheet]
-
-                widths = {
-                    "Colaborador": 36, "Região": 10, "Loja": 18, "Setor": 20,
-                    "Velocidade": 12, "Atendimento": 12, "Qualidade": 12, "Ajuda": 10,
-                    "Avaliações": 12, "Média Geral": 12,
-                }
-                for c_idx, col_name in enumerate(g.columns):
-                    ws.set_column(c_idx, c_idx, widths.get(col_name, 14), text_fmt)
-                    ws.write(0, c_idx, col_name, header_fmt)
-
-                col_map = {name: idx for idx, name in enumerate(g.columns)}
-                for nm in ["Velocidade","Atendimento","Qualidade","Ajuda","Média Geral"]:
-                    if nm in col_map:
-                        ws.set_column(col_map[nm], col_map[nm], widths.get(nm, 12), num2_fmt)
-                if "Avaliações" in col_map:
-                    ws.set_column(col_map["Avaliações"], col_map["Avaliações"], widths.get("Avaliações", 10), int0_fmt)
-
-                ws.autofilter(0, 0, len(g), len(g.columns)-1)
-                ws.freeze_panes(1, 0)
-                for r in range(1, len(g)+1): ws.set_row(r, 18)
-
-                if "Média Geral" in col_map:
-                    c = col_map["Média Geral"]
-                    ws.conditional_format(1, c, len(g), c, {
-                        "type": "3_color_scale",
-                        "min_color": "#FCA5A5", "mid_color": "#FDE68A", "max_color": "#86EFAC",
-                    })
-
-            # aba extra: avaliadores
-            sheet = "Avaliadores"
-            rank_av.to_excel(writer, index=False, sheet_name=sheet)
-            ws = writer.sheets[sheet]
-            for c_idx, col_name in enumerate(rank_av.columns):
-                ws.set_column(c_idx, c_idx, 24 if col_name in ["Avaliador","Loja"] else 18, text_fmt)
-                ws.write(0, c_idx, col_name, header_fmt)
-            if "Avaliações feitas" in rank_av.columns:
-                ci = list(rank_av.columns).index("Avaliações feitas")
-                ws.set_column(ci, ci, 18, int0_fmt)
-            ws.autofilter(0, 0, len(rank_av), max(0, len(rank_av.columns)-1))
-            ws.freeze_panes(1, 0)
+        pass
+
+    st.download_button(
+        "Baixar CSV (tendência)",
+        data=lambda: _csv_payload(dataset_version, filter_key, f"tendencia_{nivel_tend}_{semanal}",
+                                  serie_df.drop(columns="Grupo")),
+        file_name=f"tendencia_por_{nivel_tend.lower()}.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
 
-        else:
-            from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-            from openpyxl.formatting.rule import ColorScaleRule
-
-            # abas por loja
-            for loja, g in base.groupby("Loja", dropna=False):
-                sheet = str(loja) if pd.notna(loja) else "(Sem Loja)"
-                g = g.copy().sort_values("Média Geral", ascending=False)
-                g.to_excel(writer, index=False, sheet_name=sheet)
-                ws = writer.sheets[sheet]
-
-                header_fill = PatternFill("solid", fgColor="B7B7B7")
-                header_font = Font(bold=True, color="000000")
-                thin = Side(style="thin", color="000000")
-                border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-                for cell in ws[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                    cell.border = border
-
-                for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-                    for cell in row:
-                        cell.border = border
-                        cell.alignment = Alignment(horizontal="center", vertical="center")
-
-                widths = {
-                    "Colaborador": 36, "Região": 10, "Loja": 18, "Setor": 20,
-                    "Velocidade": 12, "Atendimento": 12, "Qualidade": 12, "Ajuda": 10,
-                    "Avaliações": 12, "Média Geral": 12,
-                }
-                for i, col in enumerate(g.columns, start=1):
-                    ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = widths.get(col, 14)
-
-                ws.auto_filter.ref = ws.dimensions
-                ws.freeze_panes = "A2"
-
-                try:
-                    mg_col = list(g.columns).index("Média Geral") + 1
-                    ws.conditional_formatting.add(
-                        f"{ws.cell(row=2, column=mg_col).coordinate}:{ws.cell(row=ws.max_row, column=mg_col).coordinate}",
-                        ColorScaleRule(start_type='min', start_color='FCA5A5',
-                                       mid_type='percentile', mid_value=50, mid_color='FDE68A',
-                                       end_type='max', end_color='86EFAC')
-                    )
-                except ValueError:
-                    pass
-
-            # aba extra: avaliadores
-            sheet = "Avaliadores"
-            rank_av.to_excel(writer, index=False, sheet_name=sheet)
-            ws = writer.sheets[sheet]
-            header_fill = PatternFill("solid", fgColor="B7B7B7")
-            header_font = Font(bold=True, color="000000")
-            thin = Side(style="thin", color="000000")
-            border = Border(left=thin, right=thin, top=thin, bottom=thin)
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = border
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-                for cell in row:
-                    cell.border = border
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-            for i, col in enumerate(rank_av.columns, start=1):
-                ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = 24 if col in ["Avaliador","Loja"] else 18
-            ws.auto_filter.ref = ws.dimensions
-            ws.freeze_panes = "A2"
-
-    buf.seek(0)
-    return buf.getvalue()
 
 st.markdown("---")
 st.subheader("📄 Exportar relatório por loja (Excel)")
-if st.button("⬇️ Gerar relatório Excel (uma aba por loja + Avaliadores)"):
-    xlsx_bytes = gerar_relatorio_excel_por_loja(df_f)
-    st.download_button(
-        label="Baixar relatório.xlsx",
-        data=xlsx_bytes,
-        file_name="relatorio_por_loja.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+st.download_button(
+    label="⬇️ Baixar relatório.xlsx (uma aba por loja + Avaliadores)",
+    data=lambda: relatorio_excel_bytes(df_f, dataset_version, filter_key),
+    file_name="relatorio_por_loja.xlsx",
+    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    on_click="ignore",
+    disabled=df_f.empty,
+)
+
+st.subheader("🗃️ Exportar avaliações filtradas (BI)")
+formato_dados = st.selectbox(
+    "Formato", options=list(FORMATOS),
+    format_func={"parquet": "Parquet", "arrow": "Arrow IPC (Feather)", "csv.zip": "CSV zipado"}.get,
+    help="Linhas filtradas com tipos preservados (categorias e datas) para Power BI, pandas, DuckDB etc.",
+)
+ext_dados, mime_dados = FORMATOS[formato_dados]
+st.download_button(
+    label=f"⬇️ Baixar avaliações filtradas ({len(df_f)} linhas)",
+    # Gerado só no clique, em disco, e reaproveitado por (versão do dataset, filtro, formato)
+    data=lambda: bytes_exportacao(df_f, formato_dados, dataset_version, filter_key),
+    file_name=f"avaliacoes_filtradas.{ext_dados}",
+    mime=mime_dados,
+    on_click="ignore",
+    disabled=df_f.empty,
+)
 
 with st.expander("ℹ️ Dicas e validações"):
     st.markdown(
         """
 - **Vazios contam como 0** nas colunas de nota.
-- **Colaborador vazio** é ignorado.
+- **Colaborador vazio** é ignorado (administradores veem as linhas em 🧪 Qualidade dos dados).
 - A coluna **Data** é interpretada como **dd/mm/aaaa** (com ou sem hora).
 - Em **Google Sheets**, cada **aba** vira uma **Loja**.
 - Filtro de **hora** permite ver horários mais ativos por loja.
 - Coluna **M = Avaliador** permite acompanhar quem mais avalia.
-- **Filtro de Região**: RJ (Carioca, Santa Cruz, Mesquita, Nilópolis, Madureira, Bonsucesso) e SP (Taboão, São Bernardo, Santo André, Mauá, MDC São Mateus, CDM São Mateus).
-        """
+- **Filtro de Região**: {regioes_txt}.
+        """.format(regioes_txt=" e ".join(f"{r} ({', '.join(lojas)})" for r, lojas in lojas_por_regiao().items()))
     )
+
+# Painel de desempenho (só administradores): p50/p95 por etapa nos últimos reruns do processo
+if current_user['role'] == 'admin':
+    with st.expander("⏱️ Desempenho"):
+        n_runs = st.slider("Últimos reruns", min_value=5, max_value=200, value=50, step=5, key="perf_runs")
+        stats = stage_stats(last_runs=n_runs)
+        if stats:
+            st.dataframe(pd.DataFrame(stats), width="stretch", hide_index=True)
+            st.caption("Rerun atual (até este painel):")
+            atual = records(last_runs=1)
+            st.dataframe(pd.DataFrame(atual)[["stage", "ms", "rows", "mem_delta_kb"]],
+                         width="stretch", hide_index=True)
+        else:
+            st.info("Ainda não há medições.")
+        caches = cache_stats()
+        if caches:
+            st.caption("Caches (desde o início do processo):")
+            st.dataframe(pd.DataFrame(caches), width="stretch", hide_index=True)
+        if st.button("Limpar medições", key="perf_reset"):
+            reset_perf()
+            st.rerun()
+
+
+# Painel de qualidade (só administradores): o relatório já vem pronto da carga do dataset,
+# e como fragmento os filtros do painel só rodam este trecho, não o app inteiro
+@st.fragment
+def painel_qualidade(qualidade, versao: str):
+    with st.expander("🧪 Qualidade dos dados"):
+        if qualidade is None:
+            st.info("Sem relatório de qualidade para esta carga.")
+            return
+        totais = qualidade.totais()
+        cols = st.columns(2 if is_mobile else 4)
+        for i, nome in enumerate(("Lidas", "Aceitas", "Descartadas", "Com alerta")):
+            cols[i % len(cols)].metric(nome, totais[nome])
+        if totais["Abas ignoradas"]:
+            st.warning(f"{totais['Abas ignoradas']} aba(s) ignorada(s): colunas não mapeiam no layout A–M")
+        st.caption(f"Por aba (versão {versao}); descartadas saem do dataset, com alerta ficam:")
+        st.dataframe(qualidade.abas, width="stretch", hide_index=True)
+
+        quarentena = qualidade.quarentena
+        motivos_sel = st.multiselect("Motivos", options=list(REGRAS), format_func=lambda c: REGRAS[c][0],
+                                     key="qualidade_motivos")
+        if motivos_sel:
+            por_motivo = quarentena["Motivos"].str.split(", ")
+            quarentena = quarentena[por_motivo.map(lambda m: bool(set(m) & set(motivos_sel)))]
+        if quarentena.empty:
+            st.info("Nenhuma linha em quarentena.")
+        else:
+            st.caption("Quarentena: valores como estão na planilha (as primeiras linhas de cada motivo por aba)")
+            st.dataframe(quarentena, width="stretch", hide_index=True)
+            st.download_button(
+                label="⬇️ Baixar quarentena.csv",
+                data=lambda: _csv_payload(versao, ",".join(motivos_sel), "quarentena", quarentena),
+                file_name=f"quarentena_{versao}.csv",
+                mime="text/csv",
+                on_click="ignore",
+            )
+        versoes = historico_versoes()
+        if len(versoes) > 1:
+            st.caption("Últimas cargas deste processo:")
+            st.dataframe(versoes, width="stretch", hide_index=True)
+
+
+if current_user['role'] == 'admin':
+    painel_qualidade(dataset.qualidade, dataset_version)
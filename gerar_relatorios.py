@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Gera em lote os relatórios Excel (um por loja e um por região), sem abrir o navegador.
+
+Carrega as planilhas de fontes.toml pelo mesmo pipeline do app (pacote avaliacao) e
+distribui a geração dos relatórios num pool de processos. Na pasta de saída ficam os .xlsx e um
+manifest.json com a versão do dataset, os filtros usados e o tempo de cada relatório.
+
+Exemplos:
+    python gerar_relatorios.py --saida relatorios/
+    python gerar_relatorios.py --saida relatorios/ --de 01/09/2025 --ate 07/09/2025 --workers 4
+    python gerar_relatorios.py --saida relatorios/ --lojas Carioca Mauá --sem-regioes
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from avaliacao import aplicar_filtros, com_historico, gerar_relatorio_excel_por_loja, get_dataset_federado, load_dataset
+
+
+def _slug(nome: str) -> str:
+    """Nome de arquivo seguro: sem acentos, espaços viram _"""
+    s = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^A-Za-z0-9]+", "_", s).strip("_").lower() or "sem_nome"
+
+
+def _parse_data(valor: Optional[str]):
+    if not valor:
+        return None
+    return datetime.strptime(valor, "%d/%m/%Y").date()
+
+
+def planejar_relatorios(data: pd.DataFrame, lojas: Optional[List[str]] = None,
+                        regioes: bool = True) -> List[Tuple[str, str, pd.DataFrame]]:
+    """Lista (tipo, nome, fatia) de cada relatório a gerar"""
+    jobs: List[Tuple[str, str, pd.DataFrame]] = []
+    for loja, g in data.groupby("Loja", sort=True):
+        if lojas and loja not in lojas:
+            continue
+        jobs.append(("loja", loja, g))
+    if regioes:
+        base = data[data["Loja"].isin(lojas)] if lojas else data
+        for regiao, g in base.groupby("Região", sort=True):
+            jobs.append(("regiao", regiao, g))
+    return jobs
+
+
+def nomes_arquivos(jobs: List[Tuple[str, str, pd.DataFrame]]) -> List[str]:
+    """Nome do .xlsx de cada relatório; nomes que dão o mesmo slug ganham _2, _3...
+
+    ("Mauá" e "Maua" virariam o mesmo arquivo e um relatório sobrescreveria o outro)
+    """
+    usados = set()
+    out = []
+    for tipo, nome, _ in jobs:
+        base = f"{tipo}_{_slug(nome)}"
+        arquivo, n = f"{base}.xlsx", 1
+        while arquivo in usados:
+            n += 1
+            arquivo = f"{base}_{n}.xlsx"
+        usados.add(arquivo)
+        out.append(arquivo)
+    return out
+
+
+def _gerar_um(tipo: str, nome: str, df: pd.DataFrame, arquivo: str, saida: str, engine: Optional[str]) -> Dict:
+    """Executado em um processo do pool: gera um relatório e mede o tempo"""
+    path = os.path.join(saida, arquivo)
+    t0 = time.perf_counter()
+    gerar_relatorio_excel_por_loja(df, path=path, engine=engine)
+    return {
+        "tipo": tipo,
+        "nome": nome,
+        "arquivo": arquivo,
+        "linhas": int(len(df)),
+        "lojas": sorted(df["Loja"].dropna().unique().tolist()),
+        "segundos": round(time.perf_counter() - t0, 3),
+        "bytes": os.path.getsize(path),
+        "pid": os.getpid(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gera os relatórios Excel por loja e por região em lote")
+    parser.add_argument("--saida", required=True, help="Pasta onde os relatórios e o manifest.json são gravados")
+    parser.add_argument("--planilha", help="URL ou ID de uma planilha (padrão: as fontes do app, fontes.toml)")
+    parser.add_argument("--de", help="Data inicial dd/mm/aaaa")
+    parser.add_argument("--ate", help="Data final dd/mm/aaaa")
+    parser.add_argument("--lojas", nargs="*", help="Gerar só estas lojas (padrão: todas)")
+    parser.add_argument("--sem-regioes", action="store_true", help="Não gerar os relatórios por região")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processos em paralelo")
+    parser.add_argument("--engine", choices=["xlsxwriter", "openpyxl"], help="Engine do Excel")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.saida, exist_ok=True)
+    inicio = time.perf_counter()
+
+    print("Carregando planilha...")
+    t0 = time.perf_counter()
+    d_ini, d_fim = _parse_data(args.de), _parse_data(args.ate)
+    if d_ini and not d_fim:
+        d_fim = datetime.today().date()  # só --de: até hoje
+    dataset = load_dataset(args.planilha) if args.planilha else get_dataset_federado()
+    # meses do histórico arquivado que o período cobre (só --ate: todos)
+    dataset = com_historico(dataset, d_ini, d_fim)
+    version, data, avisos = dataset.version, dataset.data, dataset.avisos
+    t_carga = time.perf_counter() - t0
+    for aviso in avisos:
+        print(f"AVISO: {aviso}")
+    if data.empty:
+        print("Nenhum dado carregado.")
+        return 1
+
+    if d_fim:
+        # mesmo filtro de período do app (dias inteiros, inclusive); só --ate: desde o início
+        data = aplicar_filtros(data, d_ini or data["Data"].min().date(), d_fim)
+    jobs = planejar_relatorios(data, args.lojas, regioes=not args.sem_regioes)
+    arquivos = nomes_arquivos(jobs)
+    print(f"Dataset {version}: {len(data)} linhas, {len(jobs)} relatório(s), {args.workers} processo(s)")
+
+    relatorios: List[Dict] = []
+    erros: List[Dict] = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(_gerar_um, tipo, nome, df, arquivo, args.saida, args.engine): (tipo, nome)
+            for (tipo, nome, df), arquivo in zip(jobs, arquivos)
+        }
+        for fut in as_completed(futures):
+            tipo, nome = futures[fut]
+            try:
+                r = fut.result()
+                relatorios.append(r)
+                print(f"  OK  {r['arquivo']:<40} {r['linhas']:>8} linhas  {r['segundos']:>7.2f}s")
+            except Exception as e:
+                erros.append({"tipo": tipo, "nome": nome, "erro": f"{type(e).__name__}: {e}"})
+                print(f"  ERRO {tipo} {nome}: {e}")
+
+    relatorios.sort(key=lambda r: (r["tipo"], r["nome"]))
+    manifest = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "dataset_version": version,
+        "planilha": args.planilha or "fontes.toml",
+        "filtros": {"de": str(d_ini) if d_ini else None, "ate": str(d_fim) if d_fim else None,
+                    "lojas": args.lojas or None},
+        "linhas": int(len(data)),
+        "workers": args.workers,
+        "segundos_carga": round(t_carga, 3),
+        "segundos_total": round(time.perf_counter() - inicio, 3),
+        "relatorios": relatorios,
+        "erros": erros,
+        "avisos": avisos,
+    }
+    with open(os.path.join(args.saida, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"{len(relatorios)} relatório(s) em {manifest['segundos_total']:.1f}s -> {args.saida}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Teste de carga local: N sessões simultâneas do colab.py com o backend falso do Sheets.
+
+Simula a segunda-feira de manhã: cada sessão abre a página de login, entra com um
+usuário (mistura de administradores e lojas), faz mudanças aleatórias de filtro e, de
+vez em quando, exporta o relatório Excel pelo botão do app. Cada sessão é um AppTest do
+Streamlit num processo próprio (o AppTest não é thread-safe: o runtime falso dele é
+global), como réplicas de um mesmo host: o dataset vem do snapshot compartilhado
+(AVALIACAO_SNAPSHOT_DIR, ver avaliacao/shared.py) e os arquivos de exportação em disco
+são os mesmos para todas. Os caches em memória (st.cache_data, relatórios) são de cada
+processo, então as taxas de acerto somam as sessões.
+
+No fim mostra, por ação, p50/p95/p99/máx da latência do rerun, o RSS dos processos, a
+taxa de acerto de cada cache e as requisições feitas ao Sheets falso.
+
+Os usuários vêm de um cadastro temporário gerado a partir das lojas do usuarios.toml
+(senha "carga"), para exercitar o login de verdade (bcrypt no pool).
+
+Exemplos:
+    python load_harness.py --sessoes 20 --acoes 10
+    python load_harness.py --sessoes 50 --frac-admin 0.1 --linhas 200000 --latencia 0.3 --saida carga.json
+
+A exportação clica no botão do relatório Excel e executa o gerador que o colab.py
+registrou para ele (o que o servidor faz no clique): no AppTest não há servidor de mídia
+para baixar o arquivo de verdade.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SENHA = "carga"
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colab.py")
+ROTULO_EXPORT = "⬇️ Baixar relatório.xlsx"
+
+
+def _toml_str(s: str) -> str:
+    return json.dumps(s, ensure_ascii=False)  # string JSON é string TOML válida
+
+
+def escrever_cadastro(store_regions: Dict[str, str], n_admins: int, password_hash: str, dest: str) -> Dict[str, List[str]]:
+    """Cadastro de carga: n_admins administradores e um usuário por loja; retorna {papel: [usuários]}"""
+    linhas = ["[lojas]"]
+    linhas += [f"{_toml_str(loja)} = {_toml_str(regiao)}" for loja, regiao in store_regions.items()]
+    usuarios: Dict[str, List[str]] = {"admin": [], "store": []}
+    for i in range(n_admins):
+        nome = f"carga_admin_{i}"
+        usuarios["admin"].append(nome)
+        linhas += ["", f"[usuarios.{nome}]", f"password_hash = {_toml_str(password_hash)}", 'role = "admin"']
+    for i, loja in enumerate(store_regions):
+        nome = f"carga_loja_{i}"
+        usuarios["store"].append(nome)
+        linhas += ["", f"[usuarios.{nome}]", f"password_hash = {_toml_str(password_hash)}", 'role = "store"',
+                   f"lojas = [{_toml_str(loja)}]"]
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+    return usuarios
+
+
+class Coletor:
+    """Latências por ação e erros de uma sessão"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = {}
+        self.erros: List[str] = []
+
+    def add(self, acao: str, segundos: float):
+        self.latencias.setdefault(acao, []).append(segundos)
+
+    def erro(self, msg: str):
+        self.erros.append(msg)
+
+
+class MonitorRSS(threading.Thread):
+    """Amostra o RSS do processo a cada `intervalo` segundos"""
+
+    def __init__(self, intervalo: float = 0.5):
+        super().__init__(daemon=True)
+        from avaliacao.perf import rss_kb
+        self._rss_kb = rss_kb
+        self.intervalo = intervalo
+        self.inicio = rss_kb()
+        self.pico = self.inicio
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, self._rss_kb())
+
+    def parar(self) -> Dict:
+        self._parar.set()
+        fim = self._rss_kb()
+        self.pico = max(self.pico, fim)
+        return {"inicio_mb": round(self.inicio / 1024, 1), "pico_mb": round(self.pico / 1024, 1),
+                "fim_mb": round(fim / 1024, 1), "crescimento_mb": round((fim - self.inicio) / 1024, 1)}
+
+
+def _capturar_midia():
+    """Guarda o MediaFileManager de cada AppTest.run(), que o descarta no fim do rerun
+
+    É nele que o download_button registra o gerador (data=lambda: ...) do arquivo; o
+    servidor o executa no clique, e aqui executar_download() faz o mesmo.
+    """
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.testing.v1 import app_test
+
+    class _Capturado(MediaFileManager):
+        ultimo: Optional[MediaFileManager] = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            _Capturado.ultimo = self
+
+    app_test.MediaFileManager = _Capturado
+    return _Capturado
+
+
+def _mudar_filtro(at, rng: random.Random, user: Dict) -> str:
+    """Aplica uma mudança aleatória de filtro na barra lateral; retorna qual"""
+    por_rotulo = {w.label: w for w in list(at.sidebar.selectbox) + list(at.sidebar.multiselect)}
+    opcoes = ["periodo", "setor", "hora"]
+    if user["role"] == "admin":
+        opcoes += ["regiao", "loja"]
+    escolha = rng.choice(opcoes)
+    if escolha == "periodo":
+        di = at.sidebar.date_input[0]
+        lo, hi = di.min, di.max
+        dias = (hi - lo).days
+        ini = lo + timedelta(days=rng.randint(0, max(dias - 1, 0)))
+        fim = min(hi, ini + timedelta(days=rng.choice([0, 6, 29])))
+        di.set_value((ini, fim))
+    elif escolha == "setor":
+        ms = por_rotulo["Filtrar por setor"]
+        ms.set_value(rng.sample(ms.options, rng.randint(1, len(ms.options))) if rng.random() < 0.7 else ms.options)
+    elif escolha == "hora":
+        a = rng.randint(0, 20)
+        at.sidebar.slider[0].set_range(a, rng.randint(a + 1, 23))
+    elif escolha == "regiao":
+        sb = por_rotulo["Filtrar por região"]
+        sb.set_value(rng.choice(sb.options))
+    else:
+        sb = por_rotulo["Ver loja específica"]
+        sb.set_value(rng.choice(sb.options))
+    return escolha
+
+
+def _rodar_sessao(idx: int, user: str, user_data: Dict, args, coletor: Coletor, midia) -> None:
+    """Login e `args.acoes` ações (filtro ou exportação) com pausas entre elas"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(args.seed * 1000 + idx)
+
+    def rodar(at, acao: str) -> bool:
+        t0 = time.perf_counter()
+        at.run()
+        coletor.add(acao, time.perf_counter() - t0)
+        if at.exception:
+            coletor.erro(f"sessão {idx} ({user}) {acao}: {at.exception[0].value}")
+            return False
+        return True
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    if rng.random() < args.frac_mobile:
+        at.query_params["mobile"] = "1"
+    if not rodar(at, "pagina_login"):
+        return
+    at.text_input[0].input(user)
+    at.text_input[1].input(SENHA)
+    next(b for b in at.button if b.label == "Entrar").click()
+    if not rodar(at, "login") or not at.sidebar.date_input:
+        coletor.erro(f"sessão {idx} ({user}): login não chegou ao dashboard")
+        return
+
+    for _ in range(args.acoes):
+        time.sleep(rng.uniform(0, args.pausa))
+        if rng.random() < args.frac_export:
+            # o clique no botão do colab.py: o gerador registrado no último rerun, com o
+            # recorte, a versão e a chave de filtro da própria sessão
+            botao = next(b for b in at.download_button if b.label.startswith(ROTULO_EXPORT))
+            if not botao.proto.deferred_file_id:
+                continue  # filtro sem linhas: botão desabilitado
+            t0 = time.perf_counter()
+            midia.ultimo.execute_deferred(botao.proto.deferred_file_id)
+            coletor.add("export_excel", time.perf_counter() - t0)
+        else:
+            _mudar_filtro(at, rng, user_data)
+            if not rodar(at, "filtro"):
+                return
+
+
+def sessao(idx: int, user: str, user_data: Dict, args, largada, fila) -> None:
+    """Uma sessão num processo próprio; manda latências, erros, RSS e contadores para `fila`"""
+    from streamlit.logger import set_log_level
+
+    from avaliacao import perf, sources, warmup
+
+    set_log_level("error")
+    coletor = Coletor()
+    monitor = None
+    try:
+        midia = _capturar_midia()
+        # processo já aquecido (imports e snapshot aberto), como uma réplica que já atendeu alguém
+        warmup.iniciar()
+        warmup.aguardar()
+        perf.reset()
+        monitor = MonitorRSS()
+        monitor.start()
+        largada.wait(args.timeout)
+        time.sleep(random.Random(args.seed * 1000 + idx).uniform(0, args.rampa))
+        _rodar_sessao(idx, user, user_data, args, coletor, midia)
+    except Exception as e:
+        coletor.erro(f"sessão {idx} ({user}): {type(e).__name__}: {e}")
+    finally:
+        cliente = sources._sheets_client  # só existe se este processo precisou buscar a planilha
+        fila.put({"latencias": coletor.latencias, "erros": coletor.erros,
+                  "rss": monitor.parar() if monitor else None, "contadores": perf.counters(),
+                  "sheets": cliente.stats() if cliente else None})
+
+
+def _percentis(valores: List[float]) -> Dict:
+    a = np.asarray(valores)
+    return {"n": len(a), "p50_s": round(float(np.percentile(a, 50)), 3), "p95_s": round(float(np.percentile(a, 95)), 3),
+            "p99_s": round(float(np.percentile(a, 99)), 3), "max_s": round(float(a.max()), 3)}
+
+
+def _coletar(fila, processos: List, timeout: float) -> List[Dict]:
+    """Resultados das sessões; para quando todas responderam ou não há mais processo vivo"""
+    resultados = []
+    while len(resultados) < len(processos):
+        try:
+            resultados.append(fila.get(timeout=min(timeout, 1.0)))
+        except queue.Empty:
+            if not any(p.is_alive() for p in processos) and fila.empty():
+                break
+    for p in processos:
+        p.join()
+    return resultados
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga local do dashboard (sessões simultâneas)")
+    parser.add_argument("--sessoes", type=int, default=20, help="Sessões simultâneas (um processo cada)")
+    parser.add_argument("--acoes", type=int, default=8, help="Ações (filtro/exportação) por sessão após o login")
+    parser.add_argument("--frac-admin", type=float, default=0.2, help="Fração de sessões de administrador")
+    parser.add_argument("--frac-export", type=float, default=0.1, help="Probabilidade de cada ação ser uma exportação Excel")
+    parser.add_argument("--frac-mobile", type=float, default=0.3, help="Fração de sessões no modo mobile")
+    parser.add_argument("--rampa", type=float, default=5.0, help="Segundos para todas as sessões começarem")
+    parser.add_argument("--pausa", type=float, default=1.0, help="Pausa máxima entre ações (tempo de leitura)")
+    parser.add_argument("--linhas", type=int, default=50_000, help="Avaliações sintéticas no total")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência por requisição do Sheets falso (s)")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração de requisições do Sheets falso com 429")
+    parser.add_argument("--timeout", type=float, default=600, help="Timeout de cada rerun (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", help="Grava o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    # cadastro de carga: mesmas lojas do usuarios.toml, senha conhecida
+    import bcrypt
+
+    from avaliacao import user_registry
+    lojas = user_registry.load_registry(user_registry.REGISTRY_PATH).store_regions
+    n_admin = round(args.sessoes * args.frac_admin)
+    fd, cadastro = tempfile.mkstemp(prefix="usuarios_carga_", suffix=".toml")
+    os.close(fd)
+    snapshot_dir = None if os.environ.get("AVALIACAO_SNAPSHOT_DIR") else tempfile.mkdtemp(prefix="snapshot_carga_")
+    hash_carga = bcrypt.hashpw(SENHA.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    usuarios = escrever_cadastro(lojas, max(1, n_admin), hash_carga, cadastro)
+    try:
+        # os processos das sessões herdam o ambiente: cadastro de carga, Sheets falso com
+        # a mesma planilha (gerada de novo só se um deles precisar buscá-la) e snapshot do host
+        dias = 90
+        os.environ["AVALIACAO_USUARIOS"] = cadastro
+        os.environ["AVALIACAO_SHEETS_BACKEND"] = "fake"
+        os.environ["AVALIACAO_FAKE_SHEETS"] = json.dumps({
+            "lojas": list(lojas), "dias": dias, "linhas_por_dia": max(1, round(args.linhas / (len(lojas) * dias))),
+            "seed": args.seed, "latencia": args.latencia, "taxa_429": args.taxa_429, "seed_erros": args.seed,
+        })
+        if snapshot_dir:
+            os.environ["AVALIACAO_SNAPSHOT_DIR"] = snapshot_dir
+        user_registry.REGISTRY_PATH = cadastro
+
+        from avaliacao import get_dataset_federado, perf, shared, sources
+
+        print(f"Gerando {args.linhas} linhas sintéticas...", flush=True)
+        dataset = get_dataset_federado()  # publica o snapshot que as sessões vão abrir
+        if not shared.ativo():
+            print("Aviso: sem snapshot compartilhado (fcntl indisponível); cada sessão carrega a planilha sozinha")
+
+        registro = user_registry.get_registry()
+        rng = random.Random(args.seed)
+        plano = []
+        for i in range(args.sessoes):
+            nome = usuarios["admin"][i % len(usuarios["admin"])] if i < n_admin else rng.choice(usuarios["store"])
+            plano.append((i, nome, registro.get(nome)))
+
+        print(f"{args.sessoes} sessões ({n_admin} admin), "
+              f"{args.acoes} ações cada, dataset {dataset.version} com {len(dataset)} linhas", flush=True)
+        ctx = multiprocessing.get_context("spawn")  # processo limpo, sem threads herdadas do pai
+        fila = ctx.Queue()
+        largada = ctx.Barrier(args.sessoes + 1)
+        processos = [ctx.Process(target=sessao, args=(i, nome, u, args, largada, fila), daemon=True)
+                     for i, nome, u in plano]
+        for p in processos:
+            p.start()
+        try:
+            largada.wait(args.timeout)  # todas aquecidas
+        except Exception:
+            pass  # alguma sessão morreu antes da largada: o erro dela aparece no relatório
+        t0 = time.perf_counter()
+        resultados = _coletar(fila, processos, args.timeout)
+        duracao = time.perf_counter() - t0
+
+        latencias: Dict[str, List[float]] = {}
+        erros: List[str] = []
+        contadores: Counter = Counter()
+        sheets = {"requests": Counter(), "total": 0, "erros_429": 0}
+        rss = []
+        for r in resultados:
+            for acao, v in r["latencias"].items():
+                latencias.setdefault(acao, []).extend(v)
+            erros.extend(r["erros"])
+            contadores.update(r["contadores"])
+            if r["sheets"]:
+                sheets["requests"].update(r["sheets"]["requests"])
+                sheets["total"] += r["sheets"]["total"]
+                sheets["erros_429"] += r["sheets"]["erros_429"]
+            if r["rss"]:
+                rss.append(r["rss"])
+        if len(resultados) < len(processos):
+            erros.append(f"{len(processos) - len(resultados)} sessão(ões) terminaram sem resultado "
+                         f"(códigos de saída: {[p.exitcode for p in processos]})")
+        # taxas de acerto com os contadores somados de todas as sessões
+        perf.reset()
+        for nome, n in contadores.items():
+            perf.incr(nome, n)
+
+        relatorio = {
+            "sessoes": args.sessoes,
+            "acoes_por_sessao": args.acoes,
+            "linhas": len(dataset),
+            "segundos_total": round(duracao, 1),
+            "latencia": {acao: _percentis(v) for acao, v in sorted(latencias.items())},
+            "rss": {
+                "processos": len(rss),
+                "pico_max_mb": max((r["pico_mb"] for r in rss), default=0),
+                "pico_medio_mb": round(float(np.mean([r["pico_mb"] for r in rss])), 1) if rss else 0,
+                "crescimento_medio_mb": round(float(np.mean([r["crescimento_mb"] for r in rss])), 1) if rss else 0,
+            },
+            "caches": perf.cache_stats(),
+            "sheets": {**sheets, "requests": dict(sheets["requests"])},
+            "erros": erros,
+        }
+
+        print(f"\nConcluído em {duracao:.1f}s")
+        print(f"\n{'ação':<16}{'n':>6}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'máx s':>9}")
+        for acao, p in relatorio["latencia"].items():
+            print(f"{acao:<16}{p['n']:>6}{p['p50_s']:>9.3f}{p['p95_s']:>9.3f}{p['p99_s']:>9.3f}{p['max_s']:>9.3f}")
+        r = relatorio["rss"]
+        print(f"\nRSS por sessão ({r['processos']} processos): pico médio {r['pico_medio_mb']} MB, "
+              f"maior pico {r['pico_max_mb']} MB, crescimento médio +{r['crescimento_medio_mb']} MB")
+        print("\nCaches (somados entre as sessões):")
+        for c in relatorio["caches"]:
+            taxa = f"{c['taxa_acerto'] * 100:.1f}%" if c["taxa_acerto"] is not None else "-"
+            print(f"  {c['cache']:<12} {c['chamadas']:>6} chamadas  {c['misses']:>5} misses  acerto {taxa}")
+        print(f"\nSheets falso (sessões): {sheets['total']} requisições, {sheets['erros_429']} com 429")
+        if erros:
+            print(f"\n{len(erros)} erro(s):")
+            for e in erros[:10]:
+                print(f"  {e}")
+
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(relatorio, f, ensure_ascii=False, indent=2, default=str)
+        return 1 if erros else 0
+    finally:
+        os.remove(cadastro)
+        if snapshot_dir:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
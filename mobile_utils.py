@@ -1,31 +1,51 @@
 # mobile_utils.py — Utilitários para otimização mobile
+import re
+
 import streamlit as st
-import streamlit.components.v1 as components
+
+# Padrões de user agent de celulares/tablets
+MOBILE_UA_RE = re.compile(
+    r"Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini|Mobile|Silk|Kindle",
+    re.IGNORECASE,
+)
+
+def _get_request_headers() -> dict:
+    """Retorna os headers HTTP da sessão atual (vazio se indisponível)"""
+    try:
+        ctx = getattr(st, "context", None)
+        if ctx is not None:
+            return {k.lower(): v for k, v in ctx.headers.items()}
+        # Streamlit < 1.37
+        from streamlit.web.server.websocket_headers import _get_websocket_headers
+        headers = _get_websocket_headers() or {}
+        return {k.lower(): v for k, v in headers.items()}
+    except Exception:
+        return {}
+
+def is_mobile_user_agent(headers: dict) -> bool:
+    """Decide pelo lado do servidor se a requisição vem de um dispositivo móvel"""
+    # Client Hints (Chrome/Edge no Android): "?1" = mobile
+    if headers.get("sec-ch-ua-mobile", "").strip() == "?1":
+        return True
+    return bool(MOBILE_UA_RE.search(headers.get("user-agent", "")))
 
 def detect_mobile():
-    """Detecta se o usuário está em um dispositivo móvel"""
+    """Detecta se o usuário está em um dispositivo móvel (via headers da requisição)"""
+    # ?mobile=1 / ?mobile=0 força o modo (útil para testes e para quem prefere a versão completa)
     try:
-        # Verificar se há informações sobre o user agent
-        if hasattr(st, 'session_state') and 'mobile_detected' in st.session_state:
-            return st.session_state.mobile_detected
-        
-        # JavaScript para detectar mobile
-        mobile_js = """
-        <script>
-        function isMobile() {
-            return /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent) ||
-                   window.innerWidth <= 768;
-        }
-        window.parent.postMessage({type: 'mobile_detection', isMobile: isMobile()}, '*');
-        </script>
-        """
-        
-        # Usar componente para executar JavaScript
-        components.html(mobile_js, height=0)
-        
-        return False  # Default para desktop
-    except:
-        return False
+        forced = st.query_params.get("mobile")
+    except Exception:
+        forced = None
+    if forced in ("0", "1"):
+        st.session_state.mobile_detected = forced == "1"
+        return st.session_state.mobile_detected
+
+    # Resultado fica em cache na sessão: headers não mudam entre reruns
+    if "mobile_detected" in st.session_state:
+        return st.session_state.mobile_detected
+
+    st.session_state.mobile_detected = is_mobile_user_agent(_get_request_headers())
+    return st.session_state.mobile_detected
 
 def get_mobile_config():
     """Retorna configurações específicas para mobile"""
@@ -34,7 +54,12 @@ def get_mobile_config():
         'columns_single': True,
         'compact_mode': True,
         'hide_metrics': False,
-        'simplified_filters': True
+        'simplified_filters': True,
+        # Orçamento de payload do modo mobile (4G nas lojas)
+        'top_n': 15,            # linhas por resumo
+        'page_size': 20,        # linhas por página nas tabelas
+        'chart_top_n': 10,      # barras nos gráficos
+        'chart_height': 220,
     }
 
 def apply_mobile_styles():
@@ -138,3 +163,20 @@ def optimize_dataframe_for_mobile(df, max_rows=100):
         st.warning(f"⚠️ Mostrando apenas {max_rows} de {len(df)} registros para melhor visualização mobile")
         return df.head(max_rows)
     return df
+
+def paginate_dataframe(df, key, page_size=20):
+    """Exibe o dataframe paginado: só as linhas da página atual são enviadas ao navegador"""
+    total = len(df)
+    n_pages = max(1, -(-total // page_size))
+    if n_pages > 1:
+        # rótulo e limites fixos: o widget continua o mesmo quando o filtro muda o número
+        # de páginas, e a página pedida além da última mostra a última
+        page = st.number_input("Página", min_value=1, value=1, step=1, key=f"pag_{key}")
+    else:
+        page = 1
+    page = min(int(page), n_pages)
+    start = (page - 1) * page_size
+    st.dataframe(df.iloc[start:start + page_size], width="stretch")
+    if n_pages > 1:
+        st.caption(f"Página {page} de {n_pages} · linhas {start + 1}–{min(start + page_size, total)} de {total}")
+
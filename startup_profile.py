@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Perfil de partida a frio do colab.py: quanto custa cada import e até onde vai a página de login.
+
+Cada medida roda num processo Python novo (nada em sys.modules), como um servidor recém-iniciado:
+
+    imports  python -X importtime das três fases do app, somado por pacote de topo:
+             login (streamlit, auth, mobile_utils), painel (pandas, pacote avaliacao,
+             altair) e sob demanda (gspread, engines de Excel, pyarrow)
+    login    primeira execução do colab.py no AppTest até o formulário de login, sem
+             pré-aquecimento, e os módulos pesados que ela importou (o esperado é nenhum)
+    painel   primeiro painel de um administrador logo depois da página de login, com e
+             sem o pré-aquecimento (avaliacao/warmup.py), usando o Sheets falso
+
+Exemplos:
+    python startup_profile.py
+    python startup_profile.py --top 25 --linhas 100000 --atraso 2 --saida partida.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "colab.py")
+
+FASES = [
+    ("login", ["streamlit", "auth", "mobile_utils"]),
+    ("painel", ["pandas", "avaliacao.dataset", "avaliacao.analytics", "altair"]),
+    ("sob_demanda", ["gspread", "avaliacao.exports", "xlsxwriter", "openpyxl", "pyarrow"]),
+]
+
+# Não devem aparecer antes do login
+PESADOS = ["pandas", "numpy", "pyarrow", "altair", "gspread", "xlsxwriter", "openpyxl",
+           "avaliacao.dataset", "avaliacao.analytics", "avaliacao.exports"]
+
+MARCA = "##fase "
+
+_CODIGO_IMPORTS = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+for fase, modulos in {fases!r}:
+    sys.stderr.write({marca!r} + fase + "\\n"); sys.stderr.flush()
+    t0 = time.perf_counter()
+    for m in modulos:
+        try:
+            importlib.import_module(m)
+        except ImportError:
+            pass
+    print(json.dumps({{"fase": fase, "s": time.perf_counter() - t0}}), flush=True)
+"""
+
+_CODIGO_APP = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+set_log_level("error")
+from avaliacao.user_registry import get_registry
+admin = next((n, u) for n, u in get_registry().users.items() if u["role"] == "admin")
+
+antes = set(sys.modules)
+t0 = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=600).run()
+out = {{"login_s": time.perf_counter() - t0,
+        "formulario": any(b.label == "Entrar" for b in at.button),
+        "pesados": [m for m in {pesados!r} if m in sys.modules and m not in antes]}}
+
+time.sleep({atraso!r})  # usuário digitando a senha
+at = AppTest.from_file({app!r}, default_timeout=600)
+at.session_state["authenticated"] = True
+at.session_state["user_data"] = admin[1]
+t0 = time.perf_counter()
+at.run()
+out["painel_s"] = time.perf_counter() - t0
+out["erro"] = str(at.exception[0].value) if at.exception else None
+from avaliacao import warmup
+out["warmup"] = warmup.estado()
+print(json.dumps(out))
+"""
+
+
+def _python(codigo: str, env: Optional[Dict[str, str]] = None, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", codigo]
+    return subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT,
+                          env={**os.environ, **(env or {})}, check=False)
+
+
+def perfil_imports(top: int) -> Dict[str, Dict]:
+    """Por fase: tempo total e os `top` pacotes de topo com mais tempo próprio de import"""
+    proc = _python(_CODIGO_IMPORTS.format(root=ROOT, fases=FASES, marca=MARCA), importtime=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    tempos = {json.loads(l)["fase"]: json.loads(l)["s"] for l in proc.stdout.splitlines() if l.startswith("{")}
+    por_fase: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    fase = None
+    for linha in proc.stderr.splitlines():
+        if linha.startswith(MARCA):
+            fase = linha[len(MARCA):]
+            continue
+        if fase is None or not linha.startswith("import time:") or "|" not in linha:
+            continue
+        partes = linha[len("import time:"):].split("|")
+        if not partes[0].strip().isdigit():
+            continue  # cabeçalho
+        pacote = partes[2].strip().split(".")[0]
+        por_fase[fase][pacote] += int(partes[0]) / 1e6
+    out = {}
+    for nome, _ in FASES:
+        pacotes = sorted(por_fase[nome].items(), key=lambda kv: -kv[1])
+        out[nome] = {
+            "s": round(tempos.get(nome, 0.0), 3),
+            "pacotes": [{"pacote": p, "s": round(s, 3)} for p, s in pacotes[:top]],
+        }
+    return out
+
+
+def perfil_app(linhas: int, atraso: float, prewarm: bool) -> Dict:
+    """Página de login e primeiro painel num processo novo, com o Sheets falso"""
+    env = {
+        "AVALIACAO_SHEETS_BACKEND": "fake",
+        "AVALIACAO_FAKE_SHEETS": json.dumps({"linhas": linhas}),
+        "AVALIACAO_PREWARM": "1" if prewarm else "0",
+    }
+    codigo = _CODIGO_APP.format(root=ROOT, app=APP_PATH, pesados=PESADOS, atraso=atraso)
+    proc = _python(codigo, env=env)
+    saida = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode or not saida:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(saida[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Perfil de partida a frio do colab.py")
+    parser.add_argument("--top", type=int, default=12, help="Pacotes listados por fase")
+    parser.add_argument("--linhas", type=int, default=50_000, help="Linhas do Sheets falso")
+    parser.add_argument("--atraso", type=float, default=3.0,
+                        help="Segundos entre a página de login e o login (tempo de digitar a senha)")
+    parser.add_argument("--sem-app", action="store_true", help="Só o perfil de imports")
+    parser.add_argument("--saida", help="Grava o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    resultado: Dict = {"imports": perfil_imports(args.top)}
+    for fase, r in resultado["imports"].items():
+        print(f"\n== {fase}: {r['s']:.3f}s")
+        for p in r["pacotes"]:
+            print(f"  {p['pacote']:<28}{p['s']:>8.3f}")
+
+    falhou = False
+    if not args.sem_app:
+        sem = perfil_app(args.linhas, args.atraso, prewarm=False)
+        com = perfil_app(args.linhas, args.atraso, prewarm=True)
+        resultado["app"] = {"sem_prewarm": sem, "com_prewarm": com}
+        print(f"\nPágina de login (processo novo): {sem['login_s']:.3f}s, "
+              f"formulário {'ok' if sem['formulario'] else 'AUSENTE'}")
+        if sem["pesados"]:
+            print(f"  módulos pesados importados antes do login: {', '.join(sem['pesados'])}")
+        else:
+            print("  nenhum módulo pesado importado antes do login")
+        print(f"Primeiro painel após {args.atraso:.0f}s na tela de login ({args.linhas} linhas):")
+        print(f"  sem pré-aquecimento  {sem['painel_s']:.3f}s")
+        print(f"  com pré-aquecimento  {com['painel_s']:.3f}s  (warmup: {com['warmup'].get('segundos')}s"
+              f"{', erro: ' + com['warmup']['erro'] if com['warmup'].get('erro') else ''})")
+        for r in (sem, com):
+            if r["erro"]:
+                print(f"  erro no painel: {r['erro']}")
+        falhou = bool(sem["pesados"]) or not sem["formulario"] or bool(sem["erro"] or com["erro"])
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nResultado gravado em {args.saida}")
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())